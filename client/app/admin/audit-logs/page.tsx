@@ -1,7 +1,7 @@
 "use client";
 
 import { useEffect, useState } from 'react';
-import api from '@/lib/api';
+import { getPage } from '@/lib/api';
 import { FileText } from 'lucide-react';
 
 type AuditLog = {
@@ -16,6 +16,8 @@ type AuditLog = {
 
 export default function AuditLogsPage() {
   const [logs, setLogs] = useState<AuditLog[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const actionLabel = (action: string) => {
     const normalized = action.toLowerCase();
@@ -28,8 +30,9 @@ export default function AuditLogsPage() {
   useEffect(() => {
     const fetchLogs = async () => {
       try {
-        const res = await api.get('/admin/audit-logs');
-        setLogs(res.data || []);
+        const page = await getPage<AuditLog>('/admin/audit-logs');
+        setLogs(page.items);
+        setNextCursor(page.nextCursor);
       } catch (err) {
         console.error(err);
       } finally {
@@ -39,6 +42,20 @@ export default function AuditLogsPage() {
     fetchLogs();
   }, []);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await getPage<AuditLog>('/admin/audit-logs', nextCursor);
+      setLogs(prev => [...prev, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <div className="max-w-6xl mx-auto py-8 px-4">
       <div className="flex items-center gap-2 mb-6">
@@ -85,6 +102,17 @@ export default function AuditLogsPage() {
             )}
           </tbody>
         </table>
+        {nextCursor && (
+          <div className="p-4 text-center border-t border-gray-200">
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="px-4 py-2 text-sm font-medium text-indigo-600 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50"
+            >
+              {loadingMore ? 'Ачаалж байна...' : 'Цааш ачаалах'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,7 +1,7 @@
 "use client";
 
 import { useEffect, useMemo, useState } from 'react';
-import api from '@/lib/api';
+import api, { getAllPages } from '@/lib/api';
 import { Activity, CalendarCheck, ClipboardList, TrendingUp } from 'lucide-react';
 
 type BonusRow = {
@@ -46,8 +46,8 @@ export default function AdminDashboard() {
     const fetchDashboard = async () => {
       try {
         const results = await Promise.allSettled([
-          api.get('/exams/today'),
-          api.get('/exams/pending'),
+          getAllPages<Exam>('/exams/today'),
+          getAllPages<Exam>('/exams/pending'),
           api.get('/admin/bonus-report'),
           api.get('/admin/revenue-week')
         ]);
@@ -55,14 +55,14 @@ export default function AdminDashboard() {
         const [todayRes, pendingRes, bonusRes, revenueRes] = results;
 
         if (todayRes.status === 'fulfilled') {
-          setTodayExams(todayRes.value.data || []);
+          setTodayExams(todayRes.value);
         } else {
           console.error('Failed to load today exams', todayRes.reason);
           setTodayExams([]);
         }
 
         if (pendingRes.status === 'fulfilled') {
-          setPendingExamsCount((pendingRes.value.data || []).length);
+          setPendingExamsCount(pendingRes.value.length);
         } else {
           console.error('Failed to load pending exams', pendingRes.reason);
           setPendingExamsCount(0);
@@ -1,7 +1,7 @@
 "use client";
 
 import { useEffect, useMemo, useState } from 'react';
-import api from '@/lib/api';
+import { getAllPages } from '@/lib/api';
 import { CalendarCheck } from 'lucide-react';
 
 type Exam = {
@@ -33,8 +33,7 @@ export default function ReceptionSchedulePage() {
   useEffect(() => {
     const fetchToday = async () => {
       try {
-        const res = await api.get('/exams/today');
-        setExams(res.data || []);
+        setExams(await getAllPages<Exam>('/exams/today'));
       } catch (err) {
         console.error(err);
       } finally {
@@ -1,7 +1,7 @@
 "use client";
 
 import { useEffect, useState } from 'react';
-import api from '@/lib/api';
+import api, { getPage } from '@/lib/api';
 import { User, Calendar, Activity, X } from 'lucide-react';
 import toast from 'react-hot-toast';
 
@@ -24,6 +24,8 @@ type Doctor = {
 
 export default function TechnicianDashboard() {
   const [exams, setExams] = useState<Exam[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [doctors, setDoctors] = useState<Doctor[]>([]);
   const [loading, setLoading] = useState(true);
   const [selectedExam, setSelectedExam] = useState<Exam | null>(null);
@@ -63,14 +65,15 @@ export default function TechnicianDashboard() {
     const fetchData = async () => {
       try {
         const results = await Promise.allSettled([
-          api.get('/exams/pending'),
+          getPage<Exam>('/exams/pending'),
           api.get('/doctors')
         ]);
 
         const [examsRes, docsRes] = results;
 
         if (examsRes.status === 'fulfilled') {
-          setExams(examsRes.value.data || []);
+          setExams(examsRes.value.items);
+          setNextCursor(examsRes.value.nextCursor);
         } else {
           console.error('Failed to load pending exams', examsRes.reason);
           setExams([]);
@@ -92,6 +95,21 @@ export default function TechnicianDashboard() {
     fetchData();
   }, []);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await getPage<Exam>('/exams/pending', nextCursor);
+      setExams(prev => [...prev, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.error(err);
+      toast.error('Жагсаалт ачаалж чадсангүй');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleComplete = async () => {
     if (!selectedExam || !referringDocId || !radiologistId) return;
 
@@ -175,6 +193,18 @@ export default function TechnicianDashboard() {
         </div>
       )}
 
+      {nextCursor && (
+        <div className="mt-6 text-center">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="px-4 py-2 text-sm font-medium text-indigo-600 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50"
+          >
+            {loadingMore ? 'Ачаалж байна...' : 'Цааш ачаалах'}
+          </button>
+        </div>
+      )}
+
       {/* Modal */}
       {selectedExam && (
         <div className="fixed inset-0 bg-black/50 flex items-center justify-center p-4 z-50">
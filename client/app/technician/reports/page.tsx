@@ -1,7 +1,7 @@
 "use client";
 
 import { useEffect, useState } from 'react';
-import api from '@/lib/api';
+import api, { getPage } from '@/lib/api';
 import { FileText, Save } from 'lucide-react';
 import toast from 'react-hot-toast';
 
@@ -18,6 +18,8 @@ type Exam = {
 
 export default function ReportManagementPage() {
   const [exams, setExams] = useState<Exam[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selected, setSelected] = useState<Exam | null>(null);
   const [saving, setSaving] = useState(false);
   const examTypeLabel = (type: string) => {
@@ -45,8 +47,9 @@ export default function ReportManagementPage() {
   useEffect(() => {
     const fetchReports = async () => {
       try {
-        const res = await api.get('/exams/reports');
-        setExams(Array.isArray(res.data) ? res.data : []);
+        const page = await getPage<Exam>('/exams/reports');
+        setExams(page.items);
+        setNextCursor(page.nextCursor);
       } catch (err) {
         console.error(err);
         const message = (err as any)?.response?.data?.msg || 'Дүгнэлтийн жагсаалт ачаалж чадсангүй';
@@ -58,6 +61,21 @@ export default function ReportManagementPage() {
     fetchReports();
   }, []);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await getPage<Exam>('/exams/reports', nextCursor);
+      setExams(prev => [...prev, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.error(err);
+      toast.error('Жагсаалт ачаалж чадсангүй');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const updateField = (key: keyof Exam, value: string) => {
     if (!selected) return;
     setSelected({ ...selected, [key]: value });
@@ -115,6 +133,17 @@ export default function ReportManagementPage() {
               ))
             )}
           </div>
+          {nextCursor && (
+            <div className="p-4 text-center border-t border-gray-200">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="px-4 py-2 text-sm font-medium text-indigo-600 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50"
+              >
+                {loadingMore ? 'Ачаалж байна...' : 'Цааш ачаалах'}
+              </button>
+            </div>
+          )}
         </div>
 
         <div className="bg-white rounded-lg shadow p-6">
@@ -41,4 +41,30 @@ api.interceptors.response.use(
   }
 );
 
+// List endpoints return one page; the cursor of the next one is in X-Next-Cursor
+export type Page<T> = {
+  items: T[];
+  nextCursor: string | null;
+};
+
+export async function getPage<T>(url: string, cursor?: string | null, params?: Record<string, unknown>): Promise<Page<T>> {
+  const res = await api.get(url, { params: { ...params, ...(cursor ? { cursor } : {}) } });
+  return {
+    items: Array.isArray(res.data) ? res.data : [],
+    nextCursor: res.headers['x-next-cursor'] || null,
+  };
+}
+
+// Every page of a list, for views that need the whole (bounded) list such as today's schedule
+export async function getAllPages<T>(url: string, params?: Record<string, unknown>): Promise<T[]> {
+  const items: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const page: Page<T> = await getPage<T>(url, cursor, { limit: 500, ...params });
+    items.push(...page.items);
+    cursor = page.nextCursor;
+  } while (cursor);
+  return items;
+}
+
 export default api;
@@ -1,41 +1,183 @@
 import os
 import json
+import time
 import uuid
+import click
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
-from models import db, User, Patient, Exam, Doctor, AuditLog
-from sqlalchemy import and_, or_, text
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt, get_jwt_request_location
+from flask_migrate import Migrate, upgrade
+from models import db, User, Patient, Exam, ExamFile, Doctor, Machine, AuditLog, ReportJob, REPLICA_BIND, audit_values, configure_audit_writer
+from database import engine_options, init_database, normalize_database_url, replica_reads
+from query_budget import init_query_budget
+from metrics import init_metrics
+from pagination import InvalidCursor, keyset_page, parse_limit
+from rollups import ensure_revenue_rollup, rebuild_revenue_rollup, revenue_by_day
+from query_plans import check_query_plans
+from caching import response_cache
+from projections import exam_fields, exam_rows_query, row_to_dict
+from exporter import CONTENT_TYPES as EXPORT_CONTENT_TYPES, stream_export
+from json_provider import FastJSONProvider
+from importer import ImportFormatError, import_file
+from reports import bonus_report_data, revenue_week_data, week_bounds
+from summary import SUMMARY_CACHE, build_summary, summary_cache
+from sheets_sync import SheetsSync, backend_from_config
+from patient_search import DEFAULT_LIMIT as DEFAULT_SEARCH_LIMIT, MAX_LIMIT as MAX_SEARCH_LIMIT, search_patients
+from exam_events import TooManyStreams, event_broker, event_stream, events_after, latest_event_id
+from delta_sync import CursorExpired, exam_changes, prune_exam_tombstones
+from scheduling import MAX_FREE_SLOTS, InvalidBooking, SlotConflict, book_exam, day_schedule, free_slots
+from file_store import INLINE_TYPES, ChecksumMismatch, FileStore, FileTooLarge, add_exam_file, collect_garbage, delete_exam_file
+from audit_archive import archive_audit_logs, archived_history, compact_audit_logs
+from report_jobs import InvalidJob, job_to_dict, run_worker_pool, submit_job
+from locking import DEFAULT_CHUNK_SIZE, LockScheduler, lock_progress, lock_range, previous_week_range
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
 
 load_dotenv()
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # Security & Config
 app.config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET_KEY", "super-secret-dev-key")
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=12)
-database_url = os.environ.get("DATABASE_URL", "sqlite:///scanapp.db")
-# Normalize for SQLAlchemy when Railway provides postgres://
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
+database_url = normalize_database_url(os.environ.get("DATABASE_URL", "sqlite:///scanapp.db"))
 app.config["SQLALCHEMY_DATABASE_URI"] = database_url
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Connection pool, per engine and per worker process (not used by in-memory SQLite)
+app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", 5))
+app.config["DB_MAX_OVERFLOW"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+app.config["DB_POOL_TIMEOUT"] = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+app.config["DB_POOL_RECYCLE"] = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+app.config["DB_POOL_PRE_PING"] = os.environ.get("DB_POOL_PRE_PING", "1") not in ("0", "false")
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_url, app.config)
+# SQLite runs in WAL mode; writers wait up to SQLITE_BUSY_TIMEOUT_MS for the lock
+app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+app.config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+# Optional read-only replica for the admin reports and exports (@replica_reads)
+replica_url = normalize_database_url(os.environ.get("DATABASE_REPLICA_URL"))
+if replica_url:
+    app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND: {"url": replica_url, **engine_options(replica_url, app.config)}}
+# Debug: max SQL statements per request (0 disables), action is "log" or
+# "reject" (checked before each commit, see query_budget.py)
+app.config["SQL_QUERY_BUDGET"] = int(os.environ.get("SQL_QUERY_BUDGET", 0))
+app.config["SQL_QUERY_BUDGET_ACTION"] = os.environ.get("SQL_QUERY_BUDGET_ACTION", "log")
+# Metrics: log statements slower than SLOW_QUERY_MS (0 disables); METRICS_TOKEN
+# makes /metrics require "Authorization: Bearer <token>"
+app.config["SLOW_QUERY_MS"] = int(os.environ.get("SLOW_QUERY_MS", 0))
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+# "sync": audit rows are bulk-inserted in the data transaction; "background": writer thread
+# after the commit, not durable: rows not yet written are lost if the worker crashes
+app.config["AUDIT_WRITER_MODE"] = os.environ.get("AUDIT_WRITER_MODE", "sync")
+# Weekly record locking: rows per short transaction, cutoff ("thu 23:59", server local time).
+# LOCK_SCHEDULER=thread runs the scheduler in the web workers (started by
+# gunicorn.conf.py or `python app.py`; the worker holding LOCK_LEADER_FILE runs
+# it), off leaves it to `flask run-lock-scheduler`
+app.config["LOCK_CHUNK_SIZE"] = int(os.environ.get("LOCK_CHUNK_SIZE", DEFAULT_CHUNK_SIZE))
+app.config["LOCK_SCHEDULE"] = os.environ.get("LOCK_SCHEDULE", "thu 23:59")
+app.config["LOCK_SCHEDULER"] = os.environ.get("LOCK_SCHEDULER", "thread")
+app.config["LOCK_LEADER_FILE"] = os.environ.get("LOCK_LEADER_FILE", os.path.join(app.instance_path, "lock-scheduler.lock"))
+# Google Sheets sync: "gspread" (service account, see setup_db.py) or "fake:<path.json>"
+app.config["SHEETS_BACKEND"] = os.environ.get("SHEETS_BACKEND", "gspread")
+app.config["GOOGLE_SHEETS_NAME"] = os.environ.get("GOOGLE_SHEETS_NAME", "Medical_Referrals")
+app.config["SHEETS_SYNC_BATCH_SIZE"] = int(os.environ.get("SHEETS_SYNC_BATCH_SIZE", 500))
+# Exam change feed: how long one SSE response stays open before the client
+# reconnects, and how often SQLite workers check for new events
+app.config["EVENTS_STREAM_SECONDS"] = int(os.environ.get("EVENTS_STREAM_SECONDS", 300))
+app.config["EVENTS_POLL_INTERVAL"] = float(os.environ.get("EVENTS_POLL_INTERVAL", 0.5))
+# Open streams per worker process; each holds a gunicorn thread for its whole
+# duration, so the default leaves half of them for ordinary requests. Beyond
+# it the feed answers 503 with Retry-After.
+app.config["EVENTS_MAX_STREAMS"] = int(os.environ.get(
+    "EVENTS_MAX_STREAMS", max(1, int(os.environ.get("GUNICORN_THREADS", 16)) // 2)))
+app.config["EVENTS_RETRY_AFTER"] = int(os.environ.get("EVENTS_RETRY_AFTER", 10))
+# EventSource and plain download links can't send headers, so the feed and
+# file downloads also accept ?jwt=<token>. Query strings end up in access
+# logs and browser history: only resource tokens (POST .../token), scoped to
+# that one stream or file and valid for RESOURCE_TOKEN_SECONDS, go there.
+app.config["JWT_QUERY_STRING_NAME"] = "jwt"
+app.config["RESOURCE_TOKEN_SECONDS"] = int(os.environ.get("RESOURCE_TOKEN_SECONDS", 60))
+# How long the admin dashboard summary is served from cache (seconds)
+app.config["SUMMARY_CACHE_TTL"] = int(os.environ.get("SUMMARY_CACHE_TTL", 300))
+# Report jobs: result files, worker processes (flask run-report-worker), and
+# how long a running job's worker may go without a heartbeat before another
+# worker takes the job over (the worker refreshes it every quarter of that).
+# REPORT_WORKER=gunicorn (default) has the gunicorn master start the worker pool
+# next to the web workers (see gunicorn.conf.py); off leaves it to a separate
+# `flask run-report-worker` process
+app.config["REPORT_WORKER"] = os.environ.get("REPORT_WORKER", "gunicorn")
+app.config["REPORT_JOBS_DIR"] = os.environ.get("REPORT_JOBS_DIR", os.path.join(app.instance_path, "report_jobs"))
+app.config["REPORT_WORKER_PROCESSES"] = int(os.environ.get("REPORT_WORKER_PROCESSES", 2))
+app.config["REPORT_JOB_LEASE"] = int(os.environ.get("REPORT_JOB_LEASE", 120))
+# Uploaded report files (content-addressed, see file_store.py) and the upload
+# size limit. USE_X_SENDFILE hands file downloads to the front proxy (X-Sendfile)
+app.config["REPORT_FILES_DIR"] = os.environ.get("REPORT_FILES_DIR", os.path.join(app.instance_path, "report_files"))
+app.config["REPORT_FILE_MAX_BYTES"] = int(os.environ.get("REPORT_FILE_MAX_BYTES", 2 * 1024 ** 3))
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE", "false").lower() == "true"
+# Audit rows older than this many days are moved to segment files in
+# AUDIT_ARCHIVE_DIR by `flask archive-audit-logs` (the web workers read them too)
+app.config["AUDIT_ARCHIVE_DIR"] = os.environ.get("AUDIT_ARCHIVE_DIR", os.path.join(app.instance_path, "audit_archive"))
+app.config["AUDIT_RETENTION_DAYS"] = int(os.environ.get("AUDIT_RETENTION_DAYS", 365))
+# Exam delta sync (GET /api/exams/changes): rows written in the last
+# EXAM_SYNC_LAG_SECONDS wait for the next call; tombstones of deleted exams are
+# kept this many days (flask prune-exam-tombstones), older cursors must resync
+app.config["EXAM_SYNC_LAG_SECONDS"] = int(os.environ.get("EXAM_SYNC_LAG_SECONDS", 5))
+app.config["EXAM_TOMBSTONE_RETENTION_DAYS"] = int(os.environ.get("EXAM_TOMBSTONE_RETENTION_DAYS", 30))
 
 db.init_app(app)
+init_database(app)
+configure_audit_writer(app.config["AUDIT_WRITER_MODE"])
+event_broker.init_app(app)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Batch mode lets Alembic ALTER tables on SQLite (copy-and-move)
+migrate = Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
 jwt = JWTManager(app)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor"])
+
+# --- Resource Tokens ---
+def request_token_scope():
+    scope = RESOURCE_TOKEN_SCOPES.get(request.endpoint)
+    return scope.format(**request.view_args) if scope else None
+
+@jwt.token_verification_loader
+def resource_token_in_scope(jwt_header, jwt_data):
+    # A resource token opens only the stream or file it was issued for
+    return 'scope' not in jwt_data or jwt_data['scope'] == request_token_scope()
+
+@jwt.token_verification_failed_loader
+def resource_token_out_of_scope(jwt_header, jwt_data):
+    return jsonify({"msg": "Token is not valid for this resource"}), 403
+
+def resource_token(scope):
+    """A short-lived token for one stream or file, for URLs that can't carry a header."""
+    expires = app.config["RESOURCE_TOKEN_SECONDS"]
+    token = create_access_token(identity=get_jwt_identity(),
+                                additional_claims={"role": get_jwt().get("role"), "scope": scope},
+                                expires_delta=timedelta(seconds=expires))
+    return {"token": token, "expires_in": expires}
 
 # --- Role Decorator ---
-def role_required(roles):
+# Endpoint -> scope of the resource tokens it accepts in the query string
+RESOURCE_TOKEN_SCOPES = {}
+
+def role_required(roles, scope=None):
+    """
+    Require one of `roles`. With a scope ('events', 'file:{file_id}',
+    formatted with the view args) the route also takes a resource token for
+    that scope in the query string.
+    """
     def decorator(f):
+        if scope:
+            RESOURCE_TOKEN_SCOPES[f.__name__] = scope
         @wraps(f)
-        @jwt_required()
+        @jwt_required(locations=['headers', 'query_string'] if scope else None)
         def decorated_function(*args, **kwargs):
             claims = get_jwt()
+            if get_jwt_request_location() == 'query_string' and 'scope' not in claims:
+                return jsonify({"msg": "Login tokens are not accepted in the URL, request a resource token"}), 401
             claim_role = (claims.get("role") or "").lower()
             allowed_roles = {r.lower() for r in roles}
             if claim_role not in allowed_roles:
@@ -44,6 +186,71 @@ def role_required(roles):
         return decorated_function
     return decorator
 
+def exam_list_query(include_notes=False):
+    """Column projection for the caller's role (see projections.py), patient and doctor joined in."""
+    include_notes = include_notes or request.args.get('include_notes') in ('1', 'true')
+    return exam_rows_query(get_jwt().get('role'), include_notes=include_notes)
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Invalid {name} format, expected YYYY-MM-DD")
+
+def apply_exam_filters(query):
+    """Server-side filters shared by the exam queues (query string)."""
+    args = request.args
+    if args.get('machine'):
+        query = query.filter(Exam.mri_machine_id == args['machine'])
+    if args.get('technician'):
+        query = query.filter(Exam.assigned_tech == args['technician'])
+    if args.get('exam_type'):
+        query = query.filter(Exam.exam_type == args['exam_type'])
+    if args.get('report_status'):
+        query = query.filter(Exam.report_status == args['report_status'])
+    date_from = parse_date_arg('date_from')
+    date_to = parse_date_arg('date_to')
+    if date_from:
+        query = query.filter(Exam.exam_date >= date_from)
+    if date_to:
+        query = query.filter(Exam.exam_date <= date_to)
+    return query
+
+def paged_response(items, next_cursor):
+    """JSON list body; the cursor for the next page goes in X-Next-Cursor."""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
+
+def exam_page(query, sort_col, descending):
+    """
+    One page of the queue in (sort_col, id) order: `limit` rows (default
+    DEFAULT_PAGE_SIZE), then the rest with the X-Next-Cursor cursor.
+    """
+    try:
+        query = apply_exam_filters(query)
+        exams, next_cursor = keyset_page(
+            query, sort_col, Exam.id,
+            cursor=request.args.get('cursor'),
+            limit=parse_limit(request.args.get('limit')),
+            descending=descending
+        )
+    except InvalidCursor:
+        return jsonify({"msg": "Invalid cursor"}), 400
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return paged_response([row_to_dict(row) for row in exams], next_cursor)
+
+@app.errorhandler(500)
+def internal_error(e):
+    # The traceback is logged and counted (metrics.py); the client only gets a generic message
+    db.session.rollback()
+    return jsonify({"msg": "Internal server error"}), 500
+
 # --- Auth Routes ---
 
 @app.route('/api/auth/login', methods=['POST'])
@@ -111,6 +318,46 @@ def get_patient_by_national_id():
         "national_id": patient.national_id
     }), 200
 
+@app.route('/api/patients/search', methods=['GET'])
+@role_required(['Reception', 'Admin'])
+def search_patients_route():
+    """
+    Ranked fuzzy lookup: ?q= matches name, phone or national ID prefixes,
+    substrings and near-misspellings; ?limit= (default 10, max 50).
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+        results = search_patients(request.args.get('q'), limit)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(results), 200
+
+@app.route('/api/import', methods=['POST'])
+@role_required(['Admin'])
+def bulk_import():
+    """
+    Bulk upsert patients (by national_id) and insert exams from a CSV or NDJSON
+    file, sent as multipart field "file" or as the raw request body. Format comes
+    from ?format=csv|ndjson, the file name, or the content type.
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    name = (upload.filename if upload else '') or ''
+    content_type = (upload.content_type if upload else request.content_type) or ''
+    fmt = request.args.get('format') or request.form.get('format')
+    if not fmt:
+        if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+            fmt = 'ndjson'
+        else:
+            fmt = 'csv'
+    try:
+        result = import_file(stream, fmt.lower())
+    except ImportFormatError as e:
+        return jsonify({"msg": str(e)}), 400
+    except UnicodeDecodeError:
+        return jsonify({"msg": "File must be UTF-8 encoded"}), 400
+    return jsonify(result.to_dict()), 200
+
 # --- Exam Workflow ---
 
 @app.route('/api/exams/register', methods=['POST'])
@@ -141,8 +388,25 @@ def register_exam():
             info_source=data.get('info_source')
         )
         db.session.add(exam)
+        booking = None
+        if data.get('slot_start'):
+            # Book a machine: slot_start from /api/schedule/free-slots, machine optional
+            try:
+                start = datetime.fromisoformat(data['slot_start'])
+            except (TypeError, ValueError):
+                raise InvalidBooking("Invalid slot_start, expected YYYY-MM-DDTHH:MM")
+            booking = book_exam(exam, start, data.get('mri_machine_id') or None)
         db.session.commit()
-        return jsonify({"message": "Exam registered", "id": exam_id}), 201
+        return jsonify({"message": "Exam registered", "id": exam_id, "booking": booking}), 201
+    except InvalidBooking as e:
+        db.session.rollback()
+        return jsonify({"msg": str(e)}), 400
+    except SlotConflict as e:
+        db.session.rollback()
+        return jsonify({
+            "msg": str(e),
+            "next_free": free_slots(data.get('exam_type'), bool(data.get('has_contrast')), after=e.start, count=3)
+        }), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": str(e)}), 500
@@ -151,16 +415,170 @@ def register_exam():
 @role_required(['Reception', 'Admin'])
 def get_today_exams():
     today = datetime.now().date()
-    exams = Exam.query.filter(Exam.exam_date == today).all()
-    role = get_jwt().get('role')
-    return jsonify([e.to_dict(role=role) for e in exams]), 200
+    query = exam_list_query().filter(Exam.exam_date == today)
+    return exam_page(query, Exam.created_at, descending=False)
 
 @app.route('/api/exams/pending', methods=['GET'])
 @role_required(['Technician', 'Admin'])
 def get_pending_exams():
-    exams = Exam.query.filter_by(status='Pending').all()
-    role = get_jwt().get('role')
-    return jsonify([e.to_dict(role=role) for e in exams]), 200
+    query = exam_list_query().filter(Exam.status == 'Pending')
+    return exam_page(query, Exam.created_at, descending=False)
+
+@app.route('/api/exams/changes', methods=['GET'])
+@role_required(['Reception', 'Technician', 'Admin'])
+def get_exam_changes():
+    try:
+        changes = exam_changes(
+            exam_list_query(), cursor=request.args.get('since'), limit=parse_limit(request.args.get('limit')),
+            lag_seconds=app.config["EXAM_SYNC_LAG_SECONDS"],
+            retention_days=app.config["EXAM_TOMBSTONE_RETENTION_DAYS"]
+        )
+    except InvalidCursor:
+        return jsonify({"msg": "Invalid cursor"}), 400
+    except CursorExpired as e:
+        return jsonify({"msg": str(e)}), 410
+    return jsonify(changes), 200
+
+@app.route('/api/exams/events/token', methods=['POST'])
+@role_required(['Reception', 'Technician', 'Admin'])
+def exam_events_token():
+    """Token for opening the event feed with EventSource (?jwt=), good for RESOURCE_TOKEN_SECONDS."""
+    return jsonify(resource_token('events')), 200
+
+@app.route('/api/exams/events', methods=['GET'])
+@role_required(['Reception', 'Technician', 'Admin'], scope='events')
+def exam_events_feed():
+    """
+    Server-sent events for the exam queues: registered, completed,
+    report_updated, updated, locked. A new connection gets a "ready" event
+    (fetch the list once, then apply events); a reconnect with Last-Event-ID
+    replays what it missed, or gets "refresh" if that's too much.
+    Browsers open it with a token from POST /api/exams/events/token; the
+    token only has to be valid when the stream opens, so each reconnect
+    gets a fresh one (and passes ?last_event_id=).
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        subscriber = event_broker.subscribe()
+    except TooManyStreams:
+        return jsonify({"msg": "Too many open event streams, retry later"}), 503, {
+            "Retry-After": str(app.config["EVENTS_RETRY_AFTER"])
+        }
+    try:
+        if last_event_id:
+            replay = events_after(int(last_event_id))
+            if replay is None:
+                replay = [{"type": "refresh", "id": latest_event_id()}]
+        else:
+            replay = [{"type": "ready", "id": latest_event_id()}]
+    except ValueError:
+        event_broker.unsubscribe(subscriber)
+        return jsonify({"msg": "Invalid Last-Event-ID"}), 400
+    body = event_stream(subscriber, get_jwt().get('role'), replay, app.config["EVENTS_STREAM_SECONDS"])
+    return app.response_class(body, mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def parse_iso_datetime(value):
+    if not value:
+        return None
+    try:
+        # Stored naive, as the client's clock reads it (as parse_time_arg and the importer do)
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+def parse_optional_int(value):
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def exam_write_error(exam):
+    """(msg, status) when the caller may not change this exam, else None."""
+    if not exam:
+        return "Exam not found", 404
+    if exam.is_locked and get_jwt().get('role') != 'Admin':
+        return "Record is locked", 403
+    return None
+
+def apply_completion(exam, data):
+    """Mark the exam completed with the scan details in `data`; an error message (nothing changed) or None."""
+    scan_start = parse_iso_datetime(data.get("scan_start"))
+    scan_end = parse_iso_datetime(data.get("scan_end"))
+    if data.get("scan_start") and not scan_start:
+        return "Invalid scan_start format"
+    if data.get("scan_end") and not scan_end:
+        return "Invalid scan_end format"
+
+    exam.assigned_tech = data.get("assigned_tech")
+    exam.mri_machine_id = data.get("mri_machine_id")
+    exam.scan_start = scan_start
+    exam.scan_end = scan_end
+    exam.status = 'Completed'
+    exam.referring_doctor_id = parse_optional_int(data.get("referring_doctor_id"))
+    exam.radiologist_name = data.get("radiologist_name")
+    exam.radiologist_license = data.get("radiologist_license")
+    return None
+
+def apply_report_update(exam, data):
+    """Update the report fields present in `data`; always succeeds (None)."""
+    exam.report_status = data.get("report_status", exam.report_status)
+    exam.internal_notes = data.get("internal_notes", exam.internal_notes)
+    exam.file_url = data.get("file_url", exam.file_url)
+    exam.radiologist_name = data.get("radiologist_name", exam.radiologist_name)
+    exam.radiologist_license = data.get("radiologist_license", exam.radiologist_license)
+    return None
+
+MAX_BATCH_ITEMS = 500
+
+def batch_exam_update(apply):
+    """
+    Apply `apply(exam, item)` to every item of {"items": [...]} in one
+    transaction: one query loads the exams, lock rules are checked per item,
+    one commit stores the lot. Items that fail are reported and skipped, or,
+    with "atomic": true, nothing is applied unless every item succeeds.
+    """
+    data = request.json or {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"msg": "items must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({"msg": f"At most {MAX_BATCH_ITEMS} items per batch"}), 400
+
+    ids = {item.get("exam_id") for item in items if isinstance(item, dict) and item.get("exam_id")}
+    exams = {exam.id: exam for exam in Exam.query.filter(Exam.id.in_(ids))} if ids else {}
+    results, seen = [], set()
+    for item in items:
+        exam_id = item.get("exam_id") if isinstance(item, dict) else None
+        if not isinstance(item, dict):
+            error = "Item must be an object", 400
+        elif not exam_id:
+            error = "Missing exam_id", 400
+        elif exam_id in seen:
+            error = "Duplicate exam_id in batch", 400
+        else:
+            seen.add(exam_id)
+            error = exam_write_error(exams.get(exam_id))
+            if not error:
+                msg = apply(exams[exam_id], item)
+                error = (msg, 400) if msg else None
+        results.append({"exam_id": exam_id, "status": error[1] if error else 200, "msg": error[0] if error else None})
+
+    failed = sum(1 for result in results if result["status"] != 200)
+    if failed and data.get("atomic"):
+        db.session.rollback()
+        return jsonify({"msg": f"No changes applied, {failed} items failed", "applied": 0,
+                        "failed": failed, "results": results}), 400
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": str(e)}), 500
+    return jsonify({"applied": len(results) - failed, "failed": failed, "results": results}), 200
 
 @app.route('/api/exams/complete', methods=['PATCH'])
 @role_required(['Technician', 'Admin'])
@@ -169,57 +587,32 @@ def complete_exam():
     exam_id = data.get("exam_id")
     
     exam = Exam.query.get(exam_id)
-    if not exam:
-        return jsonify({"msg": "Exam not found"}), 404
-        
-    if exam.is_locked and get_jwt().get('role') != 'Admin':
-        return jsonify({"msg": "Record is locked"}), 403
-
-    def parse_datetime(value):
-        if not value:
-            return None
-        try:
-            return datetime.fromisoformat(value.replace("Z", "+00:00"))
-        except ValueError:
-            return None
-
-    def to_int(value):
-        if value is None or value == "":
-            return None
-        try:
-            return int(value)
-        except (TypeError, ValueError):
-            return None
+    error = exam_write_error(exam)
+    if error:
+        return jsonify({"msg": error[0]}), error[1]
 
-    scan_start = parse_datetime(data.get("scan_start"))
-    scan_end = parse_datetime(data.get("scan_end"))
-    if data.get("scan_start") and not scan_start:
-        return jsonify({"msg": "Invalid scan_start format"}), 400
-    if data.get("scan_end") and not scan_end:
-        return jsonify({"msg": "Invalid scan_end format"}), 400
-
-    try:
-        exam.assigned_tech = data.get("assigned_tech")
-        exam.mri_machine_id = data.get("mri_machine_id")
-        exam.scan_start = scan_start
-        exam.scan_end = scan_end
-        exam.status = 'Completed'
-        exam.referring_doctor_id = to_int(data.get("referring_doctor_id"))
-        exam.radiologist_name = data.get("radiologist_name")
-        exam.radiologist_license = data.get("radiologist_license")
-        
+    try:
+        error = apply_completion(exam, data)
+        if error:
+            return jsonify({"msg": error}), 400
         db.session.commit()
         return jsonify({"message": "Exam completed"}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": str(e)}), 500
 
+@app.route('/api/exams/complete/batch', methods=['PATCH'])
+@role_required(['Technician', 'Admin'])
+def complete_exams_batch():
+    """Complete many exams at once: {"items": [<complete body>, ...], "atomic": false}."""
+    return batch_exam_update(apply_completion)
+
 @app.route('/api/exams/reports', methods=['GET'])
 @role_required(['Technician', 'Admin'])
 def get_report_queue():
-    exams = Exam.query.filter_by(status='Completed').order_by(Exam.scan_end.desc()).all()
-    role = get_jwt().get('role')
-    return jsonify([e.to_dict(role=role) for e in exams]), 200
+    # The report editor works on internal_notes, so this queue always carries them
+    query = exam_list_query(include_notes=True).filter(Exam.status == 'Completed')
+    return exam_page(query, Exam.scan_end, descending=True)
 
 @app.route('/api/exams/report', methods=['PATCH'])
 @role_required(['Technician', 'Admin'])
@@ -230,38 +623,161 @@ def update_report():
         return jsonify({"msg": "Missing exam_id"}), 400
 
     exam = Exam.query.get(exam_id)
-    if not exam:
-        return jsonify({"msg": "Exam not found"}), 404
-
-    if exam.is_locked and get_jwt().get('role') != 'Admin':
-        return jsonify({"msg": "Record is locked"}), 403
+    error = exam_write_error(exam)
+    if error:
+        return jsonify({"msg": error[0]}), error[1]
 
     try:
-        exam.report_status = data.get("report_status", exam.report_status)
-        exam.internal_notes = data.get("internal_notes", exam.internal_notes)
-        exam.file_url = data.get("file_url", exam.file_url)
-        exam.radiologist_name = data.get("radiologist_name", exam.radiologist_name)
-        exam.radiologist_license = data.get("radiologist_license", exam.radiologist_license)
+        apply_report_update(exam, data)
         db.session.commit()
         return jsonify({"message": "Report updated"}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/exams/report/batch', methods=['PATCH'])
+@role_required(['Technician', 'Admin'])
+def update_reports_batch():
+    """Update many reports at once: {"items": [<report body>, ...], "atomic": false}."""
+    return batch_exam_update(apply_report_update)
+
+# --- Report Files ---
+
+file_store = FileStore(app.config["REPORT_FILES_DIR"], app.config["REPORT_FILE_MAX_BYTES"])
+
+def exam_file_access_error(exam, write=False):
+    """
+    Files follow the report rules: Technicians and Admins read and upload,
+    only Admins change a locked exam, Reception reads final reports only.
+    """
+    role = get_jwt().get('role')
+    if write:
+        if role not in ('Technician', 'Admin'):
+            return jsonify({"msg": "Forbidden: Insufficient permissions"}), 403
+        if exam.is_locked and role != 'Admin':
+            return jsonify({"msg": "Record is locked"}), 403
+    elif role == 'Reception' and exam.report_status != 'Final':
+        return jsonify({"msg": "Report is not final"}), 403
+    return None
+
+@app.route('/api/exams/<exam_id>/files', methods=['POST'])
+@role_required(['Technician', 'Admin'])
+def upload_exam_file(exam_id):
+    """
+    Attach a file: the raw request body (chunked transfer encoding works) with
+    ?filename=, or multipart field "file". Optional ?sha256= is verified.
+    """
+    exam = db.session.get(Exam, exam_id)
+    if not exam:
+        return jsonify({"msg": "Exam not found"}), 404
+    error = exam_file_access_error(exam, write=True)
+    if error:
+        return error
+    if request.content_length and request.content_length > app.config["REPORT_FILE_MAX_BYTES"]:
+        return jsonify({"msg": f"File is larger than {app.config['REPORT_FILE_MAX_BYTES']} bytes"}), 413
+
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    stream = upload.stream if upload else request.stream
+    filename = os.path.basename((upload.filename if upload else request.args.get('filename')) or '')
+    if not filename:
+        return jsonify({"msg": "Missing filename"}), 400
+    content_type = upload.content_type if upload else request.content_type
+    try:
+        exam_file, created = add_exam_file(file_store, exam, stream, filename[:255], content_type,
+                                           get_jwt_identity(), request.args.get('sha256'))
+    except FileTooLarge as e:
+        return jsonify({"msg": str(e)}), 413
+    except ChecksumMismatch as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(exam_file.to_dict()), 201 if created else 200
+
+@app.route('/api/exams/<exam_id>/files', methods=['GET'])
+@role_required(['Reception', 'Technician', 'Admin'])
+def list_exam_files(exam_id):
+    exam = db.session.get(Exam, exam_id)
+    if not exam:
+        return jsonify({"msg": "Exam not found"}), 404
+    error = exam_file_access_error(exam)
+    if error:
+        return error
+    files = ExamFile.query.filter_by(exam_id=exam_id).order_by(ExamFile.uploaded_at, ExamFile.id).all()
+    return jsonify([f.to_dict() for f in files]), 200
+
+@app.route('/api/exams/<exam_id>/files/<file_id>/token', methods=['POST'])
+@role_required(['Reception', 'Technician', 'Admin'])
+def exam_file_token(exam_id, file_id):
+    """A download URL for this file (?jwt=), good for RESOURCE_TOKEN_SECONDS."""
+    exam_file = ExamFile.query.filter_by(id=file_id, exam_id=exam_id).first()
+    if not exam_file:
+        return jsonify({"msg": "File not found"}), 404
+    error = exam_file_access_error(db.session.get(Exam, exam_id))
+    if error:
+        return error
+    data = resource_token(f"file:{file_id}")
+    data["url"] = f"/api/exams/{exam_id}/files/{file_id}?jwt={data['token']}"
+    return jsonify(data), 200
+
+@app.route('/api/exams/<exam_id>/files/<file_id>', methods=['GET'])
+@role_required(['Reception', 'Technician', 'Admin'], scope='file:{file_id}')
+def download_exam_file(exam_id, file_id):
+    """
+    The file, with Range and If-None-Match support. The body is sent from disk
+    (sendfile under gunicorn, or X-Sendfile), never read into memory.
+    """
+    exam_file = ExamFile.query.filter_by(id=file_id, exam_id=exam_id).first()
+    if not exam_file:
+        return jsonify({"msg": "File not found"}), 404
+    error = exam_file_access_error(db.session.get(Exam, exam_id))
+    if error:
+        return error
+    path = file_store.object_path(exam_file.sha256)
+    if not os.path.exists(path):
+        return jsonify({"msg": "File content is missing"}), 410
+    response = send_file(
+        path, mimetype=exam_file.content_type, download_name=exam_file.filename,
+        as_attachment=exam_file.content_type not in INLINE_TYPES,
+        conditional=True, etag=exam_file.sha256
+    )
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    # Content never changes under an id, but access can: revalidate each time
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@app.route('/api/exams/<exam_id>/files/<file_id>', methods=['DELETE'])
+@role_required(['Technician', 'Admin'])
+def delete_exam_file_route(exam_id, file_id):
+    exam_file = ExamFile.query.filter_by(id=file_id, exam_id=exam_id).first()
+    if not exam_file:
+        return jsonify({"msg": "File not found"}), 404
+    exam = db.session.get(Exam, exam_id)
+    error = exam_file_access_error(exam, write=True)
+    if error:
+        return error
+    delete_exam_file(file_store, exam, exam_file)
+    return jsonify({"message": "File deleted"}), 200
+
 # --- Doctor Management ---
 
 @app.route('/api/doctors', methods=['GET'])
 @jwt_required()
 def get_doctors():
-    doctors = Doctor.query.all()
-    return jsonify([{
-        "id": d.id,
-        "name": d.name,
-        "hospital": d.hospital,
-        "phone": d.phone,
-        "license_no": d.license_no,
-        "role": d.role
-    } for d in doctors]), 200
+    def build():
+        doctors = Doctor.query.order_by(Doctor.id).all()
+        return json.dumps([{
+            "id": d.id,
+            "name": d.name,
+            "hospital": d.hospital,
+            "phone": d.phone,
+            "license_no": d.license_no,
+            "role": d.role
+        } for d in doctors])
+
+    body, etag = response_cache.get('doctors', build)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients may keep it but must revalidate (If-None-Match -> 304)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
 
 @app.route('/api/doctors', methods=['POST'])
 @role_required(['Admin'])
@@ -282,6 +798,76 @@ def add_doctor():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+# --- Machine Scheduling ---
+
+@app.route('/api/machines', methods=['GET'])
+@role_required(['Reception', 'Technician', 'Admin'])
+def get_machines():
+    return jsonify([m.to_dict() for m in Machine.query.order_by(Machine.id).all()]), 200
+
+@app.route('/api/machines', methods=['POST'])
+@role_required(['Admin'])
+def save_machine():
+    """Add a machine or change its hours (HH:MM), weekdays ("0123456", Monday = 0) or flags."""
+    data = request.json or {}
+    if not data.get("id"):
+        return jsonify({"msg": "id is required"}), 400
+    machine = db.session.get(Machine, data["id"])
+    created = machine is None
+    if created:
+        machine = Machine(id=data["id"], opens_at=datetime.strptime("08:00", "%H:%M").time(),
+                          closes_at=datetime.strptime("20:00", "%H:%M").time())
+        db.session.add(machine)
+    try:
+        for field in ("opens_at", "closes_at"):
+            if data.get(field):
+                setattr(machine, field, datetime.strptime(data[field], "%H:%M").time())
+    except ValueError:
+        db.session.rollback()
+        return jsonify({"msg": "Invalid opens_at/closes_at, expected HH:MM"}), 400
+    weekdays = data.get("open_weekdays", machine.open_weekdays or "0123456")
+    if not set(weekdays) <= set("0123456"):
+        db.session.rollback()
+        return jsonify({"msg": "Invalid open_weekdays, expected digits 0-6 (Monday = 0)"}), 400
+    machine.open_weekdays = "".join(sorted(set(weekdays)))
+    machine.name = data.get("name", machine.name)
+    for flag in ("supports_contrast", "is_active"):
+        if flag in data:
+            setattr(machine, flag, bool(data[flag]))
+    db.session.commit()
+    return jsonify(machine.to_dict()), 201 if created else 200
+
+@app.route('/api/schedule/free-slots', methods=['GET'])
+@role_required(['Reception', 'Technician', 'Admin'])
+def get_free_slots():
+    """
+    Next free starts for ?exam_type= (&contrast=1) across all machines or
+    ?machine=, from ?after= (ISO datetime, default now); ?count= up to MAX_FREE_SLOTS.
+    """
+    exam_type = request.args.get('exam_type')
+    if not exam_type:
+        return jsonify({"msg": "exam_type is required"}), 400
+    try:
+        after = parse_time_arg('after')
+        count = int(request.args.get('count', 5))
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    if not 1 <= count <= MAX_FREE_SLOTS:
+        return jsonify({"msg": f"count must be between 1 and {MAX_FREE_SLOTS}"}), 400
+    contrast = request.args.get('contrast') in ('1', 'true')
+    return jsonify(free_slots(exam_type, contrast, after=after, count=count,
+                              machine_id=request.args.get('machine'))), 200
+
+@app.route('/api/schedule', methods=['GET'])
+@role_required(['Reception', 'Technician', 'Admin'])
+def get_schedule():
+    """Each machine's bookings on ?date=YYYY-MM-DD (default today)."""
+    try:
+        day = parse_date_arg('date') or datetime.now().date()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify({"date": day.isoformat(), "machines": day_schedule(day)}), 200
+
 # --- User Management (Admin Only) ---
 
 @app.route('/api/admin/users', methods=['GET'])
@@ -339,176 +925,333 @@ def delete_user():
 
 # --- Admin Reports & Business Logic ---
 
-@app.route('/api/admin/audit-logs', methods=['GET'])
-@role_required(['Admin'])
-def get_audit_logs():
-    logs = AuditLog.query.order_by(AuditLog.timestamp.desc()).limit(200).all()
-    return jsonify([{
+def parse_time_arg(name, end_of_day=False):
+    """YYYY-MM-DD (whole day) or a full ISO timestamp from the query string."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            day = datetime.strptime(value, '%Y-%m-%d')
+            return day + timedelta(days=1, microseconds=-1) if end_of_day else day
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f"Invalid {name} format, expected YYYY-MM-DD or ISO datetime")
+
+def apply_audit_filters(query):
+    """action and date_from/date_to (date or ISO timestamp) filters shared by the audit endpoints."""
+    if request.args.get('action'):
+        query = query.filter(AuditLog.action == request.args['action'].upper())
+    date_from = parse_time_arg('date_from')
+    date_to = parse_time_arg('date_to', end_of_day=True)
+    if date_from:
+        query = query.filter(AuditLog.timestamp >= date_from)
+    if date_to:
+        query = query.filter(AuditLog.timestamp <= date_to)
+    return query
+
+AUDIT_FIELDS = ["id", "user_id", "action", "table", "target_id", "old", "new", "timestamp"]
+
+def audit_log_to_dict(l):
+    old, new = audit_values(l.payload, l.old_value, l.new_value)
+    return {
+        "id": l.id,
         "user_id": l.user_id,
         "action": l.action,
         "table": l.target_table,
         "target_id": l.target_id,
-        "old": l.old_value,
-        "new": l.new_value,
-        "timestamp": l.timestamp.isoformat()
-    } for l in logs]), 200
+        "old": json.dumps(old) if old is not None else None,
+        "new": json.dumps(new) if new is not None else None,
+        "timestamp": l.timestamp.isoformat() if l.timestamp else None
+    }
+
+def audit_log_page(query, default_order='desc'):
+    """Filters, cursor and order handling shared by the audit endpoints."""
+    args = request.args
+    order = args.get('order', default_order)
+    if order not in ('asc', 'desc'):
+        return jsonify({"msg": "Invalid order, expected asc or desc"}), 400
+    try:
+        query = apply_audit_filters(query)
+        logs, next_cursor = keyset_page(
+            query, AuditLog.timestamp, AuditLog.id,
+            cursor=args.get('cursor'),
+            limit=parse_limit(args.get('limit'), default=200),
+            descending=order == 'desc'
+        )
+    except InvalidCursor:
+        return jsonify({"msg": "Invalid cursor"}), 400
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return paged_response([audit_log_to_dict(l) for l in logs], next_cursor)
+
+AUDITED_TABLES = {'exams', 'patients', 'doctors', 'users'}
+
+@app.route('/api/admin/audit-logs', methods=['GET'])
+@role_required(['Admin'])
+@replica_reads
+def get_audit_logs():
+    return audit_log_page(filter_audit_logs(AuditLog.query))
+
+def filter_audit_logs(query):
+    args = request.args
+    if args.get('user_id'):
+        query = query.filter(AuditLog.user_id == args['user_id'])
+    if args.get('table'):
+        query = query.filter(AuditLog.target_table == args['table'])
+    if args.get('target_id'):
+        query = query.filter(AuditLog.target_id == args['target_id'])
+    return query
+
+@app.route('/api/admin/audit-logs/history/<table>/<target_id>', methods=['GET'])
+@role_required(['Admin'])
+@replica_reads
+def get_record_history(table, target_id):
+    """Full change history of one record, oldest first (ix_audit_logs_target)."""
+    if table not in AUDITED_TABLES:
+        return jsonify({"msg": f"Unknown table, expected one of {sorted(AUDITED_TABLES)}"}), 400
+    query = AuditLog.query.filter(AuditLog.target_table == table, AuditLog.target_id == target_id)
+    return audit_log_page(query, default_order='asc')
+
+@app.route('/api/admin/audit-logs/archive/<table>/<target_id>', methods=['GET'])
+@role_required(['Admin'])
+@replica_reads
+def get_archived_history(table, target_id):
+    """The record's audit rows moved to the archive (older than AUDIT_RETENTION_DAYS), oldest first."""
+    if table not in AUDITED_TABLES:
+        return jsonify({"msg": f"Unknown table, expected one of {sorted(AUDITED_TABLES)}"}), 400
+    return jsonify(archived_history(app.config["AUDIT_ARCHIVE_DIR"], table, target_id)), 200
+
+@app.route('/api/admin/audit-logs/by-user/<path:user_id>', methods=['GET'])
+@role_required(['Admin'])
+@replica_reads
+def get_user_activity(user_id):
+    """Actions by one user, newest first, optionally within date_from/date_to (ix_audit_logs_user)."""
+    query = AuditLog.query.filter(AuditLog.user_id == user_id)
+    if request.args.get('table'):
+        query = query.filter(AuditLog.target_table == request.args['table'])
+    return audit_log_page(query)
+
+# --- Exports ---
+
+def export_response(query, fields, to_dict, name):
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_CONTENT_TYPES:
+        return jsonify({"msg": "Invalid format, expected csv or ndjson"}), 400
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    response = app.response_class(
+        stream_with_context(stream_export(query, fields, to_dict, fmt)),
+        mimetype=EXPORT_CONTENT_TYPES[fmt]
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+@app.route('/api/admin/export/exams', methods=['GET'])
+@role_required(['Admin'])
+@replica_reads
+def export_exams():
+    """All matching exams with the Admin fields, streamed as CSV or NDJSON (?format=)."""
+    include_notes = request.args.get('include_notes') in ('1', 'true')
+    try:
+        query = apply_exam_filters(exam_rows_query('Admin', include_notes=include_notes))
+        if request.args.get('status'):
+            query = query.filter(Exam.status == request.args['status'])
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    query = query.order_by(Exam.created_at, Exam.id)
+    return export_response(query, exam_fields('Admin', include_notes), row_to_dict, 'exams')
+
+@app.route('/api/admin/export/audit-logs', methods=['GET'])
+@role_required(['Admin'])
+@replica_reads
+def export_audit_logs():
+    """Audit trail for compliance, oldest first, streamed as CSV or NDJSON (?format=)."""
+    query = db.session.query(
+        AuditLog.id, AuditLog.user_id, AuditLog.action, AuditLog.target_table,
+        AuditLog.target_id, AuditLog.old_value, AuditLog.new_value, AuditLog.payload, AuditLog.timestamp
+    )
+    try:
+        query = apply_audit_filters(filter_audit_logs(query))
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    query = query.order_by(AuditLog.timestamp, AuditLog.id)
+    return export_response(query, AUDIT_FIELDS, audit_log_to_dict, 'audit-logs')
+
+def report_period():
+    """
+    Reporting window from the query string: ?start=YYYY-MM-DD&end=YYYY-MM-DD,
+    ?weeks=N (the last N Mon-Sun cycles, current one included), or the current week.
+    """
+    start_of_week, end_of_week = week_bounds(datetime.now())
+    start_date = parse_date_arg('start')
+    end_date = parse_date_arg('end')
+    if start_date or end_date:
+        start = datetime.combine(start_date, datetime.min.time()) if start_date else start_of_week
+        end = datetime.combine(end_date, datetime.max.time().replace(microsecond=0)) if end_date else end_of_week
+    elif request.args.get('weeks'):
+        try:
+            weeks = int(request.args['weeks'])
+        except ValueError:
+            raise ValueError("Invalid weeks, expected a positive integer")
+        if weeks < 1:
+            raise ValueError("Invalid weeks, expected a positive integer")
+        start, end = start_of_week - timedelta(weeks=weeks - 1), end_of_week
+    else:
+        start, end = start_of_week, end_of_week
+    if start > end:
+        raise ValueError("start must be on or before end")
+    return start, end
 
 @app.route('/api/admin/bonus-report', methods=['GET'])
 @role_required(['Admin'])
+@replica_reads
 def bonus_report():
     try:
-        # Cycle: Monday to Sunday
-        now = datetime.now()
-        start_of_week = now - timedelta(days=now.weekday())
-        start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_week = start_of_week + timedelta(days=6, hours=23, minutes=59, seconds=59)
-        
-        exams = Exam.query.filter(
-            and_(
-                Exam.status == 'Completed',
-                or_(
-                    and_(Exam.scan_end >= start_of_week, Exam.scan_end <= end_of_week),
-                    and_(
-                        Exam.scan_end == None,
-                        Exam.exam_date >= start_of_week.date(),
-                        Exam.exam_date <= end_of_week.date()
-                    )
-                )
-            )
-        ).all()
-        
-        report_data = {}
-        for ex in exams:
-            doc_id = ex.referring_doctor_id
-            if not doc_id: continue
-            
-            if doc_id not in report_data:
-                doc = Doctor.query.get(doc_id)
-                report_data[doc_id] = {
-                    "doctor_name": doc.name if doc else "Unknown",
-                    "hospital": doc.hospital if doc else "Unknown",
-                    "exam_count": 0,
-                    "total_bonus": 0
-                }
-            report_data[doc_id]["exam_count"] += 1
-            report_data[doc_id]["total_bonus"] += 50000
+        start, end = report_period()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
 
-        return jsonify({
-            "period": f"{start_of_week.strftime('%Y-%m-%d')} to {end_of_week.strftime('%Y-%m-%d')}",
-            "data": [{"doctor_id": k, **v} for k, v in report_data.items()]
-        }), 200
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return jsonify(bonus_report_data(start, end)), 200
 
 @app.route('/api/admin/revenue-week', methods=['GET'])
 @role_required(['Admin'])
+@replica_reads
 def revenue_week():
     """
-    Weekly revenue from completed exams (Mon-Sun).
+    Weekly revenue from completed exams (Mon-Sun), read from the daily rollup.
     Revenue = max(price - discount, 0) when payment_status is Paid/Partial.
     """
+    return jsonify(revenue_week_data(datetime.now())), 200
+
+@app.route('/api/admin/summary', methods=['GET'])
+@role_required(['Admin'])
+def admin_summary():
+    """
+    Dashboard summary of the current week (bonus, revenue, locking) in one
+    call. Served from a cache shared by all workers for SUMMARY_CACHE_TTL
+    seconds, dropped early when a current-week exam is completed, paid or locked.
+    Rebuilt on the primary, not the replica: the entry is tagged with the
+    primary's version counter, and a lagging replica would store a summary
+    from before the change as current.
+    """
+    body = summary_cache.get(SUMMARY_CACHE, app.config["SUMMARY_CACHE_TTL"], lambda: json.dumps(build_summary()))
+    response = app.response_class(body, mimetype='application/json')
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@app.route('/api/admin/revenue', methods=['GET'])
+@role_required(['Admin'])
+@replica_reads
+def revenue_report():
+    """
+    Revenue over any period (same params as bonus-report), grouped by
+    ?group=day (default), month or year. Reads only the daily rollup.
+    """
+    group = request.args.get('group', 'day')
+    key_formats = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+    if group not in key_formats:
+        return jsonify({"msg": "Invalid group, expected day, month or year"}), 400
     try:
-        now = datetime.now()
-        start_of_week = now - timedelta(days=now.weekday())
-        start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_week = start_of_week + timedelta(days=6, hours=23, minutes=59, seconds=59)
-
-        exams = Exam.query.filter(
-            and_(
-                Exam.status == 'Completed',
-                Exam.scan_end >= start_of_week,
-                Exam.scan_end <= end_of_week
-            )
-        ).all()
-
-        daily_totals = {}
-        total_revenue = 0.0
-        paid_count = 0
-        partial_count = 0
-        unpaid_count = 0
-
-        for ex in exams:
-            payment_status = (ex.payment_status or '').lower()
-            if payment_status == 'paid':
-                paid_count += 1
-            elif payment_status == 'partial':
-                partial_count += 1
-            else:
-                unpaid_count += 1
-
-            if payment_status in ['paid', 'partial']:
-                price = ex.price or 0
-                discount = ex.discount or 0
-                amount = max(price - discount, 0)
-            else:
-                amount = 0
-
-            total_revenue += amount
-            exam_date = ex.scan_end.date() if ex.scan_end else ex.exam_date
-            day_key = exam_date.isoformat() if exam_date else start_of_week.date().isoformat()
-            daily_totals[day_key] = daily_totals.get(day_key, 0) + amount
-
-        # Build Mon-Sun series
-        series = []
-        for i in range(7):
-            day = start_of_week + timedelta(days=i)
-            key = day.date().isoformat()
-            series.append({
-                "date": key,
-                "label": day.strftime("%a"),
-                "total": round(daily_totals.get(key, 0), 2)
-            })
+        start, end = report_period()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
 
-        return jsonify({
-            "period": f"{start_of_week.strftime('%Y-%m-%d')} to {end_of_week.strftime('%Y-%m-%d')}",
-            "total_revenue": round(total_revenue, 2),
-            "paid_count": paid_count,
-            "partial_count": partial_count,
-            "unpaid_count": unpaid_count,
-            "series": series
-        }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    buckets = {}
+    for day, statuses in sorted(revenue_by_day(start.date(), end.date()).items()):
+        key = day.strftime(key_formats[group])
+        entry = buckets.setdefault(key, {
+            "period": key, "total": 0.0, "paid_count": 0, "partial_count": 0, "unpaid_count": 0
+        })
+        for bucket, (revenue, exam_count) in statuses.items():
+            entry["total"] += revenue
+            entry[f"{bucket.lower()}_count"] += exam_count
+
+    series = list(buckets.values())
+    for entry in series:
+        entry["total"] = round(entry["total"], 2)
+    return jsonify({
+        "period": f"{start.strftime('%Y-%m-%d')} to {end.strftime('%Y-%m-%d')}",
+        "group": group,
+        "total_revenue": round(sum(e["total"] for e in series), 2),
+        "series": series
+    }), 200
+
+@app.route('/api/admin/report-jobs', methods=['POST'])
+@role_required(['Admin'])
+def create_report_job():
+    """
+    Run a report in the background: {"kind": "bonus-report", "params": {"weeks": 12}}.
+    params are the report endpoint's query string. 202 with the job to poll, or
+    200 with a finished job when an up-to-date result already exists.
+    """
+    data = request.json or {}
+    try:
+        job, state = submit_job(data.get("kind"), data.get("params"), get_jwt_identity())
+    except InvalidJob as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(job_to_dict(job, state)), 200 if job.status == 'done' else 202
+
+@app.route('/api/admin/report-jobs/<job_id>', methods=['GET'])
+@role_required(['Admin'])
+def get_report_job(job_id):
+    job = db.session.get(ReportJob, job_id)
+    if not job:
+        return jsonify({"msg": "Job not found"}), 404
+    return jsonify(job_to_dict(job)), 200
+
+@app.route('/api/admin/report-jobs/<job_id>/result', methods=['GET'])
+@role_required(['Admin'])
+def get_report_job_result(job_id):
+    job = db.session.get(ReportJob, job_id)
+    if not job:
+        return jsonify({"msg": "Job not found"}), 404
+    if job.status != 'done':
+        return jsonify({"msg": f"Job is {job.status}", "error": job.error}), 409
+    if not os.path.exists(job.result_path):
+        return jsonify({"msg": "Result expired, submit the job again"}), 410
+    return send_file(job.result_path, mimetype=job.content_type, conditional=True,
+                     as_attachment=bool(job.filename), download_name=job.filename)
 
 @app.route('/api/admin/lock-previous-week', methods=['POST'])
 @role_required(['Admin'])
 def lock_records():
     """
-    Manually trigger or call via cron: 
-    On Thursday (Day 4) at 23:59, lock records from previous Mon-Sun cycle.
-    """
-    try:
-        now = datetime.now()
-        # Find last Monday of the previous week
-        last_monday = now - timedelta(days=now.weekday() + 7)
-        last_monday = last_monday.replace(hour=0, minute=0, second=0, microsecond=0)
-        last_sunday = last_monday + timedelta(days=6, hours=23, minutes=59, seconds=59)
-        
-        updated_count = Exam.query.filter(
-            and_(
-                Exam.scan_end >= last_monday,
-                Exam.scan_end <= last_sunday,
-                Exam.is_locked == False
-            )
-        ).update({"is_locked": True}, synchronize_session=False)
-        
-        db.session.commit()
-        return jsonify({"message": f"Locked {updated_count} records from previous week."}), 200
+    Manually trigger or call via cron (the built-in scheduler runs it on
+    Thursday (Day 4) at 23:59): lock records from the previous Mon-Sun cycle.
+    ?start=&end= (date or ISO timestamp) lock an arbitrary backfill range instead.
+    """
+    try:
+        start, end = previous_week_range(datetime.now())
+        start = parse_time_arg('start') or start
+        end = parse_time_arg('end', end_of_day=True) or end
+        chunk_size = int(request.args.get('chunk_size', app.config["LOCK_CHUNK_SIZE"]))
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    if start > end:
+        return jsonify({"msg": "start must be before end"}), 400
+    if chunk_size < 1:
+        return jsonify({"msg": "chunk_size must be positive"}), 400
+    try:
+        updated_count = lock_range(start, end, chunk_size)
+        return jsonify({
+            "message": f"Locked {updated_count} records from {start.date()} to {end.date()}.",
+            "progress": dict(lock_progress)
+        }), 200
     except Exception as e:
-        db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-_tables_initialized = False
+@app.route('/api/admin/lock-status', methods=['GET'])
+@role_required(['Admin'])
+def lock_status():
+    """Progress of the running/last lock job in this process, plus still-unlocked past records."""
+    start, end = previous_week_range(datetime.now())
+    pending = db.session.query(func.count(Exam.id)).filter(
+        Exam.is_locked == False,
+        Exam.scan_end <= end
+    ).scalar()
+    return jsonify({**lock_progress, "unlocked_before_current_cycle": pending}), 200
 
-def ensure_doctors_role_column():
-    if db.engine.dialect.name != "sqlite":
-        return
-    result = db.session.execute(text("PRAGMA table_info(doctors)")).all()
-    columns = {row[1] for row in result}
-    if "role" not in columns:
-        db.session.execute(text("ALTER TABLE doctors ADD COLUMN role VARCHAR(50)"))
-        db.session.commit()
+_data_initialized = False
 
 def ensure_seed_admin():
     username = os.environ.get("ADMIN_USERNAME")
@@ -524,20 +1267,131 @@ def ensure_seed_admin():
     db.session.add(user)
     db.session.commit()
 
+# Schema is managed by migrations/ ("flask db upgrade" runs before gunicorn starts)
 @app.before_request
-def create_tables_once():
-    global _tables_initialized
-    if _tables_initialized:
+def initialize_data_once():
+    global _data_initialized
+    if _data_initialized:
         return
-    db.create_all()
-    ensure_doctors_role_column()
     ensure_seed_admin()
-    _tables_initialized = True
+    ensure_revenue_rollup()
+    _data_initialized = True
+
+@app.cli.command("rebuild-revenue-rollup")
+@click.option("--start", type=click.DateTime(formats=["%Y-%m-%d"]), help="First scan day to rebuild")
+@click.option("--end", type=click.DateTime(formats=["%Y-%m-%d"]), help="Last scan day to rebuild")
+def rebuild_revenue_rollup_command(start, end):
+    """Recompute the daily revenue rollup from exams (backfill/repair)."""
+    written = rebuild_revenue_rollup(start.date() if start else None, end.date() if end else None)
+    click.echo(f"Rebuilt {written} daily revenue rows.")
+
+@app.cli.command("check-query-plans")
+@click.option("--verbose", is_flag=True, help="Print the full plan of every query")
+def check_query_plans_command(verbose):
+    """EXPLAIN the queue/report queries and fail if any misses the index search it is built for."""
+    failed = 0
+    for name, plan, problems in check_query_plans():
+        click.echo(f"{'FAIL' if problems else 'ok  '} {name}")
+        for problem in problems:
+            click.echo(f"       {problem}")
+        if verbose or problems:
+            for line in plan:
+                click.echo(f"       {line}")
+        failed += bool(problems)
+    if failed:
+        raise SystemExit(1)
+
+@app.cli.command("lock-records")
+@click.option("--start", type=click.DateTime(formats=["%Y-%m-%d"]), help="First scan day to lock (default: previous cycle)")
+@click.option("--end", type=click.DateTime(formats=["%Y-%m-%d"]), help="Last scan day to lock (default: previous cycle)")
+@click.option("--chunk-size", type=int, default=None, help="Rows per transaction")
+def lock_records_command(start, end, chunk_size):
+    """Lock past records in chunks (previous Mon-Sun cycle, or a backfill range)."""
+    default_start, default_end = previous_week_range(datetime.now())
+    start = start or default_start
+    end = end + timedelta(days=1, microseconds=-1) if end else default_end
+    locked = lock_range(start, end, chunk_size or app.config["LOCK_CHUNK_SIZE"], user_id="System/CLI")
+    click.echo(f"Locked {locked} records from {start.date()} to {end.date()} "
+               f"in {lock_progress['chunks']} chunks ({lock_progress['seconds']}s).")
+
+@app.cli.command("run-lock-scheduler")
+def run_lock_scheduler_command():
+    """Run the weekly lock at LOCK_SCHEDULE until interrupted (for LOCK_SCHEDULER=off deployments)."""
+    scheduler = lock_scheduler()
+    click.echo(f"Locking previous cycle every {app.config['LOCK_SCHEDULE']}.")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+@app.cli.command("sync-sheets")
+@click.option("--interval", type=int, default=0, help="Keep running, syncing every N seconds")
+def sync_sheets_command(interval):
+    """Push exams changed since the last sync, their weekly bonuses and doctors to Google Sheets."""
+    sync = SheetsSync(backend_from_config(app.config), batch_size=app.config["SHEETS_SYNC_BATCH_SIZE"])
+    while True:
+        stats = sync.run()
+        click.echo(f"Synced {stats['exams']} exams, {stats['bonus_rows']} bonus rows and "
+                   f"{stats['doctors']} doctors in {stats['requests']} requests.")
+        if not interval:
+            break
+        time.sleep(interval)
+
+@app.cli.command("archive-audit-logs")
+@click.option("--older-than-days", type=int, default=None, help="Retention window (default AUDIT_RETENTION_DAYS)")
+def archive_audit_logs_command(older_than_days):
+    """Move audit rows past the retention window into compressed archive segments."""
+    days = older_than_days if older_than_days is not None else app.config["AUDIT_RETENTION_DAYS"]
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    segments, rows = archive_audit_logs(app.config["AUDIT_ARCHIVE_DIR"], cutoff)
+    click.echo(f"Archived {rows} audit rows older than {cutoff.date()} into {segments} segments.")
+
+@app.cli.command("compact-audit-logs")
+def compact_audit_logs_command():
+    """Re-encode audit rows written before compact payloads."""
+    click.echo(f"Compacted {compact_audit_logs()} audit rows.")
+
+@app.cli.command("gc-report-files")
+def gc_report_files_command():
+    """Delete stored report files no exam references and abandoned uploads."""
+    objects, uploads = collect_garbage(file_store)
+    click.echo(f"Removed {objects} unreferenced files and {uploads} abandoned uploads.")
+
+@app.cli.command("prune-exam-tombstones")
+def prune_exam_tombstones_command():
+    """Forget deleted exams older than the delta-sync tombstone retention."""
+    pruned = prune_exam_tombstones(app.config["EXAM_TOMBSTONE_RETENTION_DAYS"])
+    click.echo(f"Pruned {pruned} exam tombstones.")
+
+@app.cli.command("run-report-worker")
+@click.option("--processes", type=int, default=None, help="Worker processes (default REPORT_WORKER_PROCESSES)")
+def run_report_worker_command(processes):
+    """Run queued report jobs in a pool of worker processes until interrupted."""
+    processes = processes or app.config["REPORT_WORKER_PROCESSES"]
+    click.echo(f"Running report jobs with {processes} processes.")
+    try:
+        run_worker_pool(app, processes, app.config["REPORT_JOBS_DIR"], lease=app.config["REPORT_JOB_LEASE"])
+    except KeyboardInterrupt:
+        pass
+
+def lock_scheduler():
+    return LockScheduler(app, app.config["LOCK_SCHEDULE"], app.config["LOCK_CHUNK_SIZE"],
+                         leader_file=app.config["LOCK_LEADER_FILE"])
+
+def start_lock_scheduler():
+    """Start the scheduler thread in a web server process (not in CLI commands) when enabled."""
+    if app.config["LOCK_SCHEDULER"] == "thread":
+        lock_scheduler().start_thread()
+
+# Registered after initialize_data_once so first-request setup isn't counted
+init_query_budget(app, db.Session)
+init_metrics(app)
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-        ensure_doctors_role_column()
+        upgrade(directory=MIGRATIONS_DIR)
         ensure_seed_admin()
+        ensure_revenue_rollup()
+    start_lock_scheduler()
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', debug=False, port=port)
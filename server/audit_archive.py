@@ -0,0 +1,215 @@
+import bisect
+import json
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime
+from sqlalchemy import bindparam
+from models import db, AuditLog, AuditSegment, audit_values, encode_audit_payload, json_default
+
+# --- Audit Archive ---
+# Audit rows past the retention window are moved out of audit_logs into
+# segment files: immutable, written once, never edited. A segment holds its
+# rows sorted by (table, target_id, timestamp, id) in independently
+# deflated blocks, followed by an index of each block's key range, so one
+# record's history is read from a block or two per segment. audit_segments
+# is the list of segments: the file is written first and its rows are deleted
+# in the same transaction that registers it, so a crash leaves at worst an
+# unregistered file, which the next run overwrites.
+#
+# Segment file: MAGIC, blocks, deflated JSON index, index offset (8 bytes), MAGIC.
+
+MAGIC = b'MTAUDSG1'
+TRAILER = struct.Struct('<Q8s')
+BLOCK_BYTES = 64 * 1024
+SEGMENT_ROWS = 100_000
+DELETE_CHUNK = 5000
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+def record_key(table, target_id):
+    return f"{table}\x00{target_id}"
+
+def _deflate(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+def _inflate(data):
+    return zlib.decompress(data, -15)
+
+def write_segment(path, rows):
+    """
+    Write audit_logs rows to a new segment at `path`; returns its
+    size in bytes. The file only appears under its name once it is complete.
+    """
+    entries = sorted(
+        (record_key(row.target_table, row.target_id), row.timestamp or datetime.min, row.id, row) for row in rows
+    )
+    blocks = []
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        lines, size, first_key = [], 0, None
+
+        def flush_block(last_key):
+            data = _deflate(b''.join(lines))
+            blocks.append([f.tell(), len(data), first_key, last_key])
+            f.write(data)
+
+        for key, _, _, row in entries:
+            if lines and size >= BLOCK_BYTES:
+                flush_block(previous_key)
+                lines, size = [], 0
+            if not lines:
+                first_key = key
+            old, new = audit_values(row.payload, row.old_value, row.new_value)
+            line = json.dumps([
+                row.id, row.user_id, row.action, row.target_table, row.target_id,
+                row.timestamp.isoformat() if row.timestamp else None, old, new
+            ], default=json_default, separators=(',', ':')).encode() + b'\n'
+            lines.append(line)
+            size += len(line)
+            previous_key = key
+        if lines:
+            flush_block(previous_key)
+
+        index_offset = f.tell()
+        f.write(_deflate(json.dumps({"blocks": blocks, "rows": len(entries)}).encode()))
+        f.write(TRAILER.pack(index_offset, MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+def read_index(path):
+    """The segment's block index, cached per process (segments never change)."""
+    index = _index_cache.get(path)
+    if index is not None:
+        return index
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an audit segment")
+        f.seek(-TRAILER.size, os.SEEK_END)
+        index_offset, magic = TRAILER.unpack(f.read(TRAILER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is truncated")
+        end = f.tell() - TRAILER.size
+        f.seek(index_offset)
+        index = json.loads(_inflate(f.read(end - index_offset)))
+    with _index_lock:
+        _index_cache[path] = index
+    return index
+
+def read_record(path, key):
+    """Decoded rows of one record from a segment."""
+    blocks = read_index(path)["blocks"]
+    # Blocks are sorted and their key ranges don't overlap except at the edges
+    start = bisect.bisect_left([block[3] for block in blocks], key)
+    # Only lines containing the record's table and id get parsed
+    needle = json.dumps(key.split('\x00', 1), separators=(',', ':'))[1:-1].encode()
+    rows = []
+    with open(path, 'rb') as f:
+        for offset, length, first_key, last_key in blocks[start:]:
+            if first_key > key:
+                break
+            f.seek(offset)
+            for line in _inflate(f.read(length)).splitlines():
+                if needle not in line:
+                    continue
+                row = json.loads(line)
+                if record_key(row[3], row[4]) == key:
+                    rows.append(row)
+    return rows
+
+def row_to_dict(row):
+    """Same shape as the live audit log API."""
+    row_id, user_id, action, table, target_id, timestamp, old, new = row
+    return {
+        "id": row_id,
+        "user_id": user_id,
+        "action": action,
+        "table": table,
+        "target_id": target_id,
+        "old": json.dumps(old) if old is not None else None,
+        "new": json.dumps(new) if new is not None else None,
+        "timestamp": timestamp,
+        "archived": True,
+    }
+
+def archived_history(archive_dir, table, target_id):
+    """Archived audit rows of one record, oldest first."""
+    key = record_key(table, str(target_id))
+    rows = []
+    for (filename,) in db.session.query(AuditSegment.filename).order_by(AuditSegment.first_id):
+        rows.extend(read_record(os.path.join(archive_dir, filename), key))
+    rows.sort(key=lambda row: (row[5] or '', row[0]))
+    return [row_to_dict(row) for row in rows]
+
+def archive_audit_logs(archive_dir, cutoff, segment_rows=SEGMENT_ROWS):
+    """
+    Move audit rows older than `cutoff` into new segments, at most
+    `segment_rows` per segment. Returns (segments written, rows archived).
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    table = AuditLog.__table__
+    segments = archived = 0
+    while True:
+        rows = db.session.execute(
+            db.select(table).where(table.c.timestamp < cutoff).order_by(table.c.id).limit(segment_rows)
+        ).all()
+        if not rows:
+            break
+        first_id, last_id = rows[0].id, rows[-1].id
+        filename = f"audit-{first_id:012d}-{last_id:012d}.seg"
+        path = os.path.join(archive_dir, filename)
+        size = write_segment(path, rows)
+        timestamps = [row.timestamp for row in rows if row.timestamp]
+        try:
+            db.session.add(AuditSegment(
+                filename=filename, row_count=len(rows), first_id=first_id, last_id=last_id,
+                first_timestamp=min(timestamps, default=None), last_timestamp=max(timestamps, default=None),
+                size=size
+            ))
+            # Rows committed later than the read got higher ids or recent timestamps
+            for chunk_start in range(first_id, last_id + 1, DELETE_CHUNK):
+                db.session.execute(table.delete().where(
+                    table.c.id >= chunk_start, table.c.id < min(chunk_start + DELETE_CHUNK, last_id + 1),
+                    table.c.timestamp < cutoff
+                ))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            os.remove(path)
+            raise
+        segments += 1
+        archived += len(rows)
+    return segments, archived
+
+def compact_audit_logs(batch_size=5000):
+    """Re-encode rows still stored as JSON text into payloads; returns the number converted."""
+    table = AuditLog.__table__
+    converted = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.action, table.c.old_value, table.c.new_value)
+            .where(table.c.id > last_id, table.c.payload == None)
+            .order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            old, new = audit_values(None, row.old_value, row.new_value)
+            updates.append({'row_id': row.id, 'payload': encode_audit_payload(row.action, old, new)})
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('row_id'))
+            .values(payload=bindparam('payload'), old_value=None, new_value=None),
+            updates
+        )
+        db.session.commit()
+        converted += len(rows)
+        last_id = rows[-1].id
+    return converted
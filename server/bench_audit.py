@@ -0,0 +1,117 @@
+"""
+Audit trail overhead benchmark: the original per-object AuditLog listener vs
+the buffered bulk writer in models.py, on a scratch SQLite database.
+
+    python bench_audit.py [--requests 500] [--bulk 2000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, date
+from flask import Flask
+from sqlalchemy import event, inspect
+import models
+from models import db, AuditLog, Patient, Exam, get_current_user, object_to_dict, serialize_value
+
+def legacy_after_flush(session, flush_context):
+    """The listener as it was before the buffered writer (one ORM AuditLog per row)."""
+    user_id = get_current_user()
+    for obj in session.new:
+        if isinstance(obj, AuditLog): continue
+        session.add(AuditLog(user_id=user_id, target_table=obj.__tablename__,
+                             target_id=str(getattr(obj, 'id', 'N/A')), action='INSERT',
+                             new_value=json.dumps(object_to_dict(obj)), timestamp=datetime.utcnow()))
+    for obj in session.dirty:
+        if isinstance(obj, AuditLog): continue
+        state = inspect(obj)
+        changes, old_values = {}, {}
+        for attr in state.attrs:
+            hist = attr.history
+            if hist.has_changes():
+                changes[attr.key] = serialize_value(hist.added[0] if hist.added else None)
+                old_values[attr.key] = serialize_value(hist.deleted[0] if hist.deleted else None)
+        if changes:
+            session.add(AuditLog(user_id=user_id, target_table=obj.__tablename__,
+                                 target_id=str(getattr(obj, 'id', 'N/A')), action='UPDATE',
+                                 old_value=json.dumps(old_values), new_value=json.dumps(changes),
+                                 timestamp=datetime.utcnow()))
+
+BUFFERED_LISTENERS = [
+    ('after_flush', models.receive_after_flush),
+    ('before_commit', models.write_audit_buffer),
+    ('after_commit', models.hand_off_audit_buffer),
+    ('after_rollback', models.discard_audit_buffer),
+]
+
+def use_legacy(enabled):
+    for name, fn in BUFFERED_LISTENERS:
+        if enabled and event.contains(db.Session, name, fn):
+            event.remove(db.Session, name, fn)
+        elif not enabled and not event.contains(db.Session, name, fn):
+            event.listen(db.Session, name, fn)
+    if enabled and not event.contains(db.Session, 'after_flush', legacy_after_flush):
+        event.listen(db.Session, 'after_flush', legacy_after_flush)
+    elif not enabled and event.contains(db.Session, 'after_flush', legacy_after_flush):
+        event.remove(db.Session, 'after_flush', legacy_after_flush)
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    return app
+
+def run_requests(prefix, patient_id, count):
+    """Register + complete `count` exams, one commit each, like the API does."""
+    start = time.perf_counter()
+    for i in range(count):
+        exam = Exam(id=f"{prefix}-{i}", patient_id=patient_id, exam_type="MRI",
+                    exam_date=date.today(), price=100000, payment_status="Paid")
+        db.session.add(exam)
+        db.session.commit()
+        exam.status = 'Completed'
+        exam.scan_end = datetime.now()
+        exam.assigned_tech = 'bench'
+        db.session.commit()
+    return (time.perf_counter() - start) / (count * 2)
+
+def run_bulk(prefix, patient_id, count):
+    """Insert then update `count` exams in a single transaction each."""
+    start = time.perf_counter()
+    exams = [Exam(id=f"{prefix}-bulk-{i}", patient_id=patient_id, exam_type="MRI",
+                  exam_date=date.today()) for i in range(count)]
+    db.session.add_all(exams)
+    db.session.commit()
+    for exam in exams:
+        exam.internal_notes = 'bulk'
+    db.session.commit()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--bulk", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "bench.db"))
+        with app.app_context():
+            db.create_all()
+            patient = Patient(first_name="Bench", last_name="Patient", national_id="bench")
+            db.session.add(patient)
+            db.session.commit()
+            for label, legacy in (("legacy", True), ("buffered", False)):
+                use_legacy(legacy)
+                results[label] = {
+                    "per_commit_ms": round(run_requests(label, patient.id, args.requests) * 1000, 3),
+                    "bulk_s": round(run_bulk(label, patient.id, args.bulk), 3),
+                }
+            use_legacy(False)
+            results["audit_rows"] = AuditLog.query.count()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
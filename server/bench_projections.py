@@ -0,0 +1,93 @@
+"""
+Exam list serialization benchmark: ORM hydration + Exam.to_dict + stdlib json
+(the previous list path) vs the column projections in projections.py encoded
+by FastJSONProvider, on a scratch SQLite database.
+
+    python bench_projections.py [--exams 20000] [--notes-size 2000] [--runs 3]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from flask import Flask
+from sqlalchemy.orm import joinedload
+from models import db, Patient, Doctor, Exam
+from projections import exam_rows_query, row_to_dict
+from json_provider import FastJSONProvider
+
+def seed(count, notes_size):
+    doctor = Doctor(name="Bench Doctor", hospital="Bench Hospital")
+    db.session.add(doctor)
+    db.session.flush()
+    patients = [{"first_name": f"First{i}", "last_name": f"Last{i}", "national_id": f"NID{i:08d}"}
+                for i in range(count)]
+    db.session.execute(Patient.__table__.insert(), patients)
+    now = datetime.now()
+    exams = [{
+        "id": f"bench-{i}", "patient_id": i + 1, "exam_type": "MRI Brain", "exam_date": date.today(),
+        "time_slot": "09:00", "has_contrast": bool(i % 2), "price": 250000.0, "discount": 0.0,
+        "payment_status": "Paid", "payment_method": "Card", "info_source": "Referred",
+        "assigned_tech": "tech", "mri_machine_id": "MRI-1", "scan_start": now - timedelta(minutes=i),
+        "scan_end": now - timedelta(minutes=i) + timedelta(minutes=30), "status": "Completed",
+        "radiologist_name": "Dr. R", "radiologist_license": "R-1", "report_status": "Draft",
+        "internal_notes": "x" * notes_size, "file_url": None, "referring_doctor_id": doctor.id,
+        "incentive_status": "Pending", "incentive_amount": 50000.0, "is_locked": False,
+        "created_at": now, "updated_at": now,
+    } for i in range(count)]
+    db.session.execute(Exam.__table__.insert(), exams)
+    db.session.commit()
+
+def orm_path(role):
+    exams = Exam.query.options(joinedload(Exam.patient), joinedload(Exam.referring_doctor)) \
+        .filter(Exam.status == 'Completed').order_by(Exam.scan_end.desc()).all()
+    return json.dumps([e.to_dict(role=role) for e in exams], sort_keys=True)
+
+def projection_path(role, provider, include_notes):
+    rows = exam_rows_query(role, include_notes=include_notes) \
+        .filter(Exam.status == 'Completed').order_by(Exam.scan_end.desc()).all()
+    return provider.dumps([row_to_dict(row) for row in rows])
+
+def measure(fn, runs):
+    best = None
+    for _ in range(runs):
+        db.session.expunge_all()
+        tracemalloc.start()
+        start = time.perf_counter()
+        body = fn()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if best is None or elapsed < best["seconds"]:
+            best = {"seconds": round(elapsed, 4), "peak_mb": round(peak / 2**20, 2), "bytes": len(body)}
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--exams", type=int, default=20000)
+    parser.add_argument("--notes-size", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        provider = FastJSONProvider(app)
+        with app.app_context():
+            db.create_all()
+            seed(args.exams, args.notes_size)
+            for role in ("Technician", "Admin"):
+                results[role] = {
+                    "orm_to_dict": measure(lambda: orm_path(role), args.runs),
+                    "projection": measure(lambda: projection_path(role, provider, True), args.runs),
+                    "projection_no_notes": measure(lambda: projection_path(role, provider, False), args.runs),
+                }
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Endpoint load benchmark: drives every route in app.py with role JWTs against
+DATABASE_URL (fill it with seed_data.py first) and writes per-endpoint
+p50/p95/p99 latency, throughput and SQL statement counts as JSON. Write
+routes really write, so point it at a scratch database.
+
+    DATABASE_URL=sqlite:////tmp/load.db python bench_routes.py [--iterations 30] [--output bench.json]
+    python bench_routes.py --url http://localhost:5000 --concurrency 8   # running server, same DB and JWT secret
+    python bench_routes.py --compare before.json after.json [--threshold 0.2]
+
+In --url mode the server needs SQL_QUERY_BUDGET set (any large value) to report
+statement counts. Streamed exports send their headers before running the query,
+so they always report 0.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Any budget > 0 makes every response carry X-SQL-Statements
+os.environ.setdefault("SQL_QUERY_BUDGET", "1000000")
+
+from flask_jwt_extended import create_access_token
+from app import app
+from models import db, AuditLog, Doctor, Exam, Patient, User
+from pagination import encode_cursor
+from scheduling import free_slots
+
+ROLES = ("Admin", "Technician", "Reception")
+
+class Case:
+    """One endpoint call; path/body may be callables of the iteration number."""
+    def __init__(self, rule, method, path, role, body=None, raw=None, content_type=None,
+                 iterations=None, stream_first=False, name=None):
+        self.rule = rule
+        self.variant = name
+        self.method = method
+        self.path = path
+        self.role = role
+        self.body = body
+        self.raw = raw
+        self.content_type = content_type
+        self.iterations = iterations
+        self.stream_first = stream_first
+
+    @property
+    def name(self):
+        return f"{self.method} {self.rule}" + (f" ({self.variant})" if self.variant else "")
+
+    def resolve(self, value, i):
+        return value(i) if callable(value) else value
+
+def sample_data():
+    """Ids the cases need, read from the database once."""
+    today = datetime.now().date()
+    def ids(query, limit=500):
+        return [row[0] for row in query.limit(limit).all()]
+    data = {
+        "pending": ids(db.session.query(Exam.id).filter(Exam.status == 'Pending', Exam.is_locked == False)),
+        "completed": ids(db.session.query(Exam.id).filter(Exam.status == 'Completed', Exam.is_locked == False)),
+        "exam": db.session.query(Exam.id).order_by(Exam.created_at.desc()).limit(1).scalar(),
+        "patient": db.session.query(Patient.id, Patient.national_id, Patient.last_name).order_by(Patient.id.desc()).first(),
+        "doctor": db.session.query(Doctor.id).order_by(Doctor.id).limit(1).scalar(),
+        "login": "bench_admin" if db.session.query(User.id).filter_by(username="bench_admin").first() else None,
+        "today": today.isoformat(),
+        "rows": {
+            "exams": db.session.query(db.func.count(Exam.id)).scalar(),
+            "patients": db.session.query(db.func.count(Patient.id)).scalar(),
+            "doctors": db.session.query(db.func.count(Doctor.id)).scalar(),
+            "audit_logs": db.session.query(db.func.count(AuditLog.id)).scalar(),
+        },
+    }
+    if not data["patient"]:
+        raise SystemExit("No patients in the database; run seed_data.py first")
+    return data
+
+def build_cases(data, iterations):
+    run = uuid.uuid4().hex[:6]
+    patient_id, national_id, last_name = data["patient"]
+    start = (datetime.now() - timedelta(days=90)).date().isoformat()
+    created_users = []
+
+    def take(pool):
+        return lambda i: pool[i % len(pool)] if pool else "missing"
+
+    def import_csv(i):
+        rows = ["national_id,first_name,last_name,phone,exam_type,exam_date,price,payment_status"]
+        rows += [f"B{run}{i:04d}{n:03d},Bench,Import{n},0912000{n:04d},MRI Brain,{data['today']},4500000,Paid"
+                 for n in range(100)]
+        return ("\n".join(rows) + "\n").encode()
+
+    def new_user(i):
+        created_users.append(f"bench_{run}_{i}")
+        return {"username": created_users[-1], "password": "bench", "role": "Reception"}
+
+    pending, completed = take(data["pending"]), take(data["completed"])
+    # Non-overlapping free starts, a month out, for the booking registrations
+    booking_starts, machine_free_at = [], {}
+    for slot in free_slots("MRI Brain", after=datetime.now() + timedelta(days=30), count=iterations * 4):
+        if slot["start"] >= machine_free_at.get(slot["machine_id"], ""):
+            booking_starts.append(slot)
+            machine_free_at[slot["machine_id"]] = slot["end"]
+    booking_starts = booking_starts[:iterations]
+    # A client that is up to date: the delta-sync check finds nothing
+    synced = encode_cursor(datetime.utcnow() - timedelta(seconds=app.config["EXAM_SYNC_LAG_SECONDS"]), '')
+    login = ({"username": data["login"], "password": "bench"} if data["login"]
+             else {"username": "admin", "password": "admin123"})
+    cases = [
+        # Reads first, so they see the seeded data
+        Case("/api/exams/today", "GET", "/api/exams/today?limit=100", "Reception"),
+        Case("/api/exams/pending", "GET", "/api/exams/pending?limit=100", "Technician"),
+        Case("/api/exams/reports", "GET", "/api/exams/reports?limit=100", "Technician"),
+        Case("/api/exams/changes", "GET", "/api/exams/changes?limit=500", "Technician", name="full"),
+        Case("/api/exams/changes", "GET", f"/api/exams/changes?since={synced}.{synced}", "Technician", name="idle"),
+        Case("/api/patients/by-national-id", "GET", f"/api/patients/by-national-id?national_id={national_id}", "Reception"),
+        Case("/api/patients/search", "GET", f"/api/patients/search?q={last_name[:5]}", "Reception"),
+        Case("/api/doctors", "GET", "/api/doctors", "Reception"),
+        Case("/api/machines", "GET", "/api/machines", "Reception"),
+        Case("/api/schedule", "GET", f"/api/schedule?date={data['today']}", "Reception"),
+        Case("/api/schedule/free-slots", "GET", "/api/schedule/free-slots?exam_type=MRI%20Spine&contrast=1&count=10",
+             "Reception"),
+        Case("/api/admin/users", "GET", "/api/admin/users", "Admin"),
+        Case("/api/admin/audit-logs", "GET", "/api/admin/audit-logs", "Admin"),
+        Case("/api/admin/audit-logs/history/<table>/<target_id>", "GET",
+             f"/api/admin/audit-logs/history/exams/{data['exam']}", "Admin"),
+        Case("/api/admin/audit-logs/by-user/<path:user_id>", "GET", "/api/admin/audit-logs/by-user/bench_tech", "Admin"),
+        Case("/api/admin/bonus-report", "GET", "/api/admin/bonus-report?weeks=4", "Admin"),
+        Case("/api/admin/revenue-week", "GET", "/api/admin/revenue-week", "Admin"),
+        Case("/api/admin/summary", "GET", "/api/admin/summary", "Admin"),
+        Case("/api/admin/revenue", "GET", "/api/admin/revenue?weeks=52&group=month", "Admin"),
+        Case("/api/admin/lock-status", "GET", "/api/admin/lock-status", "Admin"),
+        Case("/api/admin/export/exams", "GET", f"/api/admin/export/exams?format=ndjson&date_from={start}", "Admin",
+             iterations=max(1, iterations // 10)),
+        Case("/api/admin/export/audit-logs", "GET", f"/api/admin/export/audit-logs?date_from={start}", "Admin",
+             iterations=max(1, iterations // 10)),
+        Case("/api/exams/events", "GET", "/api/exams/events", "Technician", stream_first=True),
+        Case("/metrics", "GET", "/metrics", None),
+        Case("/api/auth/login", "POST", "/api/auth/login", None, body=login, iterations=max(1, iterations // 5)),
+        # Writes
+        Case("/api/patients", "POST", "/api/patients", "Reception", body=lambda i: {
+            "first_name": "Bench", "last_name": f"Patient{i}", "national_id": f"P{run}{i:06d}", "phone": "09120000000"}),
+        Case("/api/exams/register", "POST", "/api/exams/register", "Reception", body=lambda i: {
+            "patient_id": patient_id, "exam_type": "MRI Brain", "exam_date": data["today"],
+            "price": 4500000, "payment_status": "Paid"}),
+        Case("/api/exams/register", "POST", "/api/exams/register", "Reception", body=lambda i: {
+            "patient_id": patient_id, "exam_type": "MRI Brain", "price": 4500000, "payment_status": "Paid",
+            "slot_start": booking_starts[i]["start"], "mri_machine_id": booking_starts[i]["machine_id"]},
+             iterations=len(booking_starts) or None, name="booked"),
+        Case("/api/exams/complete", "PATCH", "/api/exams/complete", "Technician", body=lambda i: {
+            "exam_id": pending(i), "assigned_tech": "bench", "mri_machine_id": "MRI-1",
+            "scan_start": datetime.now().isoformat(), "scan_end": datetime.now().isoformat()},
+             iterations=min(iterations, len(data["pending"])) or None),
+        Case("/api/exams/report", "PATCH", "/api/exams/report", "Technician", body=lambda i: {
+            "exam_id": completed(i), "report_status": "Final", "internal_notes": f"Bench note {i}"}),
+        Case("/api/exams/complete/batch", "PATCH", "/api/exams/complete/batch", "Technician", body=lambda i: {
+            "items": [{"exam_id": pending(i * 25 + n), "assigned_tech": "bench", "mri_machine_id": "MRI-1",
+                       "scan_start": datetime.now().isoformat(), "scan_end": datetime.now().isoformat()}
+                      for n in range(25)]},
+             iterations=max(1, iterations // 5)),
+        Case("/api/exams/report/batch", "PATCH", "/api/exams/report/batch", "Technician", body=lambda i: {
+            "items": [{"exam_id": completed(i * 25 + n), "report_status": "Final", "internal_notes": f"Bench note {n}"}
+                      for n in range(25)]},
+             iterations=max(1, iterations // 5)),
+        Case("/api/machines", "POST", "/api/machines", "Admin", body=lambda i: {
+            "id": f"BENCH-{run}", "opens_at": "08:00", "closes_at": "20:00", "is_active": False}),
+        Case("/api/doctors", "POST", "/api/doctors", "Admin", body=lambda i: {
+            "name": f"Dr. Bench {i}", "hospital": "Bench", "license_no": f"BENCH-{run}-{i}", "role": "Referring"}),
+        Case("/api/admin/users", "POST", "/api/admin/users", "Admin", body=new_user, iterations=max(1, iterations // 5)),
+        Case("/api/admin/users", "DELETE", "/api/admin/users", "Admin",
+             body=lambda i: {"username": created_users[i] if i < len(created_users) else "missing"},
+             iterations=max(1, iterations // 5)),
+        Case("/api/import", "POST", "/api/import?format=csv", "Admin", raw=import_csv, content_type="text/csv",
+             iterations=max(1, iterations // 5)),
+        Case("/api/admin/lock-previous-week", "POST", "/api/admin/lock-previous-week", "Admin",
+             iterations=max(1, iterations // 5)),
+    ]
+    return cases
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+class InProcessClient:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def call(self, case, i, headers):
+        body = case.resolve(case.body, i)
+        raw = case.resolve(case.raw, i)
+        kwargs = {"headers": headers}
+        if body is not None:
+            kwargs["json"] = body
+        elif raw is not None:
+            kwargs["data"] = raw
+            kwargs["content_type"] = case.content_type
+        start = time.perf_counter()
+        if case.stream_first:
+            response = self.client.open(case.resolve(case.path, i), method=case.method, buffered=False, **kwargs)
+            for chunk in response.response:
+                if b"event:" in (chunk if isinstance(chunk, bytes) else chunk.encode()):
+                    break
+            response.close()
+        else:
+            response = self.client.open(case.resolve(case.path, i), method=case.method, **kwargs)
+            response.get_data()
+        elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, response.headers.get("X-SQL-Statements")
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def call(self, case, i, headers):
+        body = case.resolve(case.body, i)
+        raw = case.resolve(case.raw, i)
+        headers = dict(headers)
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        elif raw is not None:
+            data = raw
+            headers["Content-Type"] = case.content_type
+        request = urllib.request.Request(self.base_url + case.resolve(case.path, i), data=data,
+                                         headers=headers, method=case.method)
+        start = time.perf_counter()
+        try:
+            response = urllib.request.urlopen(request, timeout=300)
+        except urllib.error.HTTPError as e:
+            response = e
+        with response:
+            if case.stream_first:
+                for line in response:
+                    if line.startswith(b"event:"):
+                        break
+            else:
+                response.read()
+        elapsed = time.perf_counter() - start
+        return response.status, elapsed, response.headers.get("X-SQL-Statements")
+
+def run_case(client, case, iterations, concurrency, tokens):
+    headers = {"Authorization": f"Bearer {tokens[case.role]}"} if case.role else {}
+    count = case.iterations or iterations
+    latencies, statuses, statements = [], {}, []
+    lock = threading.Lock()
+
+    def one(i):
+        status, elapsed, sql = client.call(case, i, headers)
+        with lock:
+            latencies.append(elapsed * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+            if sql is not None:
+                statements.append(int(sql))
+
+    started = time.perf_counter()
+    if concurrency > 1 and not isinstance(client, InProcessClient):
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(count)))
+    else:
+        for i in range(count):
+            one(i)
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": count,
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "errors": sum(v for k, v in statuses.items() if k >= 500),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "max_ms": round(latencies[-1], 3),
+        "throughput_rps": round(count / wall, 2) if wall else None,
+        "sql_statements": {
+            "mean": round(sum(statements) / len(statements), 2),
+            "max": max(statements),
+        } if statements else None,
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark(args):
+    with app.app_context():
+        tokens = {role: create_access_token(identity=f"bench_{role.lower()}", additional_claims={"role": role})
+                  for role in ROLES}
+        data = sample_data()
+        cases = build_cases(data, args.iterations)
+        dialect = db.engine.dialect.name
+        db.session.remove()
+    if args.only:
+        cases = [case for case in cases if any(part in case.name for part in args.only)]
+
+    client = HttpClient(args.url) if args.url else InProcessClient()
+    endpoints = {}
+    for case in cases:
+        if args.warmup and case.method == "GET" and not case.stream_first:
+            run_case(client, case, 1, 1, tokens)
+        endpoints[case.name] = run_case(client, case, args.iterations, args.concurrency, tokens)
+        print(f"{case.name:60} p50 {endpoints[case.name]['p50_ms']:>9} ms  "
+              f"p95 {endpoints[case.name]['p95_ms']:>9} ms", file=sys.stderr)
+
+    covered = {(case.method, case.rule) for case in cases}
+    routes = {(method, rule.rule) for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+              for method in rule.methods - {'HEAD', 'OPTIONS'}}
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "mode": "http" if args.url else "in-process",
+            "concurrency": args.concurrency if args.url else 1,
+            "iterations": args.iterations,
+            "database": dialect,
+            "rows": data["rows"],
+        },
+        "endpoints": endpoints,
+        "not_covered": sorted(f"{method} {rule}" for method, rule in routes - covered) if not args.only else [],
+    }
+
+def compare(before_path, after_path, threshold):
+    """Print p50/p95 changes per endpoint; returns the number of p95 regressions."""
+    with open(before_path) as f:
+        before = json.load(f)["endpoints"]
+    with open(after_path) as f:
+        after = json.load(f)["endpoints"]
+    regressions = 0
+    print(f"{'endpoint':60} {'p50 before':>11} {'after':>9} {'p95 before':>11} {'after':>9} {'change':>8}  sql")
+    for name in sorted(set(before) | set(after)):
+        old, new = before.get(name), after.get(name)
+        if not old or not new:
+            print(f"{name:60} {'only in ' + ('after' if new else 'before'):>52}")
+            continue
+        change = new["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        regressions += bool(flag)
+        old_sql = (old.get("sql_statements") or {}).get("mean")
+        new_sql = (new.get("sql_statements") or {}).get("mean")
+        print(f"{name:60} {old['p50_ms']:>11} {new['p50_ms']:>9} {old['p95_ms']:>11} {new['p95_ms']:>9} "
+              f"{change:>+8.0%}  {old_sql} -> {new_sql}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=30, help="Requests per endpoint")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process test client")
+    parser.add_argument("--concurrency", type=int, default=1, help="Parallel requests per endpoint (--url only)")
+    parser.add_argument("--warmup", action="store_true", help="One untimed call per read endpoint first")
+    parser.add_argument("--only", nargs="*", help="Only endpoints whose 'METHOD /rule' contains one of these")
+    parser.add_argument("--output", help="Write the JSON results here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 increase counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    results = benchmark(args)
+    body = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body + "\n")
+    else:
+        print(body)
+
+if __name__ == "__main__":
+    main()
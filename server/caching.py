@@ -0,0 +1,184 @@
+import hashlib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import event, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, CacheVersion, CachedResult, Doctor
+
+# --- Versioned Response Cache ---
+# Serialized responses are cached per worker process and tagged with a version
+# counter stored in cache_versions. Writes to a tracked model bump the counter
+# inside the same transaction, so every worker sees the change on its next read.
+
+TRACKED_MODELS = {Doctor: 'doctors'}
+
+def _bump_statement(dialect_name):
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    table = CacheVersion.__table__
+    # One statement, so two first writes can't both try to insert the row
+    return insert(table).on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={'version': table.c.version + 1}
+    )
+
+def bump_version(connection, name):
+    stmt = _bump_statement(connection.dialect.name)
+    if stmt is not None:
+        connection.execute(stmt, [{'name': name, 'version': 1}])
+        return
+    table = CacheVersion.__table__
+    result = connection.execute(
+        table.update().where(table.c.name == name).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert(), [{'name': name, 'version': 1}])
+
+@event.listens_for(db.Session, 'after_flush')
+def bump_cache_versions(session, flush_context):
+    changed = {
+        TRACKED_MODELS[type(obj)]
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if type(obj) in TRACKED_MODELS
+    }
+    if changed:
+        connection = session.connection()
+        for name in sorted(changed):
+            bump_version(connection, name)
+
+def current_version(name):
+    version = db.session.query(CacheVersion.version).filter(CacheVersion.name == name).scalar()
+    return version or 0
+
+class VersionedCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, build):
+        """
+        (body, etag) for `name`, rebuilding with build() -> str when the stored
+        version has moved past the cached one.
+        """
+        version = current_version(name)
+        entry = self._entries.get(name)
+        if entry and entry[0] == version:
+            return entry[1], entry[2]
+        body = build()
+        etag = f"{name}-{version}-{hashlib.sha1(body.encode()).hexdigest()[:12]}"
+        with self._lock:
+            cached = self._entries.get(name)
+            if not cached or cached[0] <= version:
+                self._entries[name] = (version, body, etag)
+        return body, etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SharedCache:
+    """
+    TTL cache kept in cached_results, so all workers share one copy of each
+    entry. An entry is stale once it expires or its version counter moves on.
+    Rebuilds are single-flight: the first worker to miss takes a lease on the
+    row and builds, and every other thread or worker waits for its result
+    rather than running the same queries.
+    """
+    def __init__(self, lease_seconds=30, poll_interval=0.05):
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._entries = {}
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, ttl, build):
+        """Body for `name`, rebuilt with build() -> str when stale."""
+        # Bookkeeping uses short-lived connections of its own, never the
+        # session's: threads waiting on a rebuild must not hold pool connections
+        table = CacheVersion.__table__
+        with db.engine.connect() as connection:
+            version = connection.execute(
+                db.select(table.c.version).where(table.c.name == name)
+            ).scalar() or 0
+        entry = self._fresh_entry(name, version)
+        if entry:
+            return entry
+        with self._lock:
+            building = self._building.setdefault(name, threading.Lock())
+        # One thread per worker goes to the shared row; the rest wait for it here
+        with building:
+            return self._fresh_entry(name, version) or self._get_shared(name, version, ttl, build)
+
+    def _fresh_entry(self, name, version):
+        entry = self._entries.get(name)
+        if entry and entry[0] >= version and entry[2] > datetime.utcnow():
+            return entry[1]
+        return None
+
+    def _get_shared(self, name, version, ttl, build):
+        table = CachedResult.__table__
+        deadline = time.monotonic() + self.lease_seconds
+        while True:
+            with db.engine.connect() as connection:
+                row = connection.execute(
+                    db.select(table.c.version, table.c.body, table.c.expires_at).where(table.c.name == name)
+                ).first()
+            if row and row.body is not None and row.version >= version and row.expires_at > datetime.utcnow():
+                self._entries[name] = (row.version, row.body, row.expires_at)
+                return row.body
+            lease = self._take_lease(name)
+            if lease or time.monotonic() >= deadline:
+                # Past the deadline the lease holder is presumably gone: build anyway
+                break
+            time.sleep(self.poll_interval)
+
+        try:
+            body = build()
+        except Exception:
+            if lease:
+                with db.engine.begin() as connection:
+                    connection.execute(table.update().where(
+                        table.c.name == name, table.c.lease == lease
+                    ).values(lease=None, lease_until=None))
+            raise
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        if lease:
+            with db.engine.begin() as connection:
+                connection.execute(table.update().where(table.c.name == name, table.c.lease == lease).values(
+                    version=version, body=body, expires_at=expires_at, lease=None, lease_until=None))
+        self._entries[name] = (version, body, expires_at)
+        return body
+
+    def _take_lease(self, name):
+        """A lease id if this caller may rebuild `name` now, else None."""
+        table = CachedResult.__table__
+        lease = uuid.uuid4().hex
+        now = datetime.utcnow()
+        with db.engine.begin() as connection:
+            taken = connection.execute(table.update().where(
+                table.c.name == name, or_(table.c.lease_until == None, table.c.lease_until < now)
+            ).values(lease=lease, lease_until=now + timedelta(seconds=self.lease_seconds)))
+            if taken.rowcount:
+                return lease
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.insert(), [{
+                    'name': name, 'version': 0, 'lease': lease,
+                    'lease_until': now + timedelta(seconds=self.lease_seconds),
+                }])
+        except IntegrityError:
+            # The row exists and someone else holds the lease
+            return None
+        return lease
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+response_cache = VersionedCache()
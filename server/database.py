@@ -0,0 +1,72 @@
+from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from models import db
+
+# --- Engine Setup ---
+# Pool sizing for every engine (per worker process), SQLite pragmas so
+# several gunicorn workers can share one database file, and opt-in routing of
+# read-only report routes to DATABASE_REPLICA_URL.
+
+SQLITE_SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+def normalize_database_url(url):
+    # Railway and Heroku hand out postgres://, which SQLAlchemy no longer accepts
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+def is_memory_sqlite(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+    )
+
+def engine_options(url, config):
+    """create_engine() keyword arguments for `url` from the DB_POOL_* settings."""
+    options = {"pool_pre_ping": config["DB_POOL_PRE_PING"]}
+    if is_memory_sqlite(url):
+        # One shared connection (StaticPool); sizing doesn't apply
+        return options
+    options.update(
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+        pool_recycle=config["DB_POOL_RECYCLE"],
+    )
+    return options
+
+def sqlite_pragmas(busy_timeout_ms, synchronous):
+    """
+    connect listener: WAL lets readers run alongside the single writer,
+    busy_timeout makes a writer wait for the lock instead of failing with
+    "database is locked", and synchronous=NORMAL is safe under WAL.
+    """
+    if synchronous.upper() not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"Invalid SQLITE_SYNCHRONOUS, expected one of {', '.join(SQLITE_SYNCHRONOUS_MODES)}")
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            # In-memory databases answer "memory" and stay that way
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA synchronous={synchronous.upper()}")
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        finally:
+            cursor.close()
+    return set_pragmas
+
+def init_database(app):
+    listener = sqlite_pragmas(app.config["SQLITE_BUSY_TIMEOUT_MS"], app.config["SQLITE_SYNCHRONOUS"])
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', listener)
+
+def replica_reads(f):
+    """Route the view's reads to the read replica, when one is configured."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        db.session.info['use_replica'] = True
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from models import db, Exam, ExamTombstone
+from pagination import DEFAULT_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor, keyset_query
+from projections import row_to_dict
+
+# --- Exam Delta Sync ---
+# Clients that keep a local copy of the exam list refresh it with what changed
+# after their cursor instead of downloading the list again. Two streams:
+# exams in (updated_at, id) order (ix_exams_updated_at), with cancelled ones
+# turned into tombstones, and exam_tombstones in (deleted_at, exam_id) order,
+# written in the flush that deletes an exam. The cursor holds a position in
+# each. As in the Sheets sync, rows stamped in the last few seconds are left
+# for the next call (a transaction still open may commit an earlier stamp),
+# which also lets a cursor move up to that horizon when nothing changed, so an
+# idle check is one short index range per stream. Tombstones are pruned after
+# a retention window; a cursor older than that can't be served and the client
+# starts over.
+
+DEFAULT_LAG_SECONDS = 5
+DEFAULT_TOMBSTONE_RETENTION_DAYS = 30
+TOMBSTONE_STATUSES = {'Cancelled'}
+
+class CursorExpired(Exception):
+    pass
+
+@event.listens_for(db.Session, 'after_flush')
+def record_exam_tombstones(session, flush_context):
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Exam)]
+    if deleted:
+        now = datetime.utcnow()
+        session.connection().execute(
+            ExamTombstone.__table__.insert(), [{'exam_id': exam_id, 'deleted_at': now} for exam_id in deleted]
+        )
+
+def split_cursor(cursor, retention_days):
+    """(exams cursor, tombstones cursor) of a sync cursor; the exams part is '' before the first exam."""
+    exam_part, dot, tombstone_part = cursor.partition('.')
+    if not dot:
+        raise InvalidCursor("Missing tombstone position")
+    if exam_part:
+        decode_cursor(exam_part, Exam.updated_at)
+    deleted_after, _ = decode_cursor(tombstone_part, ExamTombstone.deleted_at)
+    if deleted_after is None or deleted_after < datetime.utcnow() - timedelta(days=retention_days):
+        raise CursorExpired("Cursor is older than the tombstone retention; sync again without since")
+    return exam_part, tombstone_part
+
+def since_range(query, sort_col, position, horizon):
+    """
+    Rows stamped up to the horizon; from the position on too, as a plain range
+    bound, so the planner seeks the (stamp, id) index instead of reading
+    every newer row for the keyset's OR and sorting them.
+    """
+    query = query.filter(sort_col <= horizon)
+    if position:
+        since, _ = decode_cursor(position, sort_col)
+        if since is not None:
+            query = query.filter(sort_col >= since)
+    return query
+
+def next_position(rows, limit, sort_key, id_key, horizon):
+    """Cursor after `rows`: the last row of a full page, else the horizon (everything up to it was seen)."""
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        return encode_cursor(getattr(last, sort_key), getattr(last, id_key)), True
+    return encode_cursor(horizon, ''), False
+
+def exam_changes(query, cursor=None, limit=DEFAULT_PAGE_SIZE, lag_seconds=DEFAULT_LAG_SECONDS,
+                 retention_days=DEFAULT_TOMBSTONE_RETENTION_DAYS):
+    """
+    Exams from `query` (an exam_rows_query projection) written after `cursor`,
+    and exams cancelled or deleted after it; no cursor returns every exam.
+    Clients apply "exams", then "deleted", store "cursor", and call again
+    while "has_more".
+    """
+    horizon = datetime.utcnow() - timedelta(seconds=lag_seconds)
+    if cursor:
+        exam_part, tombstone_part = split_cursor(cursor, retention_days)
+    else:
+        # A new copy holds no exams yet: only deletes from now on matter
+        exam_part, tombstone_part = '', encode_cursor(horizon, '')
+
+    exam_rows = keyset_query(
+        since_range(query.add_columns(Exam.updated_at), Exam.updated_at, exam_part, horizon),
+        Exam.updated_at, Exam.id, exam_part or None, limit, descending=False
+    ).all()
+    tombstone_rows = keyset_query(
+        since_range(db.session.query(ExamTombstone.exam_id, ExamTombstone.deleted_at),
+                    ExamTombstone.deleted_at, tombstone_part, horizon),
+        ExamTombstone.deleted_at, ExamTombstone.exam_id, tombstone_part, limit, descending=False
+    ).all()
+    exam_part, more_exams = next_position(exam_rows, limit, 'updated_at', 'id', horizon)
+    tombstone_part, more_tombstones = next_position(tombstone_rows, limit, 'deleted_at', 'exam_id', horizon)
+
+    exams, deleted = [], []
+    for row in exam_rows[:limit]:
+        if row.status in TOMBSTONE_STATUSES:
+            deleted.append({"id": row.id, "reason": "cancelled", "at": row.updated_at.isoformat()})
+            continue
+        data = row_to_dict(row)
+        data['updated_at'] = row.updated_at.isoformat()
+        exams.append(data)
+    deleted.extend(
+        {"id": row.exam_id, "reason": "deleted", "at": row.deleted_at.isoformat()} for row in tombstone_rows[:limit]
+    )
+    return {
+        "exams": exams,
+        "deleted": deleted,
+        "cursor": f"{exam_part}.{tombstone_part}",
+        "has_more": more_exams or more_tombstones,
+    }
+
+def prune_exam_tombstones(retention_days=DEFAULT_TOMBSTONE_RETENTION_DAYS):
+    """Delete tombstones past the retention window; returns how many."""
+    table = ExamTombstone.__table__
+    result = db.session.execute(table.delete().where(
+        table.c.deleted_at < datetime.utcnow() - timedelta(days=retention_days)
+    ))
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,280 @@
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, inspect, text
+from models import db, Exam, ExamEvent, changed_columns
+
+logger = logging.getLogger(__name__)
+
+# --- Exam Change Feed ---
+# Exam changes are turned into small events during the flush and written to
+# exam_events right before the commit, in the same transaction, so only
+# committed changes are ever published. Each worker runs one broker thread that
+# picks up events from every worker: LISTEN/NOTIFY on Postgres (NOTIFY is
+# delivered on commit), polling the table on SQLite. The table also lets a
+# reconnecting client replay what it missed (Last-Event-ID).
+
+EVENT_BUFFER_KEY = 'exam_events'
+CHANNEL = 'exam_events'
+# Bulk changes (imports, weekly lock) are split so a NOTIFY payload stays small
+MAX_IDS_PER_EVENT = 100
+REPORT_COLUMNS = {'report_status', 'internal_notes', 'file_url', 'radiologist_name', 'radiologist_license'}
+ALL_ROLES = {'reception', 'technician', 'admin'}
+EVENT_ROLES = {
+    'registered': ALL_ROLES,
+    'completed': ALL_ROLES,
+    'updated': ALL_ROLES,
+    'locked': ALL_ROLES,
+    'deleted': ALL_ROLES,
+    'report_updated': {'technician', 'admin'},
+}
+MAX_REPLAY = 1000
+
+class TooManyStreams(Exception):
+    pass
+
+def event_visible(item, role):
+    return (role or '').lower() in EVENT_ROLES.get(item['type'], ALL_ROLES)
+
+def queue_exam_event(session, event_type, exam_ids, **fields):
+    """Publish an event for these exams when the session commits."""
+    buffer = session.info.setdefault(EVENT_BUFFER_KEY, [])
+    exam_ids = [str(exam_id) for exam_id in exam_ids]
+    for start in range(0, len(exam_ids), MAX_IDS_PER_EVENT):
+        buffer.append({'type': event_type, 'exam_ids': exam_ids[start:start + MAX_IDS_PER_EVENT], **fields})
+
+def exam_fields(exam):
+    return {
+        'status': exam.status,
+        'exam_date': exam.exam_date.isoformat() if exam.exam_date else None,
+    }
+
+def classify_change(new):
+    if new.get('is_locked'):
+        return 'locked'
+    if new.get('status') == 'Completed':
+        return 'completed'
+    if REPORT_COLUMNS & new.keys() and not new.keys() - REPORT_COLUMNS - {'updated_at'}:
+        return 'report_updated'
+    return 'updated'
+
+@event.listens_for(db.Session, 'after_flush')
+def collect_exam_events(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Exam):
+            queue_exam_event(session, 'registered', [obj.id], **exam_fields(obj))
+    for obj in session.dirty:
+        if isinstance(obj, Exam):
+            _, new = changed_columns(inspect(obj))
+            if new.keys() - {'updated_at'}:
+                queue_exam_event(session, classify_change(new), [obj.id], **exam_fields(obj))
+    for obj in session.deleted:
+        if isinstance(obj, Exam):
+            queue_exam_event(session, 'deleted', [obj.id])
+
+def write_exam_events(connection, events):
+    """Insert events (assigning their ids) and, on Postgres, NOTIFY them on commit."""
+    now = datetime.utcnow()
+    table = ExamEvent.__table__
+    for payload in events:
+        payload['at'] = now.isoformat()
+    # One multi-row INSERT for the whole buffer; each event gets the id of the
+    # row holding its payload (identical payloads are interchangeable)
+    texts = [json.dumps(payload) for payload in events]
+    rows = [{'payload': body, 'created_at': now} for body in texts]
+    if connection.dialect.insert_executemany_returning:
+        ids_by_payload = {}
+        for event_id, body in connection.execute(table.insert().returning(table.c.id, table.c.payload), rows):
+            ids_by_payload.setdefault(body, []).append(event_id)
+        for id_list in ids_by_payload.values():
+            id_list.sort(reverse=True)
+        ids = [ids_by_payload[body].pop() for body in texts]
+    else:
+        ids = [connection.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+    for payload, event_id in zip(events, ids):
+        payload['id'] = event_id
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text("SELECT pg_notify(:channel, :payload)"),
+                               {'channel': CHANNEL, 'payload': json.dumps(payload)})
+
+@event.listens_for(db.Session, 'before_commit')
+def write_exam_event_buffer(session):
+    session.flush()
+    events = session.info.pop(EVENT_BUFFER_KEY, None)
+    if events:
+        write_exam_events(session.connection(), events)
+
+@event.listens_for(db.Session, 'after_rollback')
+def discard_exam_event_buffer(session):
+    session.info.pop(EVENT_BUFFER_KEY, None)
+
+def row_to_event(event_id, payload):
+    data = json.loads(payload)
+    data['id'] = event_id
+    return data
+
+def latest_event_id():
+    return db.session.query(func.max(ExamEvent.id)).scalar() or 0
+
+def events_after(event_id, limit=MAX_REPLAY):
+    """Stored events after event_id, oldest first; None when more than `limit` were missed."""
+    rows = db.session.query(ExamEvent.id, ExamEvent.payload).filter(
+        ExamEvent.id > event_id
+    ).order_by(ExamEvent.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        return None
+    return [row_to_event(event_id, payload) for event_id, payload in rows]
+
+class EventBroker:
+    """
+    Per-process fan-out of committed exam events to the open streams. The
+    listener thread starts with the first subscriber (after a fork too) and
+    prunes events older than the retention window now and then.
+    """
+    def __init__(self, poll_interval=0.5, retention=timedelta(hours=1), queue_size=1000, max_subscribers=None):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        self.poll_interval = app.config.get("EVENTS_POLL_INTERVAL", self.poll_interval)
+        self.max_subscribers = app.config.get("EVENTS_MAX_STREAMS", self.max_subscribers)
+
+    def subscribe(self):
+        """A queue of live events; TooManyStreams when this process already serves max_subscribers."""
+        self._ensure_started()
+        subscriber = queue.Queue(self.queue_size)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                raise TooManyStreams()
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def dispatch(self, item):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(item)
+            except queue.Full:
+                # A stalled client: drop its backlog and tell it to refetch
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait({'type': 'refresh'})
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='exam-events', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    if db.engine.dialect.name == 'postgresql':
+                        self._listen()
+                    else:
+                        self._poll()
+            except Exception:
+                logger.exception("Exam event listener failed; restarting")
+                time.sleep(1)
+
+    def _prune(self, connection):
+        table = ExamEvent.__table__
+        connection.execute(table.delete().where(table.c.created_at < datetime.utcnow() - self.retention))
+
+    def _poll(self):
+        last_id = latest_event_id()
+        db.session.remove()
+        next_prune = time.monotonic()
+        while True:
+            with db.engine.connect() as connection:
+                rows = connection.execute(
+                    text("SELECT id, payload FROM exam_events WHERE id > :last ORDER BY id LIMIT 500"),
+                    {'last': last_id}
+                ).all()
+                if time.monotonic() >= next_prune:
+                    self._prune(connection)
+                    connection.commit()
+                    next_prune = time.monotonic() + 300
+            for event_id, payload in rows:
+                self.dispatch(row_to_event(event_id, payload))
+                last_id = event_id
+            if len(rows) < 500:
+                time.sleep(self.poll_interval)
+
+    def _listen(self):
+        raw = db.engine.raw_connection()
+        try:
+            connection = raw.driver_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            next_prune = time.monotonic()
+            while True:
+                if select.select([connection], [], [], 5.0)[0]:
+                    connection.poll()
+                    while connection.notifies:
+                        notification = connection.notifies.pop(0)
+                        self.dispatch(json.loads(notification.payload))
+                if time.monotonic() >= next_prune:
+                    with db.engine.begin() as pruning:
+                        self._prune(pruning)
+                    next_prune = time.monotonic() + 300
+        finally:
+            raw.close()
+
+event_broker = EventBroker()
+
+def format_sse(item):
+    lines = []
+    if item.get('id') is not None:
+        lines.append(f"id: {item['id']}")
+    lines.append(f"event: {item['type']}")
+    lines.append(f"data: {json.dumps(item, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+def event_stream(subscriber, role, replay, duration, keepalive=15.0):
+    """SSE body: replayed events, then live ones for `duration` seconds (the client reconnects)."""
+    seen = set()
+    try:
+        yield "retry: 1000\n\n"
+        for item in replay:
+            seen.add(item.get('id'))
+            if event_visible(item, role):
+                yield format_sse(item)
+        deadline = time.monotonic() + duration
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = subscriber.get(timeout=min(keepalive, remaining))
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if item.get('id') in seen:
+                continue
+            if event_visible(item, role):
+                yield format_sse(item)
+    finally:
+        event_broker.unsubscribe(subscriber)
@@ -0,0 +1,40 @@
+import csv
+import io
+from flask import current_app
+
+# --- Streaming Exports ---
+# Rows are fetched in batches through yield_per (a server-side cursor on
+# Postgres) and written out batch by batch, so memory does not depend on the
+# size of the export and the header goes out before the first query result.
+
+BATCH_SIZE = 1000
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def stream_export(query, fields, to_dict, fmt, batch_size=BATCH_SIZE):
+    """Generator of CSV/NDJSON chunks for `query`, each row converted with to_dict(row)."""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    dumps = current_app.json.dumps
+    pending = 0
+    for row in query.yield_per(batch_size):
+        data = to_dict(row)
+        if writer:
+            writer.writerow(data)
+        else:
+            buffer.write(dumps(data, sort_keys=False))
+            buffer.write('\n')
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
@@ -0,0 +1,201 @@
+import hashlib
+import mimetypes
+import os
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import exists
+from sqlalchemy.exc import IntegrityError
+from models import db, ExamFile, StoredFile
+
+# --- Report File Storage ---
+# Uploaded report PDFs and images are stored once per content under
+# REPORT_FILES_DIR/objects/<sha256[:2]>/<sha256>, so re-uploading the same
+# file (or attaching it to another exam) costs no space. An upload is streamed
+# to a temporary file while it is hashed, never held in memory, and only moved
+# into place after the row referencing it has committed. An object is removed
+# (moved aside, then deleted after the commit) in the transaction that drops
+# its last reference, so a concurrent upload of the same content either keeps
+# it alive or puts it back.
+
+CHUNK_SIZE = 1024 * 1024
+# Shown in the browser; anything else is always downloaded as an attachment
+INLINE_TYPES = {'application/pdf', 'image/png', 'image/jpeg', 'image/gif', 'image/webp'}
+STALE_UPLOAD_SECONDS = 24 * 3600
+
+class FileTooLarge(Exception):
+    pass
+
+class ChecksumMismatch(ValueError):
+    pass
+
+class FileStore:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, 'objects', sha256[:2], sha256)
+
+    def receive(self, stream, expected_sha256=None):
+        """
+        Copy `stream` to a temporary file in CHUNK_SIZE pieces, hashing as it
+        goes: (tmp_path, sha256, size). The caller passes tmp_path to place()
+        or discard().
+        """
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise FileTooLarge(f"File is larger than {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            sha256 = digest.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != sha256:
+                raise ChecksumMismatch(f"Content sha256 is {sha256}, expected {expected_sha256}")
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+        return tmp_path, sha256, size
+
+    def place(self, tmp_path, sha256):
+        """Make tmp_path the stored object, unless that content is already stored."""
+        path = self.object_path(sha256)
+        if os.path.exists(path):
+            self.discard(tmp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+    def discard(self, tmp_path):
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def remove_stale_uploads(self, max_age=STALE_UPLOAD_SECONDS):
+        """Delete temporary files left by uploads that died midway; returns how many."""
+        tmp_dir = os.path.join(self.root, 'tmp')
+        if not os.path.isdir(tmp_dir):
+            return 0
+        removed = 0
+        cutoff = time.time() - max_age
+        for name in os.listdir(tmp_dir):
+            path = os.path.join(tmp_dir, name)
+            if os.path.getmtime(path) < cutoff:
+                self.discard(path)
+                removed += 1
+        return removed
+
+def guess_content_type(filename, declared=None):
+    declared = (declared or '').split(';')[0].strip().lower()
+    if declared and declared not in ('application/octet-stream', 'application/x-www-form-urlencoded'):
+        return declared
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+def add_exam_file(store, exam, stream, filename, content_type, user_id, expected_sha256=None):
+    """
+    Store an upload and attach it to `exam`: (exam_file, created). Uploading
+    content the exam already has returns the existing attachment.
+    """
+    tmp_path, sha256, size = store.receive(stream, expected_sha256)
+    try:
+        existing = ExamFile.query.filter_by(exam_id=exam.id, sha256=sha256).first()
+        if existing:
+            store.discard(tmp_path)
+            return existing, False
+        table = StoredFile.__table__
+        if not db.session.query(exists().where(table.c.sha256 == sha256)).scalar():
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(table.insert(), [{'sha256': sha256, 'size': size, 'created_at': datetime.utcnow()}])
+            except IntegrityError:
+                # Stored by a concurrent upload of the same content
+                pass
+        exam_file = ExamFile(
+            id=str(uuid.uuid4()), exam_id=exam.id, sha256=sha256, filename=filename,
+            content_type=guess_content_type(filename, content_type), size=size, uploaded_by=user_id
+        )
+        db.session.add(exam_file)
+        if not exam.file_url:
+            exam.file_url = f"/api/exams/{exam.id}/files/{exam_file.id}"
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        store.discard(tmp_path)
+        raise
+    store.place(tmp_path, sha256)
+    return exam_file, True
+
+def release_objects(store, sha256s):
+    """
+    Within the current transaction, drop stored files nothing references any
+    more. Returns the paths to delete once the transaction has committed; the
+    objects are already moved aside, and restore_objects() puts them back on
+    rollback.
+    """
+    table = StoredFile.__table__
+    moved = []
+    for sha256 in set(sha256s):
+        result = db.session.execute(table.delete().where(
+            table.c.sha256 == sha256, ~exists().where(ExamFile.sha256 == sha256)
+        ))
+        if result.rowcount != 1:
+            continue
+        path = store.object_path(sha256)
+        aside = f"{path}.deleted-{uuid.uuid4().hex}"
+        try:
+            os.replace(path, aside)
+        except FileNotFoundError:
+            continue
+        moved.append((path, aside))
+    return moved
+
+def restore_objects(moved):
+    for path, aside in moved:
+        os.replace(aside, path)
+
+def delete_moved(moved):
+    for path, aside in moved:
+        os.remove(aside)
+
+def delete_exam_file(store, exam, exam_file):
+    sha256 = exam_file.sha256
+    if exam.file_url == f"/api/exams/{exam.id}/files/{exam_file.id}":
+        exam.file_url = None
+    db.session.delete(exam_file)
+    db.session.flush()
+    moved = release_objects(store, [sha256])
+    try:
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        restore_objects(moved)
+        raise
+    delete_moved(moved)
+
+def collect_garbage(store):
+    """Remove stored files no exam references (e.g. after exams were deleted) and stale uploads."""
+    orphans = [sha256 for (sha256,) in db.session.query(StoredFile.sha256).filter(
+        ~exists().where(ExamFile.sha256 == StoredFile.sha256)
+    )]
+    moved = release_objects(store, orphans)
+    try:
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        restore_objects(moved)
+        raise
+    delete_moved(moved)
+    return len(moved), store.remove_stale_uploads()
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Threaded workers: an open exam event stream (/api/exams/events) holds a
+# thread, not a whole worker process. Streams are capped per worker
+# (EVENTS_MAX_STREAMS) so the remaining threads keep serving requests, and
+# several workers share the load.
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Prometheus multi-process mode: workers write their samples here and /metrics
+# merges them. Must be set before the workers import prometheus_client.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "meditrack-metrics"))
+
+# Report jobs: the master runs the worker pool (`flask run-report-worker`) as a
+# child process and restarts it if it exits, so a deployment that only starts
+# gunicorn still runs queued jobs. REPORT_WORKER=off when it runs elsewhere.
+report_worker = {"process": None, "stopping": False}
+
+def on_starting(server):
+    # Samples from a previous run would be merged in as if still live
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+def start_report_worker(server):
+    return subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "app", "run-report-worker"],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+
+def watch_report_worker(server):
+    while not report_worker["stopping"]:
+        code = report_worker["process"].wait()
+        if report_worker["stopping"]:
+            break
+        server.log.warning("Report worker exited (%s); restarting", code)
+        time.sleep(5)
+        report_worker["process"] = start_report_worker(server)
+
+def when_ready(server):
+    if os.environ.get("REPORT_WORKER", "gunicorn") != "gunicorn":
+        return
+    report_worker["process"] = start_report_worker(server)
+    threading.Thread(target=watch_report_worker, args=(server,), name="report-worker", daemon=True).start()
+
+def on_exit(server):
+    report_worker["stopping"] = True
+    process = report_worker["process"]
+    if process is not None and process.poll() is None:
+        # The pool lets running jobs finish on SIGTERM
+        process.terminate()
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def post_worker_init(worker):
+    # Every worker runs the weekly lock scheduler; one of them leads (see locking.py)
+    from app import start_lock_scheduler
+    start_lock_scheduler()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,320 @@
+import csv
+import io
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import bindparam, func
+from models import db, Patient, Exam, Doctor, get_current_user, write_audit_rows
+from rollups import apply_revenue_deltas, contribution
+from exam_events import queue_exam_event
+from summary import in_current_week, invalidate_summary
+
+# --- Bulk Patient/Exam Import ---
+# Rows are read lazily from the uploaded CSV/NDJSON stream and processed in
+# chunks: lookups by national_id, insert/update executemany for patients, one executemany
+# for exams, bulk audit rows, one commit. A bad row is reported and skipped;
+# it never aborts the rest of the file.
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+PATIENT_FIELDS = ('first_name', 'last_name', 'age', 'gender', 'phone', 'email', 'address', 'emergency_contact')
+EXAM_FIELDS = ('exam_type', 'exam_date', 'time_slot', 'has_contrast', 'price', 'discount',
+               'payment_status', 'payment_method', 'info_source', 'status', 'referring_doctor_id')
+EXAM_STATUSES = {'Pending', 'Completed', 'Cancelled', 'Rescheduled'}
+
+# Column names used by the Google Sheets export (setup_db.py) and common variants
+ALIASES = {
+    'id': 'exam_id',
+    'date_of_scan': 'exam_date',
+    'patient_name': 'patient_name',
+    'contrast': 'has_contrast',
+}
+
+class ImportFormatError(ValueError):
+    pass
+
+def normalize_keys(raw):
+    row = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        key = key.strip().lower().replace(' ', '_')
+        key = ALIASES.get(key, key)
+        if isinstance(value, str):
+            value = value.strip()
+        row[key] = None if value == '' else value
+    name = row.pop('patient_name', None)
+    if name and not (row.get('first_name') or row.get('last_name')):
+        first, _, last = str(name).partition(' ')
+        row['first_name'], row['last_name'] = first, last or first
+    return row
+
+def read_rows(stream, fmt):
+    """Yield normalized dict rows from a binary stream without reading it whole."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for raw in csv.DictReader(text):
+            yield normalize_keys(raw)
+    elif fmt == 'ndjson':
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {'_error': f"Invalid JSON: {e.msg}"}
+                continue
+            yield normalize_keys(raw) if isinstance(raw, dict) else {'_error': "Expected a JSON object"}
+    else:
+        raise ImportFormatError(f"Unsupported format: {fmt}")
+
+def to_float(value):
+    return None if value is None else float(value)
+
+def to_int(value):
+    return None if value is None else int(float(value))
+
+def to_bool(value):
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+def to_date(value):
+    if value is None:
+        return None
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def to_datetime(value):
+    if value is None:
+        return None
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
+def parse_patient(row):
+    return {
+        'national_id': str(row['national_id']),
+        'first_name': row.get('first_name'),
+        'last_name': row.get('last_name'),
+        'age': to_int(row.get('age')),
+        'gender': row.get('gender'),
+        'phone': row.get('phone'),
+        'email': row.get('email'),
+        'address': row.get('address'),
+        'emergency_contact': row.get('emergency_contact'),
+    }
+
+def parse_exam(row):
+    """Exam insert values, or None when the row carries no exam."""
+    if not any(row.get(field) is not None for field in EXAM_FIELDS):
+        return None
+    if not row.get('exam_type'):
+        raise ValueError("exam_type is required for exam rows")
+    status = row.get('status') or 'Pending'
+    if status not in EXAM_STATUSES:
+        raise ValueError(f"Invalid status: {status}")
+    now = datetime.utcnow()
+    return {
+        'id': str(row.get('exam_id') or uuid.uuid4()),
+        'exam_type': row['exam_type'],
+        'exam_date': to_date(row.get('exam_date')),
+        'time_slot': row.get('time_slot'),
+        'has_contrast': to_bool(row.get('has_contrast')),
+        'price': to_float(row.get('price')),
+        'discount': to_float(row.get('discount')) or 0,
+        'payment_status': row.get('payment_status'),
+        'payment_method': row.get('payment_method'),
+        'info_source': row.get('info_source'),
+        'status': status,
+        'scan_start': to_datetime(row.get('scan_start')),
+        'scan_end': to_datetime(row.get('scan_end')),
+        'referring_doctor_id': to_int(row.get('referring_doctor_id')),
+        'report_status': 'Draft',
+        'incentive_status': 'Pending',
+        'incentive_amount': 50000.0,
+        'is_locked': False,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+def patient_changes(patient, current):
+    """(old, new) of the fields the row would change on an existing patient."""
+    new = {field: patient[field] for field in PATIENT_FIELDS
+           if patient.get(field) is not None and patient[field] != current[field]}
+    return {field: current[field] for field in new}, new
+
+def upsert_patients(connection, patients, existing):
+    """
+    Insert new patients and fill provided fields on existing ones: one
+    executemany each. Returns {national_id: (old, new)} of the patients
+    updated. Their exams' updated_at is bumped too, as touch_patient_exams
+    does for ORM edits, so delta and Sheets sync pick the change up.
+    """
+    table = Patient.__table__
+    new = [patient for patient in patients if patient['national_id'] not in existing]
+    changes = {}
+    for patient in patients:
+        if patient['national_id'] in existing:
+            old, values = patient_changes(patient, existing[patient['national_id']])
+            if values:
+                changes[patient['national_id']] = (old, values)
+    if new:
+        connection.execute(table.insert(), new)
+    if changes:
+        connection.execute(
+            table.update()
+            .where(table.c.national_id == bindparam('p_national_id'))
+            .values({field: func.coalesce(bindparam(f"p_{field}"), table.c[field]) for field in PATIENT_FIELDS}),
+            [{'p_national_id': nid, **{f"p_{field}": values.get(field) for field in PATIENT_FIELDS}}
+             for nid, (_, values) in changes.items()]
+        )
+        exams = Exam.__table__
+        connection.execute(exams.update().where(
+            exams.c.patient_id.in_([existing[nid]['id'] for nid in changes])
+        ).values(updated_at=datetime.utcnow()))
+    return changes
+
+class ImportResult:
+    def __init__(self):
+        self.processed = 0
+        self.patients_created = 0
+        self.patients_updated = 0
+        self.exams_created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line, "error": message})
+
+    def to_dict(self):
+        return {
+            "processed": self.processed,
+            "patients_created": self.patients_created,
+            "patients_updated": self.patients_updated,
+            "exams_created": self.exams_created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors)
+        }
+
+def import_chunk(chunk, result, user_id):
+    connection = db.session.connection()
+    national_ids = {str(row['national_id']) for _, row in chunk if row.get('national_id')}
+    # Current values too: updates are audited with what they replace
+    existing = {
+        row.national_id: row._asdict() for row in db.session.query(
+            Patient.national_id, Patient.id, *(getattr(Patient, field) for field in PATIENT_FIELDS)
+        ).filter(Patient.national_id.in_(national_ids))
+    } if national_ids else {}
+    exam_ids = {str(row['exam_id']) for _, row in chunk if row.get('exam_id')}
+    taken_exam_ids = {
+        exam_id for (exam_id,) in db.session.query(Exam.id).filter(Exam.id.in_(exam_ids)).all()
+    } if exam_ids else set()
+    doctor_ids = set()
+    for _, row in chunk:
+        try:
+            doctor_ids.add(to_int(row.get('referring_doctor_id')))
+        except (ValueError, TypeError):
+            pass
+    doctor_ids.discard(None)
+    known_doctors = {
+        doctor_id for (doctor_id,) in db.session.query(Doctor.id).filter(Doctor.id.in_(doctor_ids)).all()
+    } if doctor_ids else set()
+
+    patients, exams = {}, []
+    for line, row in chunk:
+        try:
+            if row.get('_error'):
+                raise ValueError(row['_error'])
+            if not row.get('national_id'):
+                raise ValueError("national_id is required")
+            patient = parse_patient(row)
+            known = patient['national_id'] in existing or patient['national_id'] in patients
+            if not known and not (patient['first_name'] and patient['last_name']):
+                raise ValueError("first_name and last_name are required for new patients")
+            exam = parse_exam(row)
+            if exam and exam['id'] in taken_exam_ids:
+                raise ValueError(f"Exam {exam['id']} already exists")
+            if exam and exam['referring_doctor_id'] is not None and exam['referring_doctor_id'] not in known_doctors:
+                raise ValueError(f"Unknown referring_doctor_id: {exam['referring_doctor_id']}")
+        except (ValueError, TypeError) as e:
+            result.error(line, str(e))
+            continue
+        # Later rows for the same patient fill in on top of earlier ones
+        merged = patients.get(patient['national_id'], {})
+        patients[patient['national_id']] = {**merged, **{k: v for k, v in patient.items() if v is not None or k not in merged}}
+        if exam:
+            taken_exam_ids.add(exam['id'])
+            exams.append((patient['national_id'], exam))
+
+    changes = {}
+    if patients:
+        changes = upsert_patients(connection, list(patients.values()), existing)
+        ids = dict(
+            db.session.query(Patient.national_id, Patient.id).filter(Patient.national_id.in_(list(patients))).all()
+        )
+    else:
+        ids = {}
+
+    exam_rows = []
+    for national_id, exam in exams:
+        exam['patient_id'] = ids[national_id]
+        exam_rows.append(exam)
+    if exam_rows:
+        connection.execute(Exam.__table__.insert(), exam_rows)
+
+    timestamp = datetime.utcnow()
+    audit = [
+        (user_id, 'patients', ids[nid], 'INSERT', None, patient, timestamp)
+        for nid, patient in patients.items() if nid not in existing
+    ] + [
+        (user_id, 'patients', ids[nid], 'UPDATE', old, new, timestamp) for nid, (old, new) in changes.items()
+    ] + [
+        (user_id, 'exams', exam['id'], 'INSERT', None, exam, timestamp) for exam in exam_rows
+    ]
+    write_audit_rows(connection, audit)
+
+    deltas = defaultdict(lambda: [0.0, 0])
+    for exam in exam_rows:
+        contrib = contribution(exam)
+        if contrib:
+            day, bucket, amount = contrib
+            deltas[(day, bucket)][0] += amount
+            deltas[(day, bucket)][1] += 1
+    apply_revenue_deltas(connection, deltas)
+    queue_exam_event(db.session, 'registered', [exam['id'] for exam in exam_rows])
+    if any(exam['status'] == 'Completed' and in_current_week(exam['scan_end'] or exam['exam_date']) for exam in exam_rows):
+        invalidate_summary(connection)
+
+    db.session.commit()
+    created = sum(1 for nid in patients if nid not in existing)
+    result.patients_created += created
+    result.patients_updated += len(patients) - created
+    result.exams_created += len(exam_rows)
+
+def import_file(stream, fmt, chunk_size=CHUNK_SIZE):
+    """Import a CSV/NDJSON stream; returns an ImportResult. Rows are numbered from 1."""
+    result = ImportResult()
+    user_id = get_current_user()
+    chunk = []
+
+    def flush():
+        try:
+            import_chunk(chunk, result, user_id)
+        except Exception as e:
+            db.session.rollback()
+            for line, _ in chunk:
+                result.error(line, f"Chunk failed: {e}")
+        chunk.clear()
+
+    for line, row in enumerate(read_rows(stream, fmt), start=1):
+        result.processed += 1
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return result
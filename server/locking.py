@@ -0,0 +1,219 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from models import db, Exam, SyncCursor, get_current_user, write_audit_rows
+from exam_events import queue_exam_event
+from reports import week_bounds
+from summary import invalidate_summary
+
+logger = logging.getLogger(__name__)
+
+# --- Weekly Record Locking ---
+# Exams are locked in small chunks, each its own short transaction with bulk
+# audit rows, so the job never holds a long write lock on exams and every
+# locked record shows up in the audit trail.
+#
+# The scheduler runs in every web worker; the one holding an exclusive lock on
+# a file becomes the leader and runs the lock, the others wait to take over.
+# Each completed cycle is recorded (sync_cursors), so a leader that starts
+# after a missed run first locks every cycle since the last one recorded.
+
+DEFAULT_CHUNK_SIZE = 500
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+LAST_RUN_CURSOR = 'lock-scheduler'
+LEADER_RETRY_SECONDS = 60
+
+# Progress of the current/last run in this process (exposed via /api/admin/lock-status)
+lock_progress = {"status": "idle"}
+_progress_lock = threading.Lock()
+
+def previous_week_range(now):
+    """Mon 00:00:00 to Sun 23:59:59 of the cycle before the one containing `now`."""
+    last_monday = now - timedelta(days=now.weekday() + 7)
+    last_monday = last_monday.replace(hour=0, minute=0, second=0, microsecond=0)
+    last_sunday = last_monday + timedelta(days=6, hours=23, minutes=59, seconds=59)
+    return last_monday, last_sunday
+
+def _update_progress(**values):
+    with _progress_lock:
+        lock_progress.update(values)
+
+def lock_exams(table, ids, now):
+    """Lock those of `ids` still unlocked; returns the ids this statement locked."""
+    update = table.update().where(table.c.id.in_(ids), table.c.is_locked == False).values(
+        is_locked=True, updated_at=now)
+    connection = db.session.connection()
+    if connection.dialect.update_returning:
+        return list(db.session.execute(update.returning(table.c.id)).scalars())
+    result = db.session.execute(update)
+    if result.rowcount == len(ids):
+        return ids
+    # Ours are the rows stamped with this update's time
+    return list(db.session.execute(
+        db.select(table.c.id).where(table.c.id.in_(ids), table.c.updated_at == now, table.c.is_locked == True)
+    ).scalars())
+
+def lock_range(start, end, chunk_size=DEFAULT_CHUNK_SIZE, user_id=None):
+    """Lock unlocked exams with scan_end in [start, end]; returns the number locked."""
+    user_id = user_id or get_current_user()
+    table = Exam.__table__
+    started = time.monotonic()
+    locked = chunks = 0
+    week_start, week_end = week_bounds(datetime.now())
+    touches_current_week = start <= week_end and end >= week_start
+    _update_progress(status="running", start=start.isoformat(), end=end.isoformat(),
+                     started_at=datetime.utcnow().isoformat(), finished_at=None,
+                     locked=0, chunks=0, seconds=0.0, error=None)
+    try:
+        while True:
+            # Index order of ix_exams_is_locked_scan_end: each chunk stops after chunk_size
+            # rows instead of sorting every unlocked row left in the range
+            ids = [exam_id for (exam_id,) in db.session.query(Exam.id).filter(
+                Exam.is_locked == False,
+                Exam.scan_end >= start,
+                Exam.scan_end <= end
+            ).order_by(Exam.scan_end).limit(chunk_size).all()]
+            if not ids:
+                break
+            now = datetime.utcnow()
+            # Rows locked or edited concurrently since the read are skipped,
+            # and only the ones this update changed are audited
+            ids = lock_exams(table, ids, now)
+            if ids:
+                write_audit_rows(db.session.connection(), [
+                    (user_id, 'exams', exam_id, 'UPDATE', {'is_locked': False}, {'is_locked': True}, now)
+                    for exam_id in ids
+                ])
+                queue_exam_event(db.session, 'locked', ids)
+            if touches_current_week:
+                invalidate_summary(db.session.connection())
+            db.session.commit()
+            locked += len(ids)
+            chunks += 1
+            _update_progress(locked=locked, chunks=chunks, seconds=round(time.monotonic() - started, 3))
+    except Exception as e:
+        db.session.rollback()
+        _update_progress(status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+        raise
+    _update_progress(status="done", locked=locked, chunks=chunks,
+                     seconds=round(time.monotonic() - started, 3),
+                     finished_at=datetime.utcnow().isoformat())
+    return locked
+
+def parse_schedule(value):
+    """'thu 23:59' -> (3, 23, 59)."""
+    day, _, clock = value.strip().lower().partition(' ')
+    if day[:3] not in WEEKDAYS:
+        raise ValueError(f"Invalid lock schedule day: {value}")
+    hour, _, minute = clock.partition(':')
+    hour, minute = int(hour or 0), int(minute or 0)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid lock schedule time: {value}")
+    return WEEKDAYS.index(day[:3]), hour, minute
+
+def next_run(now, schedule):
+    weekday, hour, minute = schedule
+    candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    candidate += timedelta(days=(weekday - now.weekday()) % 7)
+    if candidate <= now:
+        candidate += timedelta(days=7)
+    return candidate
+
+def previous_run(now, schedule):
+    """The latest scheduled run at or before `now`."""
+    return next_run(now, schedule) - timedelta(days=7)
+
+class LockScheduler:
+    """Runs the previous-week lock at the configured weekday/time, forever."""
+    def __init__(self, app, schedule, chunk_size=DEFAULT_CHUNK_SIZE, leader_file=None):
+        self.app = app
+        self.schedule = parse_schedule(schedule)
+        self.chunk_size = chunk_size
+        self.leader_file = leader_file
+        self._leader = None
+        self._stop = threading.Event()
+
+    def acquire_leadership(self):
+        """Whether this process runs the lock; always true without a leader file."""
+        if self.leader_file is None or self._leader is not None:
+            return True
+        os.makedirs(os.path.dirname(self.leader_file), exist_ok=True)
+        f = open(self.leader_file, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        # Held (and released by the OS) for the life of the process
+        self._leader = f
+        return True
+
+    def last_run(self):
+        cursor = db.session.get(SyncCursor, LAST_RUN_CURSOR)
+        return cursor.watermark if cursor else None
+
+    def record_run(self, due):
+        cursor = db.session.get(SyncCursor, LAST_RUN_CURSOR) or SyncCursor(name=LAST_RUN_CURSOR)
+        cursor.watermark = due
+        db.session.add(cursor)
+        db.session.commit()
+
+    def run_once(self, now=None, since=None):
+        """
+        Lock the cycle before `now`, and every cycle after the run at `since`
+        when given; recorded as the run at `now`.
+        """
+        now = now or datetime.now()
+        start, end = previous_week_range(now)
+        if since is not None:
+            start = min(start, previous_week_range(since + timedelta(days=7))[0])
+        with self.app.app_context():
+            locked = lock_range(start, end, self.chunk_size, user_id="System/Scheduler")
+            self.record_run(now)
+        logger.info("Locked %d records from %s to %s", locked, start, end)
+        return locked
+
+    def catch_up(self, now=None):
+        """Run the lock now if the latest scheduled run hasn't happened; None when it has."""
+        due = previous_run(now or datetime.now(), self.schedule)
+        with self.app.app_context():
+            last = self.last_run()
+        if last is not None and last >= due:
+            return None
+        logger.info("Lock run of %s was missed (last run: %s); running it now", due, last)
+        return self.run_once(due, since=last)
+
+    def run_forever(self):
+        while not self._stop.is_set() and not self.acquire_leadership():
+            self._stop.wait(LEADER_RETRY_SECONDS)
+        if self._stop.is_set():
+            return
+        try:
+            self.catch_up()
+        except Exception:
+            logger.exception("Catch-up record locking failed")
+        while not self._stop.is_set():
+            due = next_run(datetime.now(), self.schedule)
+            _update_progress(next_run=due.isoformat())
+            while not self._stop.is_set():
+                remaining = (due - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                self._stop.wait(min(remaining, 60))
+            if self._stop.is_set():
+                break
+            try:
+                self.run_once(due)
+            except Exception:
+                logger.exception("Scheduled record locking failed")
+
+    def start_thread(self):
+        thread = threading.Thread(target=self.run_forever, name='lock-scheduler', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,157 @@
+import logging
+import os
+import time
+from flask import Response, g, got_request_exception, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.sql.dml import Insert
+from models import db, AuditLog
+
+logger = logging.getLogger(__name__)
+
+# --- Prometheus Metrics ---
+# Request latency, SQL statements and pool waits per route, exposed on
+# /metrics. Under gunicorn every worker writes its samples to files in
+# PROMETHEUS_MULTIPROC_DIR (set up in gunicorn.conf.py) and /metrics merges
+# them, so a scrape sees the whole instance whichever worker answers it.
+# Routes are labelled by their rule ("/api/exams/<id>"), never the raw path.
+
+NO_ROUTE = 'none'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+STATEMENT_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+POOL_WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    'meditrack_http_request_duration_seconds', 'Time to produce the response headers',
+    ['method', 'route'], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter('meditrack_http_requests_total', 'Responses sent', ['method', 'route', 'status'])
+EXCEPTIONS = Counter(
+    'meditrack_http_exceptions_total', 'Unhandled exceptions in request handlers', ['route', 'exception']
+)
+SQL_DURATION = Histogram(
+    'meditrack_sql_statement_duration_seconds', 'SQL statement execution time (count = statements)',
+    ['route'], buckets=SQL_BUCKETS
+)
+REQUEST_STATEMENTS = Histogram(
+    'meditrack_http_request_sql_statements', 'SQL statements issued before the response headers',
+    ['route'], buckets=STATEMENT_COUNT_BUCKETS
+)
+SLOW_STATEMENTS = Counter('meditrack_sql_slow_statements_total', 'Statements over SLOW_QUERY_MS', ['route'])
+POOL_WAIT = Histogram(
+    'meditrack_db_pool_checkout_wait_seconds', 'Time spent getting a connection from the pool',
+    buckets=POOL_WAIT_BUCKETS
+)
+POOL_TIMEOUTS = Counter('meditrack_db_pool_checkout_timeouts_total', 'Pool checkouts that timed out')
+AUDIT_ROWS = Counter('meditrack_audit_rows_written_total', 'Audit rows inserted', ['table', 'action'])
+
+_slow_query_seconds = 0.0
+
+def current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return NO_ROUTE
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def observe_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+    route = current_route()
+    SQL_DURATION.labels(route).observe(elapsed)
+    if has_request_context() and 'metrics_statements' in g:
+        g.metrics_statements += 1
+    if _slow_query_seconds and elapsed >= _slow_query_seconds:
+        SLOW_STATEMENTS.labels(route).inc()
+        # Statement text only: parameters carry patient data
+        logger.warning("Slow SQL (%.1f ms) on %s: %s", elapsed * 1000, route, ' '.join(statement.split())[:2000])
+
+@event.listens_for(Engine, 'handle_error')
+def discard_statement_timer(context):
+    started = context.connection.info.get('metrics_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+@event.listens_for(Engine, 'after_execute')
+def count_audit_rows(conn, clauseelement, multiparams, params, execution_options, result):
+    # Every audit path (session buffer, background writer, importer, locking)
+    # goes through one executemany insert into audit_logs
+    if not isinstance(clauseelement, Insert) or clauseelement.table is not AuditLog.__table__:
+        return
+    rows = multiparams if multiparams else [params]
+    counts = {}
+    for row in rows:
+        key = (row.get('target_table') or '', row.get('action') or '')
+        counts[key] = counts.get(key, 0) + 1
+    for (table, action), count in counts.items():
+        AUDIT_ROWS.labels(table, action).inc(count)
+
+def timed_pool_class(pool_class):
+    """pool_class with _do_get, the part of a checkout that waits for a free connection, timed."""
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = pool_class._do_get(self)
+        except PoolTimeout:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+        return connection
+    return type(f"Timed{pool_class.__name__}", (pool_class,), {'_do_get': _do_get, 'checkouts_timed': True})
+
+def time_pool_checkouts(engine):
+    # Swapping the class (not wrapping the instance) survives engine.dispose(),
+    # which rebuilds the pool via self.__class__
+    if not getattr(engine.pool, 'checkouts_timed', False):
+        engine.pool.__class__ = timed_pool_class(type(engine.pool))
+
+def metrics_registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Multi-process mode: merge every worker's files
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def init_metrics(app):
+    global _slow_query_seconds
+    _slow_query_seconds = (app.config.get("SLOW_QUERY_MS") or 0) / 1000
+    token = app.config.get("METRICS_TOKEN")
+
+    with app.app_context():
+        for engine in db.engines.values():
+            time_pool_checkouts(engine)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_statements = 0
+
+    @app.after_request
+    def observe_request(response):
+        if 'metrics_started' not in g:
+            return response
+        route = current_route()
+        REQUEST_LATENCY.labels(request.method, route).observe(time.perf_counter() - g.metrics_started)
+        REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+        REQUEST_STATEMENTS.labels(route).observe(g.metrics_statements)
+        return response
+
+    def count_exception(sender, exception, **extra):
+        EXCEPTIONS.labels(current_route(), type(exception).__name__).inc()
+
+    got_request_exception.connect(count_exception, app, weak=False)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        return Response(generate_latest(metrics_registry()), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,140 @@
+"""baseline schema
+
+Creates the tables that db.create_all() used to manage. Databases that were
+already created that way are adopted as-is: existing tables are skipped and
+only missing pieces (doctors.role, audit log indexes) are added.
+
+Revision ID: 3c1f0a2b9d41
+Revises:
+Create Date: 2026-10-18 03:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0a2b9d41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'audit_logs' not in tables:
+        op.create_table('audit_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.String(length=100), nullable=True),
+        sa.Column('target_table', sa.String(length=100), nullable=True),
+        sa.Column('target_id', sa.String(length=100), nullable=True),
+        sa.Column('action', sa.String(length=20), nullable=True),
+        sa.Column('old_value', sa.Text(), nullable=True),
+        sa.Column('new_value', sa.Text(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    with op.batch_alter_table('audit_logs', schema=None) as batch_op:
+        batch_op.create_index('ix_audit_logs_target', ['target_table', 'target_id', 'timestamp'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_audit_logs_user', ['user_id', 'timestamp'], unique=False, if_not_exists=True)
+
+    if 'daily_revenue' not in tables:
+        op.create_table('daily_revenue',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('payment_status', sa.String(length=50), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('exam_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'payment_status', name='uq_daily_revenue_day_status')
+        )
+
+    if 'doctors' not in tables:
+        op.create_table('doctors',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('hospital', sa.String(length=200), nullable=True),
+        sa.Column('phone', sa.String(length=50), nullable=True),
+        sa.Column('license_no', sa.String(length=50), nullable=True),
+        sa.Column('role', sa.String(length=50), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('license_no')
+        )
+    elif 'role' not in {c['name'] for c in inspector.get_columns('doctors')}:
+        with op.batch_alter_table('doctors', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('role', sa.String(length=50), nullable=True))
+
+    if 'patients' not in tables:
+        op.create_table('patients',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('first_name', sa.String(length=100), nullable=False),
+        sa.Column('last_name', sa.String(length=100), nullable=False),
+        sa.Column('national_id', sa.String(length=50), nullable=False),
+        sa.Column('age', sa.Integer(), nullable=True),
+        sa.Column('gender', sa.String(length=20), nullable=True),
+        sa.Column('phone', sa.String(length=50), nullable=True),
+        sa.Column('email', sa.String(length=100), nullable=True),
+        sa.Column('address', sa.Text(), nullable=True),
+        sa.Column('emergency_contact', sa.String(length=200), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('national_id')
+        )
+
+    if 'users' not in tables:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=100), nullable=False),
+        sa.Column('password_hash', sa.String(length=255), nullable=False),
+        sa.Column('role', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+        )
+
+    if 'exams' not in tables:
+        op.create_table('exams',
+        sa.Column('id', sa.String(length=100), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=False),
+        sa.Column('exam_type', sa.String(length=100), nullable=False),
+        sa.Column('exam_date', sa.Date(), nullable=True),
+        sa.Column('time_slot', sa.String(length=50), nullable=True),
+        sa.Column('has_contrast', sa.Boolean(), nullable=True),
+        sa.Column('price', sa.Float(), nullable=True),
+        sa.Column('discount', sa.Float(), nullable=True),
+        sa.Column('payment_status', sa.String(length=50), nullable=True),
+        sa.Column('payment_method', sa.String(length=50), nullable=True),
+        sa.Column('info_source', sa.String(length=100), nullable=True),
+        sa.Column('assigned_tech', sa.String(length=100), nullable=True),
+        sa.Column('mri_machine_id', sa.String(length=100), nullable=True),
+        sa.Column('scan_start', sa.DateTime(), nullable=True),
+        sa.Column('scan_end', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('radiologist_name', sa.String(length=100), nullable=True),
+        sa.Column('radiologist_license', sa.String(length=100), nullable=True),
+        sa.Column('report_status', sa.String(length=50), nullable=True),
+        sa.Column('internal_notes', sa.Text(), nullable=True),
+        sa.Column('file_url', sa.String(length=255), nullable=True),
+        sa.Column('referring_doctor_id', sa.Integer(), nullable=True),
+        sa.Column('incentive_status', sa.String(length=50), nullable=True),
+        sa.Column('incentive_amount', sa.Float(), nullable=True),
+        sa.Column('is_locked', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['patient_id'], ['patients.id'], ),
+        sa.ForeignKeyConstraint(['referring_doctor_id'], ['doctors.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('exams')
+    op.drop_table('users')
+    op.drop_table('patients')
+    op.drop_table('doctors')
+    op.drop_table('daily_revenue')
+    with op.batch_alter_table('audit_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_audit_logs_user')
+        batch_op.drop_index('ix_audit_logs_target')
+
+    op.drop_table('audit_logs')
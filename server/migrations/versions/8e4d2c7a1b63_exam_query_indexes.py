@@ -0,0 +1,40 @@
+"""exam query indexes
+
+Composite indexes for the exam queues and admin reports:
+reports queue (status, scan_end, id), pending queue (status, created_at, id)
+(id completes the keyset pagination order),
+today's schedule (exam_date, created_at, id), bonus report (referring_doctor_id, scan_end)
+and weekly locking (is_locked, scan_end).
+
+Revision ID: 8e4d2c7a1b63
+Revises: 3c1f0a2b9d41
+Create Date: 2026-10-18 03:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4d2c7a1b63'
+down_revision = '3c1f0a2b9d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.create_index('ix_exams_status_scan_end', ['status', 'scan_end', 'id'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_exams_status_created_at', ['status', 'created_at', 'id'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_exams_exam_date', ['exam_date', 'created_at', 'id'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_exams_referring_doctor_scan_end', ['referring_doctor_id', 'scan_end'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_exams_is_locked_scan_end', ['is_locked', 'scan_end'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.drop_index('ix_exams_is_locked_scan_end')
+        batch_op.drop_index('ix_exams_referring_doctor_scan_end')
+        batch_op.drop_index('ix_exams_exam_date')
+        batch_op.drop_index('ix_exams_status_created_at')
+        batch_op.drop_index('ix_exams_status_scan_end')
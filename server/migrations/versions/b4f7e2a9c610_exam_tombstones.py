@@ -0,0 +1,41 @@
+"""exam tombstones
+
+Revision ID: b4f7e2a9c610
+Revises: e5b3a8c4d912
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4f7e2a9c610'
+down_revision = 'e5b3a8c4d912'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('exam_tombstones',
+    sa.Column('exam_id', sa.String(length=100), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('exam_id')
+    )
+    with op.batch_alter_table('exam_tombstones', schema=None) as batch_op:
+        batch_op.create_index('ix_exam_tombstones_deleted_at', ['deleted_at', 'exam_id'], unique=False)
+
+    # Delta sync reads updated_at as a watermark: every row needs one, and a
+    # stamp in the future (old seed data) would hide later changes
+    exams = sa.table('exams', sa.column('created_at', sa.DateTime()), sa.column('updated_at', sa.DateTime()))
+    now = datetime.utcnow()
+    op.execute(exams.update().where(exams.c.updated_at == None).values(
+        updated_at=sa.func.coalesce(exams.c.created_at, now)))
+    op.execute(exams.update().where(exams.c.updated_at > now).values(updated_at=now))
+
+
+def downgrade():
+    with op.batch_alter_table('exam_tombstones', schema=None) as batch_op:
+        batch_op.drop_index('ix_exam_tombstones_deleted_at')
+    op.drop_table('exam_tombstones')
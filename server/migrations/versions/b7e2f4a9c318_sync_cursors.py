@@ -0,0 +1,34 @@
+"""sync cursors and exam updated_at index
+
+Revision ID: b7e2f4a9c318
+Revises: 5a9b3e1d7c20
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2f4a9c318'
+down_revision = '5a9b3e1d7c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_cursors',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('watermark', sa.DateTime(), nullable=True),
+    sa.Column('last_key', sa.String(length=100), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.create_index('ix_exams_updated_at', ['updated_at', 'id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.drop_index('ix_exams_updated_at')
+    op.drop_table('sync_cursors')
@@ -0,0 +1,27 @@
+"""exam unscanned index
+
+Revision ID: c2a7d5e1f384
+Revises: b4f7e2a9c610
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2a7d5e1f384'
+down_revision = 'b4f7e2a9c610'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.create_index('ix_exams_status_exam_date_unscanned', ['status', 'exam_date'], unique=False,
+                              sqlite_where=sa.text('scan_end IS NULL'), postgresql_where=sa.text('scan_end IS NULL'))
+
+
+def downgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.drop_index('ix_exams_status_exam_date_unscanned')
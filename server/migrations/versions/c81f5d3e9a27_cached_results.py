@@ -0,0 +1,32 @@
+"""cached results
+
+Revision ID: c81f5d3e9a27
+Revises: a6d94c2e8b13
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f5d3e9a27'
+down_revision = 'a6d94c2e8b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cached_results',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('body', sa.Text(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.Column('lease', sa.String(length=32), nullable=True),
+    sa.Column('lease_until', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cached_results')
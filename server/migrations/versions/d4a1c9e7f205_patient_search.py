@@ -0,0 +1,54 @@
+"""patient search index
+
+SQLite: an external-content FTS5 table with the trigram tokenizer, kept in
+sync by triggers. Postgres: pg_trgm and a GIN index on the search document
+expression used by patient_search.py.
+
+Revision ID: d4a1c9e7f205
+Revises: b7e2f4a9c318
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a1c9e7f205'
+down_revision = 'b7e2f4a9c318'
+branch_labels = None
+depends_on = None
+
+FTS_COLUMNS = "first_name, last_name, phone, national_id"
+NEW_VALUES = "new.first_name, new.last_name, new.phone, new.national_id"
+OLD_VALUES = "old.first_name, old.last_name, old.phone, old.national_id"
+PG_SEARCH_DOCUMENT = "(first_name || ' ' || last_name || ' ' || coalesce(phone, '') || ' ' || national_id)"
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5("
+                   f"{FTS_COLUMNS}, content='patients', content_rowid='id', tokenize='trigram')")
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS patients_fts_ai AFTER INSERT ON patients BEGIN "
+                   f"INSERT INTO patients_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {NEW_VALUES}); END")
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS patients_fts_ad AFTER DELETE ON patients BEGIN "
+                   f"INSERT INTO patients_fts(patients_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES}); END")
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS patients_fts_au AFTER UPDATE ON patients BEGIN "
+                   f"INSERT INTO patients_fts(patients_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES}); "
+                   f"INSERT INTO patients_fts(rowid, {FTS_COLUMNS}) VALUES (new.id, {NEW_VALUES}); END")
+        op.execute("INSERT INTO patients_fts(patients_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_patients_search_trgm ON patients "
+                   f"USING gin ({PG_SEARCH_DOCUMENT} gin_trgm_ops)")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('patients_fts_ai', 'patients_fts_ad', 'patients_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS patients_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_patients_search_trgm")
@@ -0,0 +1,27 @@
+"""drop exam referring doctor index
+
+Revision ID: d8b3f6a2e915
+Revises: c2a7d5e1f384
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8b3f6a2e915'
+down_revision = 'c2a7d5e1f384'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # No query filters exams by referring doctor; the bonus report goes through scan_end
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.drop_index('ix_exams_referring_doctor_scan_end', if_exists=True)
+
+
+def downgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.create_index('ix_exams_referring_doctor_scan_end', ['referring_doctor_id', 'scan_end'], unique=False)
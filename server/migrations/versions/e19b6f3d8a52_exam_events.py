@@ -0,0 +1,33 @@
+"""exam events
+
+Revision ID: e19b6f3d8a52
+Revises: d4a1c9e7f205
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e19b6f3d8a52'
+down_revision = 'd4a1c9e7f205'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('exam_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('exam_events', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_exam_events_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('exam_events', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_exam_events_created_at'))
+    op.drop_table('exam_events')
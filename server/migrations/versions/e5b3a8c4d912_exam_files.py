@@ -0,0 +1,49 @@
+"""exam files
+
+Revision ID: e5b3a8c4d912
+Revises: 9d2e7b4f1c06
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b3a8c4d912'
+down_revision = '9d2e7b4f1c06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_files',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    op.create_table('exam_files',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('exam_id', sa.String(length=100), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('uploaded_by', sa.String(length=100), nullable=True),
+    sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['exam_id'], ['exams.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['sha256'], ['stored_files.sha256'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('exam_files', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_exam_files_exam_id'), ['exam_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_exam_files_sha256'), ['sha256'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('exam_files', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_exam_files_sha256'))
+        batch_op.drop_index(batch_op.f('ix_exam_files_exam_id'))
+    op.drop_table('exam_files')
+    op.drop_table('stored_files')
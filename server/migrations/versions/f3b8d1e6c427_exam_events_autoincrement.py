@@ -0,0 +1,35 @@
+"""exam events autoincrement
+
+Revision ID: f3b8d1e6c427
+Revises: a6e1c9d4b752
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d1e6c427'
+down_revision = 'a6e1c9d4b752'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite hands out ids again from the max remaining row once events are
+    # pruned; AUTOINCREMENT needs the table rebuilt (rows are copied over).
+    # Postgres sequences never go back, nothing to do there.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('exam_events', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('exam_events', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
@@ -0,0 +1,47 @@
+"""machines and machine slots
+
+Revision ID: f3c8a2d61b47
+Revises: e19b6f3d8a52
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8a2d61b47'
+down_revision = 'e19b6f3d8a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('machines',
+    sa.Column('id', sa.String(length=50), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=True),
+    sa.Column('opens_at', sa.Time(), nullable=False),
+    sa.Column('closes_at', sa.Time(), nullable=False),
+    sa.Column('open_weekdays', sa.String(length=7), nullable=False),
+    sa.Column('supports_contrast', sa.Boolean(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('machine_slots',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('machine_id', sa.String(length=50), nullable=False),
+    sa.Column('slot', sa.Integer(), nullable=False),
+    sa.Column('exam_id', sa.String(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['exam_id'], ['exams.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['machine_id'], ['machines.id'], ),
+    sa.PrimaryKeyConstraint('day', 'machine_id', 'slot')
+    )
+    with op.batch_alter_table('machine_slots', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_machine_slots_exam_id'), ['exam_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('machine_slots', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_machine_slots_exam_id'))
+    op.drop_table('machine_slots')
+    op.drop_table('machines')
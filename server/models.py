@@ -1,11 +1,37 @@
-from datetime import datetime, date
+from datetime import datetime, date, time
 import json
+import logging
+import os
+import queue
+import threading
+import zlib
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from sqlalchemy import event, inspect
+from sqlalchemy.orm.base import NO_VALUE
+from sqlalchemy.sql.dml import UpdateBase
 from flask_jwt_extended import get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+# Bind key of the optional read replica (DATABASE_REPLICA_URL)
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    """
+    While session.info["use_replica"] is set (see database.replica_reads),
+    plain reads go to the replica; flushes and INSERT/UPDATE/DELETE
+    statements still go to the primary.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.info.get('use_replica') and not self._flushing
+                and not isinstance(clause, UpdateBase)):
+            replica = db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+logger = logging.getLogger(__name__)
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
@@ -14,9 +40,30 @@ class AuditLog(db.Model):
     target_table = db.Column(db.String(100))
     target_id = db.Column(db.String(100))
     action = db.Column(db.String(20)) # INSERT, UPDATE, DELETE
+    # Rows written before payload existed keep their JSON text here
     old_value = db.Column(db.Text)
     new_value = db.Column(db.Text)
+    payload = db.Column(db.LargeBinary) # encode_audit_payload(old, new)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_audit_logs_target', 'target_table', 'target_id', 'timestamp'),
+        db.Index('ix_audit_logs_user', 'user_id', 'timestamp'),
+        # Default audit-log page: newest first, (timestamp, id) keyset
+        db.Index('ix_audit_logs_timestamp_id', 'timestamp', 'id'),
+    )
+
+class AuditSegment(db.Model):
+    """A compressed archive file of old audit rows (see audit_archive.py)."""
+    __tablename__ = 'audit_segments'
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), unique=True, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    first_timestamp = db.Column(db.DateTime)
+    last_timestamp = db.Column(db.DateTime)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -65,9 +112,11 @@ class Exam(db.Model):
     exam_date = db.Column(db.Date)
     time_slot = db.Column(db.String(50))
     has_contrast = db.Column(db.Boolean, default=False)
-    price = db.Column(db.Float)
-    discount = db.Column(db.Float, default=0)
-    payment_status = db.Column(db.String(50)) # Paid, Partial, Unpaid
+    # active_history: the revenue rollup (rollups.py) subtracts the old
+    # contribution on flush, so these load their previous value when set
+    price = db.column_property(db.Column(db.Float), active_history=True)
+    discount = db.column_property(db.Column(db.Float, default=0), active_history=True)
+    payment_status = db.column_property(db.Column(db.String(50)), active_history=True) # Paid, Partial, Unpaid
     payment_method = db.Column(db.String(50)) # Cash, Card, Transfer
     info_source = db.Column(db.String(100)) # Referred, Facebook, Walk-in, etc.
     
@@ -75,8 +124,8 @@ class Exam(db.Model):
     assigned_tech = db.Column(db.String(100))
     mri_machine_id = db.Column(db.String(100))
     scan_start = db.Column(db.DateTime)
-    scan_end = db.Column(db.DateTime)
-    status = db.Column(db.String(50), default='Pending') # Pending, Completed, Cancelled, Rescheduled
+    scan_end = db.column_property(db.Column(db.DateTime), active_history=True)
+    status = db.column_property(db.Column(db.String(50), default='Pending'), active_history=True) # Pending, Completed, Cancelled, Rescheduled
     
     # Radiologist Assignment
     radiologist_name = db.Column(db.String(100))
@@ -94,6 +143,18 @@ class Exam(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Match the queue/report query shapes (see query_plans.py)
+    __table_args__ = (
+        db.Index('ix_exams_status_scan_end', 'status', 'scan_end', 'id'),
+        # Completed exams without a scan time, found by exam_date (see reports.bonus_exams)
+        db.Index('ix_exams_status_exam_date_unscanned', 'status', 'exam_date',
+                 sqlite_where=db.text('scan_end IS NULL'), postgresql_where=db.text('scan_end IS NULL')),
+        db.Index('ix_exams_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_exams_exam_date', 'exam_date', 'created_at', 'id'),
+        db.Index('ix_exams_is_locked_scan_end', 'is_locked', 'scan_end'),
+        db.Index('ix_exams_updated_at', 'updated_at', 'id'),
+    )
+
     def to_dict(self, role=None):
         data = {
             "id": self.id,
@@ -133,6 +194,165 @@ class Exam(db.Model):
             
         return data
 
+class DailyRevenue(db.Model):
+    """Completed-exam revenue rollup, one row per scan day and payment bucket (see rollups.py)."""
+    __tablename__ = 'daily_revenue'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    payment_status = db.Column(db.String(50), nullable=False) # Paid, Partial, Unpaid
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    exam_count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('day', 'payment_status', name='uq_daily_revenue_day_status'),)
+
+class CacheVersion(db.Model):
+    """Per-dataset version counters shared by all workers (see caching.py)."""
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class CachedResult(db.Model):
+    """Shared cache entries and their rebuild lease (see caching.SharedCache)."""
+    __tablename__ = 'cached_results'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    body = db.Column(db.Text)
+    expires_at = db.Column(db.DateTime)
+    lease = db.Column(db.String(32))
+    lease_until = db.Column(db.DateTime)
+
+class SyncCursor(db.Model):
+    """Watermark of an incremental export (see sheets_sync.py): last (updated_at, key) pushed."""
+    __tablename__ = 'sync_cursors'
+    name = db.Column(db.String(50), primary_key=True)
+    watermark = db.Column(db.DateTime)
+    last_key = db.Column(db.String(100))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ExamEvent(db.Model):
+    """Committed exam changes for the live queue feed (see exam_events.py); pruned after a while."""
+    __tablename__ = 'exam_events'
+    # Ids must never be reused once pruned rows are gone: clients and pollers
+    # resume from "id > last seen" (a plain INTEGER PRIMARY KEY reuses them on SQLite)
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ExamTombstone(db.Model):
+    """A deleted exam, reported to delta-sync clients (see delta_sync.py) until pruned."""
+    __tablename__ = 'exam_tombstones'
+    exam_id = db.Column(db.String(100), primary_key=True)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_exam_tombstones_deleted_at', 'deleted_at', 'exam_id'),
+    )
+
+class Machine(db.Model):
+    """A scanner and its opening hours (see scheduling.py)."""
+    __tablename__ = 'machines'
+    id = db.Column(db.String(50), primary_key=True) # e.g. MRI-1, matches Exam.mri_machine_id
+    name = db.Column(db.String(100))
+    opens_at = db.Column(db.Time, nullable=False)
+    closes_at = db.Column(db.Time, nullable=False)
+    open_weekdays = db.Column(db.String(7), nullable=False, default='0123456') # Monday = 0
+    supports_contrast = db.Column(db.Boolean, nullable=False, default=True)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "opens_at": self.opens_at.strftime('%H:%M'),
+            "closes_at": self.closes_at.strftime('%H:%M'),
+            "open_weekdays": self.open_weekdays,
+            "supports_contrast": self.supports_contrast,
+            "is_active": self.is_active
+        }
+
+class MachineSlot(db.Model):
+    """One booked slot of a machine's day; the primary key rules out double-booking (see scheduling.py)."""
+    __tablename__ = 'machine_slots'
+    day = db.Column(db.Date, primary_key=True)
+    machine_id = db.Column(db.String(50), db.ForeignKey('machines.id'), primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True) # slot number within the day
+    exam_id = db.Column(db.String(100), db.ForeignKey('exams.id', ondelete='CASCADE'), nullable=False, index=True)
+
+class StoredFile(db.Model):
+    """A content-addressed file in REPORT_FILES_DIR, shared by identical uploads (see file_store.py)."""
+    __tablename__ = 'stored_files'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ExamFile(db.Model):
+    """A report file or image attached to an exam; the content is a StoredFile."""
+    __tablename__ = 'exam_files'
+    id = db.Column(db.String(36), primary_key=True)
+    exam_id = db.Column(db.String(100), db.ForeignKey('exams.id', ondelete='CASCADE'), nullable=False, index=True)
+    sha256 = db.Column(db.String(64), db.ForeignKey('stored_files.sha256'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    uploaded_by = db.Column(db.String(100))
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "exam_id": self.exam_id,
+            "filename": self.filename,
+            "content_type": self.content_type,
+            "size": self.size,
+            "sha256": self.sha256,
+            "uploaded_by": self.uploaded_by,
+            "uploaded_at": self.uploaded_at.isoformat() if self.uploaded_at else None,
+            "url": f"/api/exams/{self.exam_id}/files/{self.id}"
+        }
+
+class ReportJob(db.Model):
+    """A report computed by the report worker (see report_jobs.py); the result is a file."""
+    __tablename__ = 'report_jobs'
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False) # canonical JSON of the query string
+    params_key = db.Column(db.String(64), nullable=False) # sha256 of kind + params
+    in_flight_key = db.Column(db.String(64), unique=True) # params_key while queued/running, else NULL
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued, running, done, failed
+    fingerprint = db.Column(db.String(255)) # state of the source tables the result reflects
+    content_type = db.Column(db.String(100))
+    filename = db.Column(db.String(255))
+    result_path = db.Column(db.String(500))
+    result_size = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_by = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Lease of the worker running it, refreshed while the job runs
+    claimed_by = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_report_jobs_status_created_at', 'status', 'created_at'),
+        db.Index('ix_report_jobs_params_key_finished_at', 'params_key', 'finished_at'),
+    )
+
+# Exam rows are shown with their patient's name/phone, so a patient edit
+# touches the patient's exams and incremental readers of Exam.updated_at see it.
+@event.listens_for(db.Session, 'after_flush')
+def touch_patient_exams(session, flush_context):
+    patient_ids = [
+        obj.id for obj in session.dirty
+        if isinstance(obj, Patient) and session.is_modified(obj, include_collections=False)
+    ]
+    if patient_ids:
+        table = Exam.__table__
+        session.connection().execute(
+            table.update().where(table.c.patient_id.in_(patient_ids)).values(updated_at=datetime.utcnow())
+        )
+
 # --- Audit Trail Listener ---
 
 def get_current_user():
@@ -142,56 +362,243 @@ def get_current_user():
     except:
         return "System/Worker"
 
+# Each flush only records the changed column values in session.info; the
+# AuditLog rows are bulk-inserted (one executemany) right before the commit,
+# inside the same transaction. With the "background" writer mode the rows are
+# instead handed to a writer thread after the commit, which group-commits
+# batches from concurrent requests; commit() waits until its batch is stored.
+
+AUDIT_BUFFER_KEY = 'audit_buffer'
+_audit_writer_mode = 'sync'
+_column_keys_cache = {}
+
+def configure_audit_writer(mode):
+    """'sync' (default): audit rows commit with the data. 'background': writer thread."""
+    global _audit_writer_mode
+    if mode not in ('sync', 'background'):
+        raise ValueError(f"Unknown audit writer mode: {mode}")
+    _audit_writer_mode = mode
+
+def column_keys(mapper):
+    keys = _column_keys_cache.get(mapper)
+    if keys is None:
+        keys = _column_keys_cache[mapper] = tuple(c.key for c in mapper.column_attrs)
+    return keys
+
+def snapshot(state):
+    values = state.dict
+    return {key: values.get(key) for key in column_keys(state.mapper)}
+
+def changed_columns(state):
+    """(old, new) dicts for modified column attributes, from the pending history."""
+    keys = column_keys(state.mapper)
+    old_values, new_values = {}, {}
+    for key, old in state.committed_state.items():
+        if key not in keys:
+            continue
+        if old is NO_VALUE:
+            old = None
+        new = state.dict.get(key)
+        if old != new:
+            old_values[key] = old
+            new_values[key] = new
+    return old_values, new_values
+
 @event.listens_for(db.Session, 'after_flush')
 def receive_after_flush(session, flush_context):
     user_id = get_current_user()
-    
+    timestamp = datetime.utcnow()
+    buffer = session.info.setdefault(AUDIT_BUFFER_KEY, [])
+
     for obj in session.new:
         if isinstance(obj, AuditLog): continue
-        log = AuditLog(
-            user_id=user_id,
-            target_table=obj.__tablename__,
-            target_id=str(getattr(obj, 'id', 'N/A')),
-            action='INSERT',
-            new_value=json.dumps(object_to_dict(obj)),
-            timestamp=datetime.utcnow()
-        )
-        session.add(log)
+        state = inspect(obj)
+        buffer.append((user_id, obj.__tablename__, getattr(obj, 'id', 'N/A'), 'INSERT', None, snapshot(state), timestamp))
 
     for obj in session.dirty:
         if isinstance(obj, AuditLog): continue
         state = inspect(obj)
-        changes = {}
-        old_values = {}
-        for attr in state.attrs:
-            hist = attr.history
-            if hist.has_changes():
-                changes[attr.key] = serialize_value(hist.added[0] if hist.added else None)
-                old_values[attr.key] = serialize_value(hist.deleted[0] if hist.deleted else None)
-        
+        old_values, changes = changed_columns(state)
         if changes:
-            log = AuditLog(
-                user_id=user_id,
-                target_table=obj.__tablename__,
-                target_id=str(getattr(obj, 'id', 'N/A')),
-                action='UPDATE',
-                old_value=json.dumps(old_values),
-                new_value=json.dumps(changes),
-                timestamp=datetime.utcnow()
-            )
-            session.add(log)
+            buffer.append((user_id, obj.__tablename__, getattr(obj, 'id', 'N/A'), 'UPDATE', old_values, changes, timestamp))
 
     for obj in session.deleted:
         if isinstance(obj, AuditLog): continue
-        log = AuditLog(
-            user_id=user_id,
-            target_table=obj.__tablename__,
-            target_id=str(getattr(obj, 'id', 'N/A')),
-            action='DELETE',
-            old_value=json.dumps(object_to_dict(obj)),
-            timestamp=datetime.utcnow()
-        )
-        session.add(log)
+        state = inspect(obj)
+        buffer.append((user_id, obj.__tablename__, getattr(obj, 'id', 'N/A'), 'DELETE', snapshot(state), None, timestamp))
+
+def json_default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+# Audit payloads: {"o": old, "n": new} as compact JSON, behind a one-byte
+# codec tag. INSERT and DELETE snapshots leave out null columns (the diff
+# against an empty row), UPDATEs already hold only the changed columns.
+# Most payloads are a few hundred bytes, too small for plain zlib to find
+# repeats in, so it is primed with a dictionary of the audited column names
+# and common values. AUDIT_ZDICT must never change: a new dictionary needs a
+# new codec tag, and decoding keeps the old one.
+AUDIT_CODEC_JSON = 0
+AUDIT_CODEC_ZLIB_V1 = 1
+AUDIT_ZDICT = (
+    b'"first_name":"last_name":"national_id":"age":"gender":"Male""Female""phone":"email":"address":'
+    b'"emergency_contact":"name":"hospital":"license_no":"role":"Referring""Reporting"'
+    b'"username":"password_hash":"scrypt:32768:8:1$""patient_id":"exam_type":"MRI Brain""MRI Spine"'
+    b'"MRI Knee""MRI Abdomen""exam_date":"time_slot":"has_contrast":false,"price":"discount":0.0,'
+    b'"payment_method":"Cash""Card""Transfer""info_source":"Referred""Walk-in""assigned_tech":'
+    b'"mri_machine_id":"MRI-1""MRI-2""scan_start":"radiologist_name":"radiologist_license":'
+    b'"report_status":"Draft""Final""internal_notes":"file_url":"referring_doctor_id":'
+    b'"incentive_status":"Pending""Approved""incentive_amount":50000.0,"is_locked":false,'
+    b'"created_at":"2026-"payment_status":"Paid""Unpaid""Partial""status":"Completed""Cancelled"'
+    b'"scan_end":"updated_at":"2026-"id":{"o":null,"n":{"o":{'
+)
+AUDIT_COMPRESS_MIN_BYTES = 64
+
+def encode_audit_payload(action, old, new):
+    if action in ('INSERT', 'DELETE'):
+        old = {k: v for k, v in old.items() if v is not None} if old is not None else None
+        new = {k: v for k, v in new.items() if v is not None} if new is not None else None
+    data = json.dumps({"o": old, "n": new}, default=json_default, separators=(',', ':')).encode()
+    if len(data) >= AUDIT_COMPRESS_MIN_BYTES:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=AUDIT_ZDICT)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) < len(data):
+            return bytes([AUDIT_CODEC_ZLIB_V1]) + compressed
+    return bytes([AUDIT_CODEC_JSON]) + data
+
+def decode_audit_payload(payload):
+    """(old, new) dicts, either may be None."""
+    codec, data = payload[0], payload[1:]
+    if codec == AUDIT_CODEC_ZLIB_V1:
+        decompressor = zlib.decompressobj(-15, zdict=AUDIT_ZDICT)
+        data = decompressor.decompress(data) + decompressor.flush()
+    elif codec != AUDIT_CODEC_JSON:
+        raise ValueError(f"Unknown audit payload codec {codec}")
+    values = json.loads(data)
+    return values["o"], values["n"]
+
+def audit_values(payload, old_value, new_value):
+    """(old, new) of an audit row in either storage format."""
+    if payload is not None:
+        return decode_audit_payload(payload)
+    return (json.loads(old_value) if old_value is not None else None,
+            json.loads(new_value) if new_value is not None else None)
+
+def audit_rows(records):
+    return [{
+        'user_id': user_id,
+        'target_table': table,
+        'target_id': str(target_id),
+        'action': action,
+        'payload': encode_audit_payload(action, old, new),
+        'timestamp': timestamp
+    } for user_id, table, target_id, action, old, new, timestamp in records]
+
+def write_audit_rows(connection, records):
+    if records:
+        connection.execute(AuditLog.__table__.insert(), audit_rows(records))
+
+@event.listens_for(db.Session, 'before_commit')
+def write_audit_buffer(session):
+    # Run the commit's flush now so its changes are in the buffer too
+    session.flush()
+    if _audit_writer_mode != 'sync':
+        return
+    records = session.info.pop(AUDIT_BUFFER_KEY, None)
+    if records:
+        write_audit_rows(session.connection(), records)
+
+@event.listens_for(db.Session, 'after_commit')
+def hand_off_audit_buffer(session):
+    """
+    Background mode: hand the committed transaction's audit rows to the
+    writer thread. Not durable: the data change is already committed, so
+    rows still queued or being written are lost if the process dies before
+    the writer stores them. Use sync mode where the audit trail must be
+    complete.
+    """
+    if _audit_writer_mode != 'background':
+        return
+    records = session.info.pop(AUDIT_BUFFER_KEY, None)
+    if records:
+        background_audit_writer.submit(records)
+
+@event.listens_for(db.Session, 'after_rollback')
+def discard_audit_buffer(session):
+    session.info.pop(AUDIT_BUFFER_KEY, None)
+
+class BackgroundAuditWriter:
+    """
+    Single writer thread per process. Batches submitted while a write is in
+    progress are inserted together in one transaction; submit() blocks until
+    the batch is stored, and falls back to writing it inline on failure.
+    Each batch is claimed under a lock by exactly one side: the writer
+    thread, or a submitter that timed out before the writer got to it.
+    Rows are held in memory only until stored (see hand_off_audit_buffer).
+    """
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+        self.engine = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self.engine is None:
+                self.engine = db.engine
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _claim(self, status, owner):
+        """Test-and-set: whether `owner` now holds the batch (it was still queued)."""
+        with self._claim_lock:
+            if status['state'] != 'queued':
+                return False
+            status['state'] = owner
+            return True
+
+    def submit(self, records):
+        self._ensure_started()
+        done = threading.Event()
+        status = {'state': 'queued'}
+        self._queue.put((records, done, status))
+        if not done.wait(self.timeout) and not self._claim(status, 'abandoned'):
+            # The writer has it: its transaction either stores the batch or rolls back
+            done.wait()
+        if status.get('ok'):
+            return
+        logger.warning("Background audit write failed or timed out; writing inline")
+        with self.engine.begin() as connection:
+            write_audit_rows(connection, records)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            pending = [item for item in batch if self._claim(item[2], 'writing')]
+            try:
+                with self.engine.begin() as connection:
+                    write_audit_rows(connection, [r for records, _, _ in pending for r in records])
+                ok = True
+            except Exception:
+                logger.exception("Background audit writer failed")
+                ok = False
+            for _, done, status in pending:
+                status['ok'] = ok
+                done.set()
+
+background_audit_writer = BackgroundAuditWriter()
 
 def serialize_value(value):
     if isinstance(value, datetime):
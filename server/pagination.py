@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, (datetime, date)):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, sort_col):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if sort_value is not None:
+            python_type = sort_col.type.python_type
+            if python_type is datetime:
+                sort_value = datetime.fromisoformat(sort_value)
+            elif python_type is date:
+                sort_value = date.fromisoformat(sort_value)
+        return sort_value, row_id
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise InvalidCursor(str(e))
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        limit = int(value) if value not in (None, "") else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def nulls_sort_first(query, descending):
+    """Whether NULL sort values come first in the dialect's native ordering."""
+    nulls_high = query.session.get_bind().dialect.name in ('postgresql', 'oracle')
+    return descending == nulls_high
+
+def order_by_key(query, sort_col, id_col, descending):
+    if descending:
+        return query.order_by(sort_col.desc(), id_col.desc())
+    return query.order_by(sort_col.asc(), id_col.asc())
+
+def keyset_query(query, sort_col, id_col, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """
+    `query` restricted to the rows after `cursor`, ordered by (sort_col, id_col)
+    and limited to limit + 1 rows. NULL sort values keep the dialect's native
+    position so a plain (…, sort_col, id_col) index can serve the ORDER BY.
+    When NULLs sort after a non-NULL cursor, only the non-NULL rows are
+    selected, behind a plain range bound the index can seek to (an OR with
+    IS NULL would leave only the index prefix usable); keyset_page() then
+    continues into the NULLs.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort_col)
+        id_after = id_col < row_id if descending else id_col > row_id
+        if sort_value is None:
+            after = and_(sort_col.is_(None), id_after)
+            if nulls_sort_first(query, descending):
+                after = or_(after, sort_col.isnot(None))
+            query = query.filter(after)
+        else:
+            bound = sort_col <= sort_value if descending else sort_col >= sort_value
+            beyond = sort_col < sort_value if descending else sort_col > sort_value
+            query = query.filter(bound, or_(beyond, and_(sort_col == sort_value, id_after)))
+    return order_by_key(query, sort_col, id_col, descending).limit(limit + 1)
+
+def null_tail(query, sort_col, id_col, cursor, descending):
+    """Whether rows with a NULL sort value still follow a page read by keyset_query()."""
+    if not cursor or nulls_sort_first(query, descending):
+        return False
+    sort_value, _ = decode_cursor(cursor, sort_col)
+    return sort_value is not None
+
+def keyset_page(query, sort_col, id_col, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """
+    One page of `query` ordered by (sort_col, id_col).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    rows = keyset_query(query, sort_col, id_col, cursor, limit, descending).all()
+    if len(rows) <= limit and null_tail(query, sort_col, id_col, cursor, descending):
+        nulls = query.filter(sort_col.is_(None))
+        nulls = order_by_key(nulls, sort_col, id_col, descending).limit(limit + 1 - len(rows))
+        rows += nulls.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_col.key), getattr(last, id_col.key))
+    return rows, next_cursor
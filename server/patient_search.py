@@ -0,0 +1,136 @@
+from difflib import SequenceMatcher
+from sqlalchemy import and_, func, literal, literal_column, or_, text
+from models import db, Patient
+
+# --- Patient Search ---
+# Candidates come from a trigram index: an FTS5 table (trigram tokenizer) kept
+# in sync by triggers on SQLite, a pg_trgm GIN expression index on Postgres
+# (both created by the patient_search migration). A substring match on every
+# search term is tried first; if that finds fewer than `limit` patients,
+# misspellings are allowed (see SEARCH_MODES). Candidates are then scored the
+# same way on both databases (prefix > substring > closest spelling).
+
+MIN_QUERY_LENGTH = 3
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Candidates fetched per requested result before re-ranking
+CANDIDATE_FACTOR = 5
+SEARCH_FIELDS = ('first_name', 'last_name', 'phone', 'national_id')
+# Candidate passes, tried until enough patients are found: every term starts
+# a field, every term appears as typed, every term allowing a typo, any term
+# allowing a typo
+SEARCH_MODES = ('prefix', 'exact', 'fuzzy', 'any')
+
+# Must match the index expression in the migration exactly
+PG_SEARCH_DOCUMENT = "(first_name || ' ' || last_name || ' ' || coalesce(phone, '') || ' ' || national_id)"
+
+class InvalidSearch(ValueError):
+    pass
+
+def search_terms(q):
+    """Lower-cased terms of at least MIN_QUERY_LENGTH characters."""
+    terms = [term for term in (q or '').lower().replace('"', ' ').split() if len(term) >= MIN_QUERY_LENGTH]
+    if not terms:
+        raise InvalidSearch(f"Search needs a term of at least {MIN_QUERY_LENGTH} characters")
+    return terms
+
+def trigrams(value):
+    value = value.lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+def spelling_variants(term):
+    """
+    FTS5 expressions matching likely intended spellings of a term: the term
+    with one letter dropped ("jonh" -> "joh" in "john"), or both sides of one
+    wrong letter ("kerimi" -> "ker" AND "imi"). Pieces shorter than a trigram
+    can't be matched and are left out.
+    """
+    variants = {fts_phrase(term)}
+    for i in range(len(term)):
+        dropped = term[:i] + term[i + 1:]
+        if len(dropped) >= MIN_QUERY_LENGTH:
+            variants.add(fts_phrase(dropped))
+        pieces = [piece for piece in (term[:i], term[i + 1:]) if len(piece) >= MIN_QUERY_LENGTH]
+        if pieces:
+            variants.add(' AND '.join(fts_phrase(piece) for piece in pieces))
+    return '(' + ' OR '.join(f'({v})' for v in sorted(variants)) + ')'
+
+def term_score(term, value):
+    if not value:
+        return 0.0
+    value = str(value).lower()
+    if value.startswith(term):
+        return 1.0 + len(term) / len(value)
+    if term in value:
+        return 0.8
+    # Typo: closest word prefix of about the term's length ("jonh" vs "johnson")
+    return max(SequenceMatcher(None, term, word[:len(term) + 1]).ratio() for word in value.split() or [value]) * 0.7
+
+def score(row, terms):
+    return sum(max(term_score(term, getattr(row, field)) for field in SEARCH_FIELDS) for term in terms) / len(terms)
+
+def fts_phrase(term):
+    return '"' + term + '"'
+
+def sqlite_candidates(terms, mode, limit):
+    # Unranked: bm25 over every match of a common trigram costs far more than
+    # re-ranking a bounded candidate set in Python
+    if mode == 'prefix':
+        match = ' AND '.join('^' + fts_phrase(term) for term in terms)
+    elif mode == 'exact':
+        match = ' AND '.join(fts_phrase(term) for term in terms)
+    else:
+        match = (' AND ' if mode == 'fuzzy' else ' OR ').join(spelling_variants(term) for term in terms)
+    rows = db.session.execute(
+        text("SELECT rowid FROM patients_fts WHERE patients_fts MATCH :match LIMIT :limit"),
+        {"match": match, "limit": limit}
+    ).all()
+    return [row[0] for row in rows]
+
+def like_escape(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def postgres_candidates(terms, mode, limit):
+    document = literal_column(PG_SEARCH_DOCUMENT)
+    query = db.session.query(Patient.id)
+    if mode == 'prefix':
+        # Start of the document or of any word in it
+        query = query.filter(and_(*(or_(
+            document.ilike(like_escape(term) + '%', escape='\\'),
+            document.ilike('% ' + like_escape(term) + '%', escape='\\')
+        ) for term in terms)))
+    elif mode == 'exact':
+        query = query.filter(and_(*(document.ilike('%' + like_escape(term) + '%', escape='\\') for term in terms)))
+    else:
+        # term <% document: word_similarity above pg_trgm.word_similarity_threshold
+        matches = [literal(term).op('<%')(document) for term in terms]
+        query = query.filter(and_(*matches) if mode == 'fuzzy' else or_(*matches)).order_by(
+            sum(func.word_similarity(term, document) for term in terms).desc()
+        )
+    return [row[0] for row in query.limit(limit).all()]
+
+def search_patients(q, limit=DEFAULT_LIMIT):
+    """Top `limit` patients for a free-text query, best first, each with its score."""
+    terms = search_terms(q)
+    candidates_for = postgres_candidates if db.engine.dialect.name == 'postgresql' else sqlite_candidates
+    pool = limit * CANDIDATE_FACTOR
+    ids = []
+    for mode in SEARCH_MODES:
+        if len(ids) >= limit:
+            break
+        seen = set(ids)
+        ids += [i for i in candidates_for(terms, mode, pool) if i not in seen]
+    if not ids:
+        return []
+    rows = db.session.query(
+        Patient.id, Patient.first_name, Patient.last_name, Patient.phone, Patient.national_id
+    ).filter(Patient.id.in_(ids)).all()
+    ranked = sorted(((score(row, terms), row) for row in rows), key=lambda item: (-item[0], item[1].id))
+    return [{
+        "id": row.id,
+        "first_name": row.first_name,
+        "last_name": row.last_name,
+        "phone": row.phone,
+        "national_id": row.national_id,
+        "score": round(value, 3)
+    } for value, row in ranked[:limit]]
@@ -0,0 +1,54 @@
+from models import db, Exam, Patient, Doctor
+
+# --- Exam List Projections ---
+# List endpoints select only the columns a role's view needs, straight into
+# rows, instead of hydrating Exam objects and discarding fields in to_dict.
+# Output matches Exam.to_dict(role) except that internal_notes (unbounded
+# text) is only included when asked for.
+
+BASE_COLUMNS = (
+    Exam.id, Exam.patient_id, Exam.exam_type, Exam.exam_date, Exam.time_slot,
+    Exam.has_contrast, Exam.payment_status, Exam.payment_method, Exam.info_source,
+    Exam.assigned_tech, Exam.mri_machine_id, Exam.scan_start, Exam.scan_end,
+    Exam.status, Exam.radiologist_name, Exam.radiologist_license,
+    Exam.report_status, Exam.file_url, Exam.is_locked, Exam.created_at,
+    Patient.first_name, Patient.last_name, Patient.national_id,
+)
+
+ADMIN_COLUMNS = (
+    Exam.price, Exam.discount, Exam.incentive_amount, Exam.incentive_status,
+    Doctor.name.label('referring_doctor'),
+)
+
+DATE_FIELDS = ('exam_date', 'scan_start', 'scan_end', 'created_at')
+
+def exam_rows_query(role=None, include_notes=False):
+    """Query yielding projected rows for an exam list; filter/paginate on Exam columns."""
+    columns = list(BASE_COLUMNS)
+    if include_notes:
+        columns.append(Exam.internal_notes)
+    if role == 'Admin':
+        columns.extend(ADMIN_COLUMNS)
+    query = db.session.query(*columns).select_from(Exam).join(Patient, Patient.id == Exam.patient_id)
+    if role == 'Admin':
+        query = query.outerjoin(Doctor, Doctor.id == Exam.referring_doctor_id)
+    return query
+
+def exam_fields(role=None, include_notes=False):
+    """Keys of row_to_dict() output for a projection, in output order."""
+    keys = [c.key for c in BASE_COLUMNS if c.key not in ('first_name', 'last_name')]
+    if include_notes:
+        keys.append('internal_notes')
+    if role == 'Admin':
+        keys.extend(c.key for c in ADMIN_COLUMNS)
+    return keys + ['patient_name']
+
+def row_to_dict(row):
+    data = row._asdict()
+    first_name = data.pop('first_name')
+    last_name = data.pop('last_name')
+    data['patient_name'] = f"{first_name} {last_name}"
+    for field in DATE_FIELDS:
+        value = data[field]
+        data[field] = value.isoformat() if value else None
+    return data
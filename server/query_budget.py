@@ -0,0 +1,89 @@
+import logging
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Debug switch: count SQL statements per request and flag requests that go
+# over SQL_QUERY_BUDGET. SQL_QUERY_BUDGET_ACTION is "log" (default) or "reject".
+# "reject" is enforced when the request commits: a commit over budget raises
+# before anything is written, so the transaction rolls back and the client
+# gets the 500. A request that commits nothing is rejected after the view
+# instead. Statements run after a successful commit can't undo it; those
+# requests are only logged.
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, count, budget):
+        super().__init__(f"SQL statement budget exceeded ({count} > {budget})")
+        self.count = count
+        self.budget = budget
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+
+def get_statement_count():
+    if has_request_context():
+        return g.get('sql_statements', 0)
+    return 0
+
+def budget_exceeded_response(count, budget):
+    rejected = jsonify({
+        "msg": "SQL statement budget exceeded",
+        "statements": count,
+        "budget": budget
+    })
+    rejected.status_code = 500
+    rejected.headers["X-SQL-Statements"] = str(count)
+    return rejected
+
+def init_query_budget(app, session_class):
+    budget = app.config.get("SQL_QUERY_BUDGET") or 0
+    action = (app.config.get("SQL_QUERY_BUDGET_ACTION") or "log").lower()
+    if budget <= 0:
+        return
+
+    @app.before_request
+    def reset_statement_count():
+        g.sql_statements = 0
+        g.sql_committed = False
+
+    if action == "reject":
+        @event.listens_for(session_class, 'before_commit')
+        def enforce_statement_budget(session):
+            if not has_request_context() or 'sql_statements' not in g:
+                return
+            # Count the pending writes too
+            session.flush()
+            count = get_statement_count()
+            if count > budget:
+                raise QueryBudgetExceeded(count, budget)
+
+        @event.listens_for(session_class, 'after_commit')
+        def record_commit(session):
+            if has_request_context() and 'sql_statements' in g:
+                g.sql_committed = True
+
+        @app.errorhandler(QueryBudgetExceeded)
+        def reject_over_budget(e):
+            logger.warning(
+                "SQL budget exceeded: %s %s issued %d statements before committing (budget %d)",
+                request.method, request.path, e.count, e.budget
+            )
+            return budget_exceeded_response(e.count, e.budget)
+
+    @app.after_request
+    def check_statement_budget(response):
+        count = get_statement_count()
+        response.headers["X-SQL-Statements"] = str(count)
+        if count <= budget:
+            return response
+        logger.warning(
+            "SQL budget exceeded: %s %s issued %d statements (budget %d)",
+            request.method, request.path, count, budget
+        )
+        if action == "reject" and not g.get('sql_committed'):
+            return budget_exceeded_response(count, budget)
+        return response
@@ -0,0 +1,122 @@
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, select, text
+from models import db, Exam, AuditLog, ExamTombstone, MachineSlot
+from pagination import encode_cursor, keyset_query
+from delta_sync import since_range
+from reports import bonus_exams
+
+# Query shapes of the exam queues and admin reports, checked against the
+# database's EXPLAIN output by `flask check-query-plans`. Each entry lists the
+# indexes the plan must go through and the columns each must be searched on:
+# an index used only for its leading column (say, status) still reads every
+# row with that value, which a "no full scan" check would let through.
+
+def queue_queries():
+    now = datetime.now()
+    week_start = now - timedelta(days=7)
+    cursor = encode_cursor(now, 'x')
+
+    def page(query, sort_col, id_col, descending):
+        # Second page of a keyset-paginated list, exactly as the endpoints build it
+        return keyset_query(query, sort_col, id_col, cursor=cursor, descending=descending).statement
+
+    return {
+        "reports queue": (page(
+            Exam.query.filter(Exam.status == 'Completed'), Exam.scan_end, Exam.id, True),
+            [('ix_exams_status_scan_end', ('status', 'scan_end'))]),
+        "pending queue": (page(
+            Exam.query.filter(Exam.status == 'Pending'), Exam.created_at, Exam.id, False),
+            [('ix_exams_status_created_at', ('status', 'created_at'))]),
+        "today's exams": (page(
+            Exam.query.filter(Exam.exam_date == now.date()), Exam.created_at, Exam.id, False),
+            [('ix_exams_exam_date', ('exam_date', 'created_at'))]),
+        "bonus report": (bonus_exams(week_start, now), [
+            ('ix_exams_status_scan_end', ('status', 'scan_end')),
+            ('ix_exams_status_exam_date_unscanned', ('status', 'exam_date')),
+        ]),
+        "weekly lock": (select(Exam.id).where(
+            Exam.scan_end >= week_start, Exam.scan_end <= now, Exam.is_locked == False),
+            [('ix_exams_is_locked_scan_end', ('is_locked', 'scan_end'))]),
+        "sheets sync": (select(Exam.id).where(
+            Exam.updated_at <= now,
+            Exam.updated_at >= week_start,
+            or_(Exam.updated_at > week_start, and_(Exam.updated_at == week_start, Exam.id > 'x'))
+        ).order_by(Exam.updated_at, Exam.id).limit(500), [('ix_exams_updated_at', ('updated_at',))]),
+        "delta sync": (keyset_query(
+            since_range(Exam.query, Exam.updated_at, cursor, now), Exam.updated_at, Exam.id,
+            cursor=cursor, descending=False).statement, [('ix_exams_updated_at', ('updated_at',))]),
+        "delta sync tombstones": (keyset_query(
+            since_range(ExamTombstone.query, ExamTombstone.deleted_at, cursor, now),
+            ExamTombstone.deleted_at, ExamTombstone.exam_id, cursor=cursor, descending=False).statement,
+            [('ix_exam_tombstones_deleted_at', ('deleted_at',))]),
+        "record history": (page(
+            AuditLog.query.filter(AuditLog.target_table == 'exams', AuditLog.target_id == 'x'),
+            AuditLog.timestamp, AuditLog.id, False),
+            [('ix_audit_logs_target', ('target_table', 'target_id', 'timestamp'))]),
+        "audit log": (page(AuditLog.query, AuditLog.timestamp, AuditLog.id, True),
+            [('ix_audit_logs_timestamp_id', ('timestamp',))]),
+        "user activity": (page(
+            AuditLog.query.filter(AuditLog.user_id == 'x', AuditLog.timestamp >= week_start),
+            AuditLog.timestamp, AuditLog.id, True),
+            [('ix_audit_logs_user', ('user_id', 'timestamp'))]),
+        "free slots": (select(MachineSlot.machine_id, MachineSlot.day, MachineSlot.slot).where(
+            MachineSlot.day >= now.date(), MachineSlot.day <= now.date() + timedelta(days=6),
+            MachineSlot.machine_id.in_(['x', 'y'])
+        ), [(primary_key_index('machine_slots'), ('day',))]),
+    }
+
+def explain(statement):
+    """Plan lines for a statement on the current database."""
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    with db.engine.connect() as connection:
+        if dialect.name == 'sqlite':
+            rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+            return [row[-1] for row in rows]
+        with connection.begin():
+            # Small tables make the planner prefer seq scans; ask whether an index *can* serve it
+            connection.execute(text("SET LOCAL enable_seqscan = off"))
+            return [row[0] for row in connection.execute(text(f"EXPLAIN {sql}")).all()]
+
+def primary_key_index(table):
+    return f"sqlite_autoindex_{table}_1" if db.engine.dialect.name == 'sqlite' else f"{table}_pkey"
+
+def index_condition(plan, index):
+    """What the plan searches `index` on, or None when it doesn't use the index."""
+    for i, line in enumerate(plan):
+        if not re.search(rf"\b{re.escape(index)}\b", line):
+            continue
+        if db.engine.dialect.name == 'sqlite':
+            # SEARCH exams USING INDEX ix_… (status=? AND scan_end>?)
+            return line.split(index, 1)[1]
+        # Postgres: "Index Cond: …" lines of the same node, before the next "->"
+        condition = []
+        for following in plan[i + 1:]:
+            if '->' in following:
+                break
+            condition.append(following)
+        return ' '.join(line for line in condition if 'Index Cond' in line)
+    return None
+
+def plan_problems(plan, expected):
+    """Why the plan misses the expected index searches; empty when it doesn't."""
+    problems = []
+    for index, columns in expected:
+        condition = index_condition(plan, index)
+        if condition is None:
+            problems.append(f"does not use {index}")
+            continue
+        for column in columns:
+            # sqlite: scan_end>?   postgres: (scan_end >= '…'), (status)::text = '…'
+            if not re.search(rf"\b{column}\b\)?(::[\w ]+)?\s*(=|<|>|IN\b|= ANY)", condition):
+                problems.append(f"searches {index} without {column}")
+    return problems
+
+def check_query_plans():
+    """[(name, plan lines, problems)] for every tracked query shape."""
+    results = []
+    for name, (statement, expected) in queue_queries().items():
+        plan = explain(statement)
+        results.append((name, plan, plan_problems(plan, expected)))
+    return results
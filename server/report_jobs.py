@@ -0,0 +1,328 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from werkzeug.http import parse_options_header
+from caching import current_version
+from exam_events import latest_event_id
+from models import db, AuditLog, Exam, ReportJob
+
+logger = logging.getLogger(__name__)
+
+# --- Report Jobs ---
+# Heavy admin reports run in a separate worker process pool instead of a web
+# worker. A job is the query string of one of the report endpoints below; the
+# worker replays it in-process as the submitting admin and stores the response
+# body in a file, so a job's result is exactly what the endpoint returns.
+# Identical requests share one in-flight job (unique in_flight_key), and a
+# finished result is reused until its source tables change (fingerprint).
+
+JOB_KINDS = {
+    # kind: (endpoint, source tables)
+    'bonus-report': ('/api/admin/bonus-report', ('exams', 'doctors')),
+    'revenue': ('/api/admin/revenue', ('exams',)),
+    'revenue-week': ('/api/admin/revenue-week', ('exams',)),
+    'export-exams': ('/api/admin/export/exams', ('exams', 'doctors')),
+    'export-audit-logs': ('/api/admin/export/audit-logs', ('audit_logs',)),
+}
+MAX_ATTEMPTS = 3
+CHUNK_SIZE = 64 * 1024
+
+class InvalidJob(ValueError):
+    pass
+
+def canonical_params(params):
+    if not isinstance(params, dict) or not all(
+        isinstance(value, (str, int, float, bool)) for value in params.values()
+    ):
+        raise InvalidJob("params must be an object of query string values")
+    return json.dumps({str(k): str(v) for k, v in params.items()}, sort_keys=True, separators=(',', ':'))
+
+def data_fingerprint(sources):
+    """
+    Cheap summary of the source tables: any committed change to them changes it.
+    Exams: newest change event (every committed exam write publishes one), plus
+    row count and newest updated_at for the patient edits that only touch
+    updated_at; doctors: the cache version; audit_logs: append-only, newest id.
+    """
+    parts = []
+    for source in sources:
+        if source == 'exams':
+            newest, count = db.session.query(func.max(Exam.updated_at), func.count(Exam.id)).one()
+            parts.append(f"exams:{latest_event_id()}:{newest.isoformat() if newest else '-'}:{count}")
+        elif source == 'doctors':
+            parts.append(f"doctors:{current_version('doctors')}")
+        elif source == 'audit_logs':
+            parts.append(f"audit_logs:{db.session.query(func.max(AuditLog.id)).scalar() or 0}")
+    return '|'.join(parts)
+
+def job_to_dict(job, state=None):
+    data = {
+        "id": job.id,
+        "kind": job.kind,
+        "params": json.loads(job.params),
+        "status": job.status,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_by": job.created_by,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "result_size": job.result_size,
+        "result_url": f"/api/admin/report-jobs/{job.id}/result" if job.status == 'done' else None,
+    }
+    if state:
+        data["state"] = state
+    return data
+
+def submit_job(kind, params, user_id):
+    """
+    (job, state): a fresh cached result ("cached"), the identical job already
+    queued or running ("in_flight"), or a newly queued job ("queued").
+    """
+    if kind not in JOB_KINDS:
+        raise InvalidJob(f"Invalid kind, expected one of {', '.join(sorted(JOB_KINDS))}")
+    params = canonical_params(params or {})
+    params_key = hashlib.sha256(f"{kind}?{params}".encode()).hexdigest()
+
+    fingerprint = data_fingerprint(JOB_KINDS[kind][1])
+    cached = ReportJob.query.filter(
+        ReportJob.params_key == params_key, ReportJob.status == 'done'
+    ).order_by(ReportJob.finished_at.desc()).first()
+    if cached and cached.fingerprint == fingerprint and os.path.exists(cached.result_path):
+        return cached, 'cached'
+
+    in_flight = ReportJob.query.filter(ReportJob.in_flight_key == params_key).first()
+    if in_flight:
+        return in_flight, 'in_flight'
+    job = ReportJob(id=str(uuid.uuid4()), kind=kind, params=params, params_key=params_key,
+                    in_flight_key=params_key, status='queued', created_by=user_id)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Submitted by someone else in the meantime
+        db.session.rollback()
+        in_flight = ReportJob.query.filter(ReportJob.in_flight_key == params_key).first()
+        if in_flight:
+            return in_flight, 'in_flight'
+        raise
+    return job, 'queued'
+
+class ReportWorker:
+    """
+    Claims queued jobs one at a time and runs them until stopped. A running
+    job is leased: the worker refreshes heartbeat_at, and only a job whose
+    lease lapsed (its worker died) is handed to another worker. Writes back
+    are conditional on still holding the job.
+    """
+    def __init__(self, app, results_dir, poll_interval=1.0, lease=120, retention=timedelta(days=7)):
+        self.app = app
+        self.results_dir = results_dir
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retention = retention
+        self.name = f"{os.uname().nodename}:{os.getpid()}"
+        self._stop = threading.Event()
+
+    def requeue_stale(self, now):
+        # Jobs whose worker stopped heartbeating: run again, or give up after MAX_ATTEMPTS
+        table = ReportJob.__table__
+        stale = (table.c.status == 'running') & (
+            func.coalesce(table.c.heartbeat_at, table.c.started_at) < now - timedelta(seconds=self.lease))
+        released = dict(started_at=None, claimed_by=None, heartbeat_at=None)
+        with db.engine.begin() as connection:
+            connection.execute(table.update().where(stale, table.c.attempts >= MAX_ATTEMPTS).values(
+                status='failed', error="Worker stopped responding", in_flight_key=None, finished_at=now, **released))
+            connection.execute(table.update().where(stale).values(status='queued', **released))
+
+    def owned(self, job_id):
+        """Where-clause: the job is still running under this worker."""
+        table = ReportJob.__table__
+        return (table.c.id == job_id) & (table.c.status == 'running') & (table.c.claimed_by == self.name)
+
+    def claim(self):
+        """Id of the oldest queued job, now marked running by this worker, or None."""
+        now = datetime.utcnow()
+        self.requeue_stale(now)
+        table = ReportJob.__table__
+        with db.engine.begin() as connection:
+            candidates = connection.execute(
+                db.select(table.c.id).where(table.c.status == 'queued').order_by(table.c.created_at).limit(5)
+            ).scalars().all()
+            for job_id in candidates:
+                # Conditional update: only one worker wins each job
+                claimed = connection.execute(table.update().where(
+                    table.c.id == job_id, table.c.status == 'queued'
+                ).values(status='running', started_at=now, heartbeat_at=now, claimed_by=self.name,
+                         attempts=table.c.attempts + 1))
+                if claimed.rowcount == 1:
+                    return job_id
+        return None
+
+    def heartbeat(self, engine, job_id, done):
+        """Refresh the lease every quarter of it until `done` is set or the job is lost."""
+        table = ReportJob.__table__
+        while not done.wait(self.lease / 4):
+            with engine.begin() as connection:
+                if connection.execute(table.update().where(self.owned(job_id)).values(
+                        heartbeat_at=datetime.utcnow())).rowcount == 0:
+                    return
+
+    def run_job(self, job_id):
+        done = threading.Event()
+        beat = threading.Thread(target=self.heartbeat, args=(db.engine, job_id, done), name='report-heartbeat', daemon=True)
+        beat.start()
+        try:
+            self._run_job(job_id)
+        finally:
+            done.set()
+            beat.join()
+
+    def _run_job(self, job_id):
+        job = db.session.get(ReportJob, job_id)
+        endpoint, sources = JOB_KINDS[job.kind]
+        # Taken before reading: a change during the run makes the result stale, not wrong-but-fresh
+        fingerprint = data_fingerprint(sources)
+        params, created_by = json.loads(job.params), job.created_by
+        # One file per attempt: a worker that lost the job never overwrites the winner's result
+        path = os.path.join(self.results_dir, f"{job.id}-{job.attempts}")
+        db.session.commit()
+        os.makedirs(self.results_dir, exist_ok=True)
+        token = create_access_token(identity=created_by or "System/ReportWorker", additional_claims={"role": "Admin"})
+        response = self.app.test_client().get(
+            endpoint, query_string=params,
+            headers={"Authorization": f"Bearer {token}"}, buffered=False
+        )
+        try:
+            if response.status_code != 200:
+                body = response.get_data(as_text=True)
+                try:
+                    error = json.loads(body).get("msg") or body
+                except (ValueError, AttributeError):
+                    error = body
+                self.finish(job_id, status='failed', error=f"{response.status_code}: {error}"[:2000])
+                return
+            size = 0
+            with open(path + '.tmp', 'wb') as f:
+                for chunk in response.iter_encoded():
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(path + '.tmp', path)
+        finally:
+            response.close()
+        filename = parse_options_header(response.headers.get("Content-Disposition", ""))[1].get("filename")
+        if not self.finish(job_id, status='done', fingerprint=fingerprint, content_type=response.mimetype,
+                           filename=filename, result_path=path, result_size=size):
+            logger.warning("Report job %s was taken over by another worker; discarding this result", job_id)
+            os.remove(path)
+
+    def finish(self, job_id, **fields):
+        """Store the outcome if this worker still holds the job; whether it did."""
+        table = ReportJob.__table__
+        with db.engine.begin() as connection:
+            return connection.execute(table.update().where(self.owned(job_id)).values(
+                in_flight_key=None, finished_at=datetime.utcnow(), **fields)).rowcount == 1
+
+    def prune(self):
+        """Drop finished jobs, and their files, older than the retention window."""
+        old = ReportJob.query.filter(ReportJob.finished_at < datetime.utcnow() - self.retention).all()
+        for job in old:
+            if job.result_path and os.path.exists(job.result_path):
+                os.remove(job.result_path)
+            db.session.delete(job)
+        db.session.commit()
+        return len(old)
+
+    def run_once(self):
+        """Run one job if any is queued; True if one ran."""
+        with self.app.app_context():
+            job_id = self.claim()
+            if job_id is None:
+                return False
+            try:
+                self.run_job(job_id)
+            except Exception as e:
+                logger.exception("Report job %s failed", job_id)
+                db.session.rollback()
+                job = db.session.get(ReportJob, job_id)
+                if job.attempts >= MAX_ATTEMPTS:
+                    self.finish(job_id, status='failed', error=str(e)[:2000])
+                else:
+                    with db.engine.begin() as connection:
+                        connection.execute(ReportJob.__table__.update().where(self.owned(job_id)).values(
+                            status='queued', started_at=None, claimed_by=None, heartbeat_at=None))
+            finally:
+                db.session.remove()
+        return True
+
+    def run_forever(self):
+        next_prune = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() >= next_prune:
+                with self.app.app_context():
+                    self.prune()
+                    db.session.remove()
+                next_prune = time.monotonic() + 3600
+            try:
+                ran = self.run_once()
+            except Exception:
+                logger.exception("Report worker loop failed")
+                ran = False
+            if not ran:
+                self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+def _worker_main(app, results_dir, poll_interval, lease):
+    # Forked from the pool process: never reuse its database connections
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    worker = ReportWorker(app, results_dir, poll_interval, lease)
+    # The pool process handles Ctrl-C; a worker finishes its job on SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    threading.Thread(target=_stop_with_parent, args=(worker, os.getppid()), daemon=True).start()
+    worker.run_forever()
+
+def _stop_with_parent(worker, parent_pid):
+    # A pool killed outright (SIGKILL) is replaced; its workers must not live on beside the new one
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    worker.stop()
+
+def run_worker_pool(app, processes, results_dir, poll_interval=1.0, lease=120):
+    """Keep `processes` worker processes running until interrupted; dead ones are replaced."""
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt
+    # Process managers stop the pool with SIGTERM
+    signal.signal(signal.SIGTERM, interrupt)
+    context = multiprocessing.get_context('fork')
+    args = (app, results_dir, poll_interval, lease)
+    pool = [context.Process(target=_worker_main, args=args, daemon=True) for _ in range(processes)]
+    for process in pool:
+        process.start()
+    try:
+        while True:
+            time.sleep(5)
+            for i, process in enumerate(pool):
+                if not process.is_alive():
+                    logger.warning("Report worker %s exited (%s); restarting", process.pid, process.exitcode)
+                    pool[i] = context.Process(target=_worker_main, args=args, daemon=True)
+                    pool[i].start()
+    finally:
+        for process in pool:
+            process.terminate()
+        for process in pool:
+            process.join(10)
@@ -0,0 +1,98 @@
+from datetime import timedelta
+from sqlalchemy import func, select, union_all
+from models import db, Exam, Doctor
+from rollups import revenue_by_day
+
+# --- Shared Report Queries ---
+# Used by the admin report endpoints and the Google Sheets sync.
+
+def week_bounds(now):
+    """Monday 00:00:00 to Sunday 23:59:59 of the week containing `now`."""
+    start_of_week = now - timedelta(days=now.weekday())
+    start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_week = start_of_week + timedelta(days=6, hours=23, minutes=59, seconds=59)
+    return start_of_week, end_of_week
+
+def bonus_exams(start, end):
+    """
+    (referring_doctor_id, incentive_amount) of the referred completed exams
+    in [start, end]. Two branches, each served by its own index: by scan_end
+    (ix_exams_status_scan_end), and by exam_date for exams without a scan
+    time (ix_exams_status_exam_date_unscanned). One OR across both would only
+    use the status prefix and read every completed exam.
+    """
+    columns = (Exam.referring_doctor_id, Exam.incentive_amount)
+    referred = (Exam.status == 'Completed', Exam.referring_doctor_id != None)
+    return union_all(
+        select(*columns).where(*referred, Exam.scan_end >= start, Exam.scan_end <= end),
+        select(*columns).where(
+            *referred, Exam.scan_end == None, Exam.exam_date >= start.date(), Exam.exam_date <= end.date()
+        ),
+    )
+
+def bonus_totals(start, end):
+    """
+    Referral bonus per doctor for completed exams in [start, end] (scan_end,
+    or exam_date when the scan time is missing), as
+    (doctor_id, name, hospital, exam_count, total_bonus) ordered by doctor_id.
+    name is None when the doctor record no longer exists.
+    """
+    exams = bonus_exams(start, end).subquery()
+    return db.session.query(
+        exams.c.referring_doctor_id,
+        Doctor.name,
+        Doctor.hospital,
+        func.count(),
+        func.coalesce(func.sum(exams.c.incentive_amount), 0)
+    ).outerjoin(
+        Doctor, Doctor.id == exams.c.referring_doctor_id
+    ).group_by(
+        exams.c.referring_doctor_id, Doctor.name, Doctor.hospital
+    ).order_by(exams.c.referring_doctor_id).all()
+
+def bonus_report_data(start, end):
+    """The bonus-report response body for [start, end]."""
+    return {
+        "period": f"{start.strftime('%Y-%m-%d')} to {end.strftime('%Y-%m-%d')}",
+        "data": [{
+            "doctor_id": doc_id,
+            "doctor_name": name or "Unknown",
+            "hospital": hospital if name is not None else "Unknown",
+            "exam_count": exam_count,
+            "total_bonus": total_bonus
+        } for doc_id, name, hospital, exam_count, total_bonus in bonus_totals(start, end)]
+    }
+
+def revenue_week_data(now):
+    """
+    The revenue-week response body: revenue from completed exams in the week
+    containing `now`, from the daily rollup.
+    Revenue = max(price - discount, 0) when payment_status is Paid/Partial.
+    """
+    start_of_week, end_of_week = week_bounds(now)
+    days = revenue_by_day(start_of_week.date(), end_of_week.date())
+
+    total_revenue = 0.0
+    counts = {"Paid": 0, "Partial": 0, "Unpaid": 0}
+    series = []
+    for i in range(7):
+        day = start_of_week + timedelta(days=i)
+        day_total = 0.0
+        for bucket, (revenue, exam_count) in days.get(day.date(), {}).items():
+            day_total += revenue
+            counts[bucket] = counts.get(bucket, 0) + exam_count
+        total_revenue += day_total
+        series.append({
+            "date": day.date().isoformat(),
+            "label": day.strftime("%a"),
+            "total": round(day_total, 2)
+        })
+
+    return {
+        "period": f"{start_of_week.strftime('%Y-%m-%d')} to {end_of_week.strftime('%Y-%m-%d')}",
+        "total_revenue": round(total_revenue, 2),
+        "paid_count": counts["Paid"],
+        "partial_count": counts["Partial"],
+        "unpaid_count": counts["Unpaid"],
+        "series": series
+    }
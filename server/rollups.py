@@ -0,0 +1,169 @@
+from collections import defaultdict
+from datetime import date, datetime
+from sqlalchemy import and_, case, event, func, inspect
+from models import db, Exam, DailyRevenue
+
+# --- Daily Revenue Rollup ---
+# Maintained from the session flush so it commits (or rolls back) together with
+# the exam change. Only completed exams with a scan_end contribute, matching
+# what the weekly revenue report has always counted.
+
+ROLLUP_COLUMNS = ('status', 'scan_end', 'price', 'discount', 'payment_status')
+
+def payment_bucket(payment_status):
+    status = (payment_status or '').lower()
+    if status == 'paid':
+        return 'Paid'
+    if status == 'partial':
+        return 'Partial'
+    return 'Unpaid'
+
+def revenue_amount(price, discount, bucket):
+    if bucket not in ('Paid', 'Partial'):
+        return 0.0
+    return max((price or 0) - (discount or 0), 0)
+
+def contribution(values):
+    """(day, bucket, revenue) an exam adds to the rollup, or None."""
+    if values['status'] != 'Completed' or values['scan_end'] is None:
+        return None
+    bucket = payment_bucket(values['payment_status'])
+    return values['scan_end'].date(), bucket, revenue_amount(values['price'], values['discount'], bucket)
+
+def _current_values(obj):
+    return {key: getattr(obj, key) for key in ROLLUP_COLUMNS}
+
+def _previous_values(obj):
+    state = inspect(obj)
+    values = {}
+    for key in ROLLUP_COLUMNS:
+        hist = state.attrs[key].history
+        if hist.deleted:
+            values[key] = hist.deleted[0]
+        elif hist.added:
+            values[key] = None
+        else:
+            values[key] = hist.unchanged[0] if hist.unchanged else None
+    return values
+
+def _upsert_statement(dialect_name):
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    table = DailyRevenue.__table__
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.day, table.c.payment_status],
+        set_={
+            'revenue': table.c.revenue + stmt.excluded.revenue,
+            'exam_count': table.c.exam_count + stmt.excluded.exam_count
+        }
+    )
+
+def apply_revenue_deltas(connection, deltas):
+    """Add {(day, bucket): [revenue, count]} onto the rollup rows."""
+    rows = [
+        {'day': day, 'payment_status': bucket, 'revenue': revenue, 'exam_count': count}
+        for (day, bucket), (revenue, count) in deltas.items()
+        if revenue or count
+    ]
+    if not rows:
+        return
+    stmt = _upsert_statement(connection.dialect.name)
+    if stmt is not None:
+        connection.execute(stmt, rows)
+        return
+    table = DailyRevenue.__table__
+    for row in rows:
+        result = connection.execute(
+            table.update()
+            .where(table.c.day == row['day'], table.c.payment_status == row['payment_status'])
+            .values(revenue=table.c.revenue + row['revenue'], exam_count=table.c.exam_count + row['exam_count'])
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert(), [row])
+
+@event.listens_for(db.Session, 'after_flush')
+def update_revenue_rollup(session, flush_context):
+    deltas = defaultdict(lambda: [0.0, 0])
+
+    def add(values, sign):
+        contrib = contribution(values)
+        if contrib:
+            day, bucket, amount = contrib
+            deltas[(day, bucket)][0] += sign * amount
+            deltas[(day, bucket)][1] += sign
+
+    for obj in session.new:
+        if isinstance(obj, Exam):
+            add(_current_values(obj), 1)
+    for obj in session.dirty:
+        if isinstance(obj, Exam) and session.is_modified(obj):
+            add(_previous_values(obj), -1)
+            add(_current_values(obj), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Exam):
+            add(_previous_values(obj), -1)
+
+    if deltas:
+        apply_revenue_deltas(session.connection(), deltas)
+
+def rebuild_revenue_rollup(start=None, end=None):
+    """
+    Recompute rollup rows from the exams table, for all days or for scan days
+    in [start, end]. Returns the number of rollup rows written.
+    """
+    table = DailyRevenue.__table__
+    bucket = case(
+        (func.lower(Exam.payment_status) == 'paid', 'Paid'),
+        (func.lower(Exam.payment_status) == 'partial', 'Partial'),
+        else_='Unpaid'
+    )
+    net = func.coalesce(Exam.price, 0) - func.coalesce(Exam.discount, 0)
+    amount = case(
+        (and_(bucket.in_(['Paid', 'Partial']), net > 0), net),
+        else_=0
+    )
+    day = func.date(Exam.scan_end)
+    query = db.session.query(day, bucket, func.sum(amount), func.count(Exam.id)).filter(
+        Exam.status == 'Completed',
+        Exam.scan_end != None
+    )
+    delete = table.delete()
+    if start:
+        query = query.filter(Exam.scan_end >= datetime.combine(start, datetime.min.time()))
+        delete = delete.where(table.c.day >= start)
+    if end:
+        query = query.filter(Exam.scan_end <= datetime.combine(end, datetime.max.time()))
+        delete = delete.where(table.c.day <= end)
+    rows = [{
+        'day': date.fromisoformat(d) if isinstance(d, str) else d,
+        'payment_status': b,
+        'revenue': float(revenue or 0),
+        'exam_count': count
+    } for d, b, revenue, count in query.group_by(day, bucket).all()]
+
+    db.session.execute(delete)
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+def ensure_revenue_rollup():
+    """Backfill once when the rollup table is empty but completed exams exist."""
+    if db.session.query(DailyRevenue.id).first() is not None:
+        return
+    if db.session.query(Exam.id).filter(Exam.status == 'Completed', Exam.scan_end != None).first() is None:
+        return
+    rebuild_revenue_rollup()
+
+def revenue_by_day(start, end):
+    """{day: {bucket: (revenue, exam_count)}} for rollup days in [start, end]."""
+    rows = DailyRevenue.query.filter(DailyRevenue.day >= start, DailyRevenue.day <= end).all()
+    result = defaultdict(dict)
+    for row in rows:
+        result[row.day][row.payment_status] = (row.revenue, row.exam_count)
+    return result
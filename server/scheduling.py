@@ -0,0 +1,216 @@
+import math
+from datetime import datetime, timedelta
+from sqlalchemy import BigInteger, case, cast, event, func, inspect, insert, literal
+from sqlalchemy.exc import IntegrityError
+from models import db, Exam, Machine, MachineSlot
+
+# --- Machine Scheduling ---
+# A machine's day is split into SLOT_MINUTES slots and a booking is one
+# machine_slots row per slot it covers, keyed (day, machine_id, slot). The key
+# is what rules out double-booking: of two registrations racing for the same
+# slot only one can insert it, whichever worker runs them. Free-slot searches
+# load a window of days into per-machine bitmasks (bit n set = slot n taken)
+# and find runs of free bits, so their cost depends on the days scanned, not
+# on how many bookings exist.
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+HALF_DAY = SLOTS_PER_DAY // 2
+EXAM_MINUTES = {
+    "MRI Brain": 30, "MRI Spine": 45, "MRI Knee": 30, "MRI Shoulder": 30, "MRI Abdomen": 45,
+    "MRI Pelvis": 45, "MRA": 30, "MRI Breast": 45, "MRI Cardiac": 60, "MRI Prostate": 45,
+}
+DEFAULT_EXAM_MINUTES = 30
+CONTRAST_EXTRA_MINUTES = 15
+# How far ahead a free-slot search looks, read WINDOW_DAYS at a time
+SEARCH_DAYS = 60
+WINDOW_DAYS = 7
+MAX_FREE_SLOTS = 50
+# Statuses whose booking is given back
+RELEASED_STATUSES = {'Cancelled', 'Rescheduled'}
+
+class InvalidBooking(ValueError):
+    pass
+
+class SlotConflict(Exception):
+    def __init__(self, start, machine_id=None):
+        self.start = start
+        self.machine_id = machine_id
+        where = machine_id or "No machine"
+        super().__init__(f"{where} is already booked at {start.strftime('%Y-%m-%d %H:%M')}")
+
+def exam_slot_count(exam_type, has_contrast=False):
+    minutes = EXAM_MINUTES.get(exam_type, DEFAULT_EXAM_MINUTES)
+    if has_contrast:
+        minutes += CONTRAST_EXTRA_MINUTES
+    return math.ceil(minutes / SLOT_MINUTES)
+
+def slot_of(moment):
+    return (moment.hour * 60 + moment.minute) // SLOT_MINUTES
+
+def slot_start(day, slot):
+    return datetime.combine(day, datetime.min.time()) + timedelta(minutes=slot * SLOT_MINUTES)
+
+def span_mask(first_slot, count):
+    return ((1 << count) - 1) << first_slot
+
+def opening_mask(machine, day):
+    """Slots of `day` the machine is open for."""
+    if str(day.weekday()) not in machine.open_weekdays:
+        return 0
+    first = slot_of(machine.opens_at)
+    last = math.ceil((machine.closes_at.hour * 60 + machine.closes_at.minute) / SLOT_MINUTES) or SLOTS_PER_DAY
+    return span_mask(first, last - first) if last > first else 0
+
+def run_starts(free, length):
+    """Bits of `free` that start a run of `length` free slots."""
+    starts = free
+    for shift in range(1, length):
+        starts &= free >> shift
+    return starts
+
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def taken_masks(first_day, last_day, machine_ids=None):
+    """{(machine_id, day): mask of booked slots} for days in [first_day, last_day]."""
+    # Summed in SQL (slots are unique per machine and day, so the sum of 2**slot
+    # is the mask), one row per machine-day; split in two to stay within BIGINT
+    one = cast(literal(1), BigInteger)
+    low = func.sum(case((MachineSlot.slot < HALF_DAY, one.op('<<')(MachineSlot.slot)), else_=0))
+    high = func.sum(case((MachineSlot.slot >= HALF_DAY, one.op('<<')(MachineSlot.slot - HALF_DAY)), else_=0))
+    query = db.session.query(MachineSlot.machine_id, MachineSlot.day, low, high).filter(
+        MachineSlot.day >= first_day, MachineSlot.day <= last_day
+    )
+    if machine_ids is not None:
+        query = query.filter(MachineSlot.machine_id.in_(machine_ids))
+    query = query.group_by(MachineSlot.day, MachineSlot.machine_id)
+    return {(machine_id, day): int(low or 0) | int(high or 0) << HALF_DAY for machine_id, day, low, high in query}
+
+def bookable_machines(has_contrast=False, machine_id=None):
+    query = Machine.query.filter(Machine.is_active == True)
+    if has_contrast:
+        query = query.filter(Machine.supports_contrast == True)
+    if machine_id:
+        query = query.filter(Machine.id == machine_id)
+    return query.order_by(Machine.id).all()
+
+def free_slots(exam_type, has_contrast=False, after=None, count=5, machine_id=None, search_days=SEARCH_DAYS):
+    """
+    The next `count` starts (earliest first, then by machine) where an exam of
+    this type fits on one machine, from `after` (default now) on.
+    """
+    after = after or datetime.now()
+    length = exam_slot_count(exam_type, has_contrast)
+    machines = bookable_machines(has_contrast, machine_id)
+    if not machines:
+        return []
+    ids = [machine.id for machine in machines]
+    first_day = after.date()
+    # First whole slot at or after `after`
+    first_slot = math.ceil((after.hour * 60 + after.minute + after.second / 60) / SLOT_MINUTES)
+    found = []
+    for offset in range(0, search_days, WINDOW_DAYS):
+        window_start = first_day + timedelta(days=offset)
+        window_end = first_day + timedelta(days=min(offset + WINDOW_DAYS, search_days) - 1)
+        taken = taken_masks(window_start, window_end, ids)
+        for day_offset in range((window_end - window_start).days + 1):
+            day = window_start + timedelta(days=day_offset)
+            not_before = span_mask(first_slot, SLOTS_PER_DAY) if day == first_day else -1
+            starts_by_machine = [
+                (machine.id, run_starts(opening_mask(machine, day) & ~taken.get((machine.id, day), 0), length)
+                 & not_before)
+                for machine in machines
+            ]
+            day_starts = sorted((slot, machine) for machine, starts in starts_by_machine for slot in iter_bits(starts))
+            for slot, machine in day_starts:
+                found.append({
+                    "machine_id": machine,
+                    "start": slot_start(day, slot).isoformat(timespec='minutes'),
+                    "end": slot_start(day, slot + length).isoformat(timespec='minutes'),
+                })
+                if len(found) >= count:
+                    return found
+    return found
+
+def book_exam(exam, start, machine_id=None):
+    """
+    Reserve the exam's slots from `start` on `machine_id` (or the first
+    machine free then) in the current transaction. The exam's date, time_slot
+    and mri_machine_id are filled in. Raises SlotConflict when taken.
+    """
+    if start.second or start.microsecond or start.minute % SLOT_MINUTES:
+        raise InvalidBooking(f"Bookings start on a {SLOT_MINUTES}-minute boundary")
+    length = exam_slot_count(exam.exam_type, exam.has_contrast)
+    day, first_slot = start.date(), slot_of(start)
+    if first_slot + length > SLOTS_PER_DAY:
+        raise InvalidBooking("Booking must end on the day it starts")
+    machines = bookable_machines(exam.has_contrast, machine_id)
+    if machine_id and not machines:
+        raise InvalidBooking(f"Machine {machine_id} is not available for this exam")
+    needed = span_mask(first_slot, length)
+    open_machines = [machine for machine in machines if opening_mask(machine, day) & needed == needed]
+    if not open_machines:
+        when = start.strftime('%Y-%m-%d %H:%M')
+        raise InvalidBooking(f"{machine_id} is closed at {when}" if machine_id else f"No machine is open at {when}")
+    taken = taken_masks(day, day, [machine.id for machine in open_machines])
+    machine = next((m for m in open_machines if not taken.get((m.id, day), 0) & needed), None)
+    if machine is None:
+        raise SlotConflict(start, machine_id)
+
+    exam.exam_date = day
+    exam.time_slot = f"{start.strftime('%H:%M')} - {slot_start(day, first_slot + length).strftime('%H:%M')}"
+    exam.mri_machine_id = machine.id
+    db.session.flush()
+    try:
+        # The check above is only a fast path; the primary key settles races
+        db.session.execute(insert(MachineSlot), [
+            {"day": day, "machine_id": machine.id, "slot": slot, "exam_id": exam.id}
+            for slot in range(first_slot, first_slot + length)
+        ])
+    except IntegrityError as e:
+        raise SlotConflict(start, machine.id) from e
+    return {
+        "machine_id": machine.id,
+        "start": start.isoformat(timespec='minutes'),
+        "end": slot_start(day, first_slot + length).isoformat(timespec='minutes'),
+    }
+
+@event.listens_for(db.Session, 'after_flush')
+def release_cancelled_bookings(session, flush_context):
+    exam_ids = [
+        obj.id for obj in session.dirty
+        if isinstance(obj, Exam) and obj.status in RELEASED_STATUSES
+        and inspect(obj).attrs.status.history.has_changes()
+    ]
+    if exam_ids:
+        table = MachineSlot.__table__
+        session.connection().execute(table.delete().where(table.c.exam_id.in_(exam_ids)))
+
+def day_schedule(day):
+    """Every active machine's hours and bookings on `day`, bookings as (exam, start, end) runs."""
+    machines = Machine.query.filter(Machine.is_active == True).order_by(Machine.id).all()
+    rows = db.session.query(MachineSlot.machine_id, MachineSlot.slot, MachineSlot.exam_id).filter(
+        MachineSlot.day == day
+    ).order_by(MachineSlot.machine_id, MachineSlot.slot).all()
+    bookings = {}
+    for machine_id, slot, exam_id in rows:
+        runs = bookings.setdefault(machine_id, [])
+        if runs and runs[-1]["exam_id"] == exam_id and runs[-1]["_end"] == slot:
+            runs[-1]["_end"] = slot + 1
+        else:
+            runs.append({"exam_id": exam_id, "_start": slot, "_end": slot + 1})
+    result = []
+    for machine in machines:
+        data = machine.to_dict()
+        data["open"] = opening_mask(machine, day) != 0
+        data["bookings"] = [{
+            "exam_id": run["exam_id"],
+            "start": slot_start(day, run["_start"]).isoformat(timespec='minutes'),
+            "end": slot_start(day, run["_end"]).isoformat(timespec='minutes'),
+        } for run in bookings.get(machine.id, [])]
+        result.append(data)
+    return result
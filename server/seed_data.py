@@ -0,0 +1,282 @@
+"""
+Synthetic data generator: doctors, patients, exams spread over several years
+and their audit trail, written with bulk inserts into DATABASE_URL (migrated
+first). The same --seed always produces the same data.
+
+    DATABASE_URL=sqlite:////tmp/load.db python seed_data.py [--patients 50000] [--exams 250000] [--years 3]
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from flask_migrate import upgrade
+from app import app, MIGRATIONS_DIR
+from models import db, Doctor, Exam, Machine, MachineSlot, Patient, User, write_audit_rows
+from rollups import rebuild_revenue_rollup
+from locking import previous_week_range
+from scheduling import RELEASED_STATUSES, exam_slot_count, slot_of, span_mask, taken_masks
+
+BATCH_SIZE = 5000
+SEED_USER = "System/Seed"
+# Users for the benchmark's login route (password "bench")
+BENCH_USERS = {"bench_admin": "Admin", "bench_tech": "Technician", "bench_reception": "Reception"}
+
+FIRST_NAMES = ["Ali", "Reza", "Mohammad", "Hossein", "Mehdi", "Amir", "Hamid", "Saeed", "Farhad", "Kaveh",
+               "Sara", "Maryam", "Fatemeh", "Zahra", "Narges", "Leila", "Shirin", "Neda", "Parisa", "Mina",
+               "John", "David", "Anna", "Elena", "Omar", "Layla", "Yusuf", "Hana", "Daniel", "Nora"]
+LAST_NAMES = ["Ahmadi", "Hosseini", "Karimi", "Rezaei", "Moradi", "Mohammadi", "Jafari", "Rahimi", "Ghasemi",
+              "Sadeghi", "Kazemi", "Heidari", "Mousavi", "Hashemi", "Ebrahimi", "Nazari", "Rostami", "Akbari",
+              "Smith", "Brown", "Taylor", "Wilson", "Haddad", "Nasser", "Yilmaz", "Demir", "Khan", "Rahman"]
+HOSPITALS = ["Imam Khomeini", "Shariati", "Milad", "Sina", "Rasoul Akram", "Erfan", "Pars", "Day", "Atieh", "Mehr"]
+EXAM_TYPES = {  # type: (base price, weight)
+    "MRI Brain": (4500000, 25), "MRI Spine": (5000000, 20), "MRI Knee": (4000000, 15),
+    "MRI Shoulder": (4000000, 8), "MRI Abdomen": (6500000, 10), "MRI Pelvis": (6000000, 7),
+    "MRA": (5500000, 5), "MRI Breast": (7000000, 4), "MRI Cardiac": (9000000, 2),
+    "MRI Prostate": (7500000, 4),
+}
+TIME_SLOTS = [f"{hour:02d}:{minute:02d}" for hour in range(8, 21) for minute in (0, 30)]
+MACHINES = ["MRI-1", "MRI-2", "MRI-3"]
+# Seeded machines: 08:00-21:00, closed Fridays
+MACHINE_HOURS = (datetime.strptime("08:00", "%H:%M").time(), datetime.strptime("21:00", "%H:%M").time(), "012356")
+TECHNICIANS = ["tech_amir", "tech_sara", "tech_reza", "tech_neda", "tech_omid"]
+INFO_SOURCES = [("Referred", 60), ("Walk-in", 15), ("Instagram", 10), ("Google", 8), ("Friend", 7)]
+
+def weighted(rnd, pairs):
+    items, weights = zip(*pairs)
+    return rnd.choices(items, weights)[0]
+
+def make_doctors(rnd, count):
+    doctors = []
+    for i in range(count):
+        role = "Reporting" if i % 7 == 0 else "Referring"
+        doctors.append({
+            "id": i + 1,
+            "name": f"Dr. {rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+            "hospital": rnd.choice(HOSPITALS),
+            "phone": f"021{rnd.randrange(10**7, 10**8)}",
+            "license_no": None,
+            "role": role,
+        })
+    return doctors
+
+def make_patients(rnd, count, start_id):
+    national_ids = set()
+    patients = []
+    for i in range(count):
+        national_id = str(rnd.randrange(10**9, 10**10))
+        while national_id in national_ids:
+            national_id = str(rnd.randrange(10**9, 10**10))
+        national_ids.add(national_id)
+        patients.append({
+            "id": start_id + i,
+            "first_name": rnd.choice(FIRST_NAMES),
+            "last_name": rnd.choice(LAST_NAMES),
+            "national_id": national_id,
+            "age": rnd.randint(3, 90),
+            "gender": rnd.choice(["Male", "Female"]),
+            "phone": f"09{rnd.randrange(10**8, 10**9)}",
+            "email": None,
+            "address": None,
+            "emergency_contact": None,
+        })
+    return patients
+
+def make_exam(rnd, day, patient_id, referring, reporting, today, lock_before):
+    exam_type = weighted(rnd, [(t, w) for t, (_, w) in EXAM_TYPES.items()])
+    has_contrast = rnd.random() < 0.3
+    price = float(EXAM_TYPES[exam_type][0] + (1500000 if has_contrast else 0))
+    created_at = datetime.combine(day, datetime.min.time()) - timedelta(
+        days=rnd.randint(0, 14), minutes=rnd.randint(8 * 60, 20 * 60))
+    slot = rnd.choice(TIME_SLOTS)
+    if day < today:
+        status = weighted(rnd, [("Completed", 88), ("Cancelled", 7), ("Rescheduled", 5)])
+    elif day == today:
+        status = weighted(rnd, [("Pending", 60), ("Completed", 40)])
+    else:
+        status = "Pending"
+    exam = {
+        "id": str(uuid.UUID(int=rnd.getrandbits(128), version=4)),
+        "patient_id": patient_id,
+        "exam_type": exam_type,
+        "exam_date": day,
+        "time_slot": slot,
+        "has_contrast": has_contrast,
+        "price": price,
+        "discount": round(price * rnd.choice([0.05, 0.1, 0.2]), -3) if rnd.random() < 0.1 else 0.0,
+        "payment_status": weighted(rnd, [("Paid", 75), ("Partial", 10), ("Unpaid", 15)]),
+        "payment_method": rnd.choice(["Cash", "Card", "Transfer"]),
+        "info_source": weighted(rnd, INFO_SOURCES),
+        "assigned_tech": None, "mri_machine_id": None, "scan_start": None, "scan_end": None,
+        "status": status,
+        "radiologist_name": None, "radiologist_license": None,
+        "report_status": "Draft", "internal_notes": None, "file_url": None,
+        "referring_doctor_id": rnd.choice(referring)["id"] if rnd.random() < 0.7 else None,
+        "incentive_status": "Pending", "incentive_amount": 50000.0,
+        "is_locked": False, "created_at": created_at, "updated_at": created_at,
+    }
+    if status == "Completed":
+        hour, minute = map(int, slot.split(":"))
+        scan_start = datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=minute + rnd.randint(0, 20))
+        radiologist = rnd.choice(reporting)
+        exam.update({
+            "assigned_tech": rnd.choice(TECHNICIANS),
+            "mri_machine_id": rnd.choice(MACHINES),
+            "scan_start": scan_start,
+            "scan_end": scan_start + timedelta(minutes=rnd.randint(20, 60)),
+            "radiologist_name": radiologist["name"],
+            "radiologist_license": radiologist["license_no"],
+        })
+        age = (today - day).days
+        if age > 3 and rnd.random() < 0.95:
+            exam["report_status"] = "Final"
+            exam["internal_notes"] = "No acute findings." if rnd.random() < 0.7 else "See attached report. " * rnd.randint(5, 40)
+        if exam["referring_doctor_id"] and age > 14:
+            exam["incentive_status"] = "Paid" if rnd.random() < 0.9 else "Approved"
+        exam["is_locked"] = exam["scan_end"] < lock_before
+        exam["updated_at"] = exam["scan_end"] + timedelta(hours=rnd.randint(1, 48))
+    # Never stamped in the future: delta sync and the Sheets sync use updated_at as a watermark
+    now = datetime.utcnow()
+    exam["created_at"] = min(exam["created_at"], now)
+    exam["updated_at"] = min(exam["updated_at"], now)
+    return exam
+
+def exam_audit(exam):
+    """INSERT at registration, UPDATE at completion, like the API writes them."""
+    inserted = {k: exam[k] for k in ("id", "patient_id", "exam_type", "exam_date", "price", "status")}
+    inserted["status"] = "Pending"
+    records = [("bench_reception", "exams", exam["id"], "INSERT", None, inserted, exam["created_at"])]
+    if exam["status"] != "Pending":
+        changed = {k: exam[k] for k in ("status", "scan_start", "scan_end", "assigned_tech", "mri_machine_id")
+                   if exam[k] is not None}
+        records.append(("bench_tech", "exams", exam["id"], "UPDATE", {"status": "Pending"}, changed, exam["updated_at"]))
+    return records
+
+def book_slots(rnd, exam, booked):
+    """Machine slot rows for the exam at its time_slot on the first free machine (its own first), or []."""
+    if exam["status"] in RELEASED_STATUSES or exam["exam_date"].weekday() == 4:
+        return []
+    start = datetime.strptime(exam["time_slot"], "%H:%M")
+    first_slot = slot_of(start)
+    length = exam_slot_count(exam["exam_type"], exam["has_contrast"])
+    if first_slot + length > slot_of(MACHINE_HOURS[1]):
+        return []
+    needed = span_mask(first_slot, length)
+    machines = rnd.sample(MACHINES, len(MACHINES))
+    if exam["mri_machine_id"]:
+        machines.remove(exam["mri_machine_id"])
+        machines.insert(0, exam["mri_machine_id"])
+    for machine in machines:
+        key = (machine, exam["exam_date"])
+        if not booked.get(key, 0) & needed:
+            booked[key] = booked.get(key, 0) | needed
+            exam["mri_machine_id"] = machine
+            return [{"day": exam["exam_date"], "machine_id": machine, "slot": slot, "exam_id": exam["id"]}
+                    for slot in range(first_slot, first_slot + length)]
+    return []
+
+def insert_batches(connection, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+def seed(args):
+    """Generate and insert everything; returns row counts. Needs an app context."""
+    rnd = random.Random(args.seed)
+    today = date.today()
+    lock_before, _ = previous_week_range(datetime.now())
+    first_day = today - timedelta(days=365 * args.years)
+    days = [first_day + timedelta(days=i) for i in range((today - first_day).days + args.future_days + 1)]
+    # Busier on weekdays, closed most Fridays
+    day_weights = [0.1 if d.weekday() == 4 else 1.0 for d in days]
+    stats = {}
+
+    started = time.perf_counter()
+    with db.engine.begin() as connection:
+        for username, role in BENCH_USERS.items():
+            if not db.session.query(User.id).filter_by(username=username).first():
+                user = User(username=username, role=role)
+                user.set_password("bench")
+                connection.execute(User.__table__.insert(), [{"username": username, "role": role,
+                                                              "password_hash": user.password_hash}])
+        doctor_offset = connection.execute(db.select(db.func.max(Doctor.id))).scalar() or 0
+        doctors = make_doctors(rnd, args.doctors)
+        for doctor in doctors:
+            doctor["id"] += doctor_offset
+            doctor["license_no"] = f"LIC-{doctor['id']:06d}"
+        insert_batches(connection, Doctor.__table__, doctors)
+        write_audit_rows(connection, [(SEED_USER, "doctors", d["id"], "INSERT", None, d, datetime.utcnow()) for d in doctors])
+    referring = [d for d in doctors if d["role"] == "Referring"]
+    reporting = [d for d in doctors if d["role"] == "Reporting"] or doctors
+    stats["doctors"] = len(doctors)
+
+    with db.engine.begin() as connection:
+        patient_offset = (connection.execute(db.select(db.func.max(Patient.id))).scalar() or 0) + 1
+    patient_ids = []
+    for start in range(0, args.patients, BATCH_SIZE):
+        patients = make_patients(rnd, min(BATCH_SIZE, args.patients - start), patient_offset + start)
+        with db.engine.begin() as connection:
+            # Re-seeding an existing database skips national IDs already taken
+            existing = {nid for (nid,) in connection.execute(
+                db.select(Patient.national_id).where(Patient.national_id.in_([p["national_id"] for p in patients])))}
+            patients = [p for p in patients if p["national_id"] not in existing]
+            connection.execute(Patient.__table__.insert(), patients)
+            if args.audit:
+                write_audit_rows(connection, [(SEED_USER, "patients", p["id"], "INSERT", None, p, datetime.utcnow())
+                                              for p in patients])
+        patient_ids.extend(p["id"] for p in patients)
+    stats["patients"] = len(patient_ids)
+
+    opens_at, closes_at, weekdays = MACHINE_HOURS
+    with db.engine.begin() as connection:
+        existing = {machine_id for (machine_id,) in connection.execute(db.select(Machine.id))}
+        insert_batches(connection, Machine.__table__, [
+            {"id": machine, "name": machine, "opens_at": opens_at, "closes_at": closes_at,
+             "open_weekdays": weekdays, "supports_contrast": True, "is_active": True}
+            for machine in MACHINES if machine not in existing
+        ])
+    # Slots already booked (re-seeding), then filled as exams are generated
+    booked = taken_masks(days[0], days[-1])
+    db.session.remove()
+
+    audit_count = 0
+    slot_count = 0
+    for start in range(0, args.exams, BATCH_SIZE):
+        count = min(BATCH_SIZE, args.exams - start)
+        exams = [make_exam(rnd, day, rnd.choice(patient_ids), referring, reporting, today, lock_before)
+                 for day in rnd.choices(days, day_weights, k=count)]
+        slots = [slot for exam in exams for slot in book_slots(rnd, exam, booked)]
+        with db.engine.begin() as connection:
+            connection.execute(Exam.__table__.insert(), exams)
+            insert_batches(connection, MachineSlot.__table__, slots)
+            slot_count += len(slots)
+            if args.audit:
+                records = [record for exam in exams for record in exam_audit(exam)]
+                write_audit_rows(connection, records)
+                audit_count += len(records)
+    stats["exams"] = args.exams
+    stats["machine_slots"] = slot_count
+    stats["audit_rows"] = audit_count + (stats["patients"] + stats["doctors"] if args.audit else 0)
+
+    stats["revenue_rollup_rows"] = rebuild_revenue_rollup()
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--doctors", type=int, default=300)
+    parser.add_argument("--patients", type=int, default=50000)
+    parser.add_argument("--exams", type=int, default=250000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--future-days", type=int, default=14, help="Pending exams booked ahead")
+    parser.add_argument("--no-audit", dest="audit", action="store_false", help="Skip audit rows")
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+        stats = seed(args)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,5 @@
 import os
 import json
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 
 SCOPE = [
     "https://spreadsheets.google.com/feeds",
@@ -10,36 +8,41 @@ SCOPE = [
     "https://www.googleapis.com/auth/drive"
 ]
 
+# Define Schemas (also used by sheets_sync.py)
+SCHEMAS = {
+    "Exams": [
+        "ID", "Status", "Patient_Name", "National_ID", "Phone", 
+        "Date_Registered", "Date_of_Scan", "Exam_Type", 
+        "Referring_Doctor_ID", "Reporting_Radiologist_ID", "Created_By"
+    ],
+    "Doctors_Master": [
+        "Doctor_ID", "Name", "Hospital", "Department", "Phone", "Role"
+    ],
+    "Weekly_Bonuses": [
+        "Week_Start", "Week_End", "Doctor_ID", "Doctor_Name", 
+        "Exam_Count", "Total_Bonus", "Calculated_At"
+    ],
+    "Users": ["Username", "Password", "Role"]
+}
+
+def open_spreadsheet(name="Medical_Referrals"):
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+    if os.environ.get("GOOGLE_CREDENTIALS"):
+        creds_dict = json.loads(os.environ["GOOGLE_CREDENTIALS"])
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
+    else:
+        creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", SCOPE)
+    client = gspread.authorize(creds)
+    return client.open(name)
+
 def setup_database():
+    import gspread
     print("Connecting to Google Sheets...")
     try:
-        if os.environ.get("GOOGLE_CREDENTIALS"):
-            creds_dict = json.loads(os.environ["GOOGLE_CREDENTIALS"])
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
-        else:
-            creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", SCOPE)
-        
-        client = gspread.authorize(creds)
-        spreadsheet = client.open("Medical_Referrals")
-        
-        # Define Schemas
-        schemas = {
-            "Exams": [
-                "ID", "Status", "Patient_Name", "National_ID", "Phone", 
-                "Date_Registered", "Date_of_Scan", "Exam_Type", 
-                "Referring_Doctor_ID", "Reporting_Radiologist_ID", "Created_By"
-            ],
-            "Doctors_Master": [
-                "Doctor_ID", "Name", "Hospital", "Department", "Phone", "Role"
-            ],
-            "Weekly_Bonuses": [
-                "Week_Start", "Week_End", "Doctor_ID", "Doctor_Name", 
-                "Exam_Count", "Total_Bonus", "Calculated_At"
-            ],
-            "Users": ["Username", "Password", "Role"]
-        }
+        spreadsheet = open_spreadsheet()
         
-        for sheet_name, headers in schemas.items():
+        for sheet_name, headers in SCHEMAS.items():
             try:
                 ws = spreadsheet.worksheet(sheet_name)
                 print(f"Sheet '{sheet_name}' exists. Checking headers...")
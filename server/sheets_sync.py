@@ -0,0 +1,346 @@
+import json
+import logging
+import os
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from models import db, AuditLog, Doctor, Exam, Patient, SyncCursor
+from caching import current_version
+from reports import bonus_totals, week_bounds
+from setup_db import SCHEMAS
+
+logger = logging.getLogger(__name__)
+
+# --- Google Sheets Sync ---
+# Pushes exams changed since the stored watermark (Exam.updated_at, id) to the
+# Exams sheet, rewrites the Weekly_Bonuses rows of the weeks those exams fall
+# in, and refreshes Doctors_Master when the doctors cache version moves. Rows
+# are matched on their key columns and written with one batched values update
+# per sheet and batch; the cursor advances only after the batch is stored, so
+# a failed run re-sends the same rows on the next one (writes are idempotent).
+
+DEFAULT_BATCH_SIZE = 500
+# Rows updated in the last few seconds may belong to transactions that haven't
+# committed yet with an earlier timestamp; leave them for the next run.
+DEFAULT_LAG_SECONDS = 5
+
+class SheetsBackend(ABC):
+    """Spreadsheet access used by the sync; every method is one API request."""
+    @abstractmethod
+    def get_values(self, sheet, a1_range):
+        pass
+
+    @abstractmethod
+    def ensure_rows(self, sheet, row_count):
+        pass
+
+    @abstractmethod
+    def batch_update(self, sheet, updates):
+        """updates: [(a1_range, [[cell, ...], ...]), ...] in a single request."""
+
+    def is_retryable(self, error):
+        return False
+
+class GSpreadBackend(SheetsBackend):
+    def __init__(self, spreadsheet_name):
+        from setup_db import open_spreadsheet
+        self.spreadsheet = open_spreadsheet(spreadsheet_name)
+        self._worksheets = {}
+
+    def worksheet(self, sheet):
+        if sheet not in self._worksheets:
+            self._worksheets[sheet] = self.spreadsheet.worksheet(sheet)
+        return self._worksheets[sheet]
+
+    def get_values(self, sheet, a1_range):
+        return self.worksheet(sheet).get(a1_range)
+
+    def ensure_rows(self, sheet, row_count):
+        ws = self.worksheet(sheet)
+        if ws.row_count < row_count:
+            ws.add_rows(row_count - ws.row_count)
+
+    def batch_update(self, sheet, updates):
+        self.worksheet(sheet).batch_update(
+            [{'range': a1_range, 'values': rows} for a1_range, rows in updates],
+            value_input_option='RAW'
+        )
+
+    def is_retryable(self, error):
+        response = getattr(error, 'response', None)
+        return getattr(response, 'status_code', None) in (429, 500, 502, 503, 504)
+
+class FakeQuotaError(Exception):
+    pass
+
+class FakeSheetsBackend(SheetsBackend):
+    """
+    In-memory (optionally JSON-file backed) spreadsheet for local runs and
+    checks without network access. fail_every=N raises a retryable quota error
+    on every Nth request; `requests` counts calls like the API quota would.
+    """
+    def __init__(self, path=None, fail_every=0):
+        self.path = path
+        self.fail_every = fail_every
+        self.requests = 0
+        self.sheets = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.sheets = json.load(f)
+
+    def _request(self):
+        self.requests += 1
+        if self.fail_every and self.requests % self.fail_every == 0:
+            raise FakeQuotaError("Quota exceeded (fake)")
+
+    def get_values(self, sheet, a1_range):
+        self._request()
+        first_row, first_col, last_col = parse_range(a1_range)
+        rows = self.sheets.get(sheet, [])[first_row - 1:]
+        return [row[first_col:last_col + 1 if last_col is not None else None] for row in rows]
+
+    def ensure_rows(self, sheet, row_count):
+        self._request()
+
+    def batch_update(self, sheet, updates):
+        self._request()
+        rows = self.sheets.setdefault(sheet, [])
+        for a1_range, values in updates:
+            first_row, first_col, _ = parse_range(a1_range)
+            for offset, value_row in enumerate(values):
+                index = first_row - 1 + offset
+                while len(rows) <= index:
+                    rows.append([])
+                row = rows[index]
+                row.extend([''] * (first_col + len(value_row) - len(row)))
+                row[first_col:first_col + len(value_row)] = value_row
+        if self.path:
+            with open(self.path, 'w') as f:
+                json.dump(self.sheets, f, indent=2)
+
+    def is_retryable(self, error):
+        return isinstance(error, FakeQuotaError)
+
+def column_letter(index):
+    """0 -> A, 26 -> AA."""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def column_index(letters):
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+_RANGE = re.compile(r'^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$')
+
+def parse_range(a1_range):
+    """'A2:K5' -> (first_row, first_col, last_col); rows 1-based, columns 0-based."""
+    match = _RANGE.match(a1_range)
+    if not match:
+        raise ValueError(f"Unsupported range: {a1_range}")
+    first_col, first_row, last_col, _ = match.groups()
+    return int(first_row or 1), column_index(first_col), column_index(last_col) if last_col else None
+
+def call_with_backoff(backend, fn, *args, retries=6, base_delay=1.0, max_delay=64.0, sleep=time.sleep):
+    """Retry quota/server errors with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == retries or not backend.is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+            logger.warning("Sheets request failed (%s); retrying in %.1fs", e, delay)
+            sleep(delay)
+
+def cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='seconds')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+class SheetWriter:
+    """Upserts rows into one sheet, matching existing rows on the key column indexes."""
+    def __init__(self, sync, sheet, key_columns=(0,)):
+        self.sync = sync
+        self.sheet = sheet
+        self.headers = SCHEMAS[sheet]
+        self.key_columns = key_columns
+        self.existing = {}
+        self._rows = None
+
+    def key(self, row):
+        return tuple(str(cell(row[i])) for i in self.key_columns)
+
+    def load(self):
+        """Key -> row number, read once per run; writes the header row on an empty sheet."""
+        if self._rows is not None:
+            return self._rows
+        last = column_letter(len(self.headers) - 1)
+        values = self.sync.request(self.sync.backend.get_values, self.sheet, f"A1:{last}")
+        self._rows = {}
+        if not values or not any(values[0]):
+            self.sync.request(self.sync.backend.batch_update, self.sheet, [(f"A1:{last}1", [self.headers])])
+            self.next_row = 2
+            return self._rows
+        for number, row in enumerate(values[1:], start=2):
+            row = list(row) + [''] * (len(self.headers) - len(row))
+            if any(row):
+                self._rows[self.key(row)] = number
+                self.existing[self.key(row)] = row
+        self.next_row = len(values) + 1
+        return self._rows
+
+    def upsert(self, rows):
+        """Write rows (lists in header order) in one batched request; returns the count."""
+        if not rows:
+            return 0
+        positions = self.load()
+        numbered = {}
+        for row in rows:
+            row = [cell(v) for v in row]
+            key = self.key(row)
+            if key not in positions:
+                positions[key] = self.next_row
+                self.next_row += 1
+            numbered[positions[key]] = row
+            self.existing[key] = row
+        self.sync.request(self.sync.backend.ensure_rows, self.sheet, self.next_row - 1)
+        last = column_letter(len(self.headers) - 1)
+        updates, run = [], []
+        for number in sorted(numbered):
+            if run and number != run[-1][0] + 1:
+                updates.append((f"A{run[0][0]}:{last}{run[-1][0]}", [r for _, r in run]))
+                run = []
+            run.append((number, numbered[number]))
+        updates.append((f"A{run[0][0]}:{last}{run[-1][0]}", [r for _, r in run]))
+        self.sync.request(self.sync.backend.batch_update, self.sheet, updates)
+        return len(numbered)
+
+def get_cursor(name):
+    cursor = db.session.get(SyncCursor, name)
+    if cursor is None:
+        cursor = SyncCursor(name=name)
+        db.session.add(cursor)
+    return cursor
+
+def exam_rows(exams):
+    ids = [exam.id for exam in exams]
+    created_by = dict(db.session.query(AuditLog.target_id, AuditLog.user_id).filter(
+        AuditLog.target_table == 'exams',
+        AuditLog.action == 'INSERT',
+        AuditLog.target_id.in_(ids)
+    ).all()) if ids else {}
+    return [[
+        exam.id, exam.status, f"{exam.first_name} {exam.last_name}", exam.national_id, exam.phone,
+        exam.created_at, exam.scan_end.date() if exam.scan_end else exam.exam_date, exam.exam_type,
+        exam.referring_doctor_id, exam.radiologist_license, created_by.get(exam.id)
+    ] for exam in exams]
+
+class SheetsSync:
+    def __init__(self, backend, batch_size=DEFAULT_BATCH_SIZE, lag_seconds=DEFAULT_LAG_SECONDS,
+                 retries=6, sleep=time.sleep):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.lag = timedelta(seconds=lag_seconds)
+        self.retries = retries
+        self.sleep = sleep
+        self.stats = {}
+
+    def request(self, fn, *args):
+        self.stats['requests'] = self.stats.get('requests', 0) + 1
+        return call_with_backoff(self.backend, fn, *args, retries=self.retries, sleep=self.sleep)
+
+    def run(self):
+        """One pass over all sheets; returns counts of rows written and API requests."""
+        self.stats = {'exams': 0, 'bonus_rows': 0, 'doctors': 0, 'requests': 0}
+        self.exams_sheet = SheetWriter(self, 'Exams')
+        self.bonus_sheet = SheetWriter(self, 'Weekly_Bonuses', key_columns=(0, 2))
+        self.sync_doctors()
+        while self.sync_exam_batch():
+            pass
+        return self.stats
+
+    def sync_doctors(self):
+        version = current_version('doctors')
+        cursor = get_cursor('sheets:doctors')
+        if cursor.last_key == str(version):
+            return
+        doctors = Doctor.query.order_by(Doctor.id).all()
+        self.stats['doctors'] += SheetWriter(self, 'Doctors_Master').upsert([
+            [d.id, d.name, d.hospital, None, d.phone, d.role] for d in doctors
+        ])
+        cursor.last_key = str(version)
+        db.session.commit()
+
+    def sync_exam_batch(self):
+        cursor = get_cursor('sheets:exams')
+        query = db.session.query(
+            Exam.id, Exam.status, Exam.created_at, Exam.scan_end, Exam.exam_date, Exam.exam_type,
+            Exam.referring_doctor_id, Exam.radiologist_license, Exam.updated_at,
+            Patient.first_name, Patient.last_name, Patient.national_id, Patient.phone
+        ).join(Patient, Patient.id == Exam.patient_id).filter(
+            Exam.updated_at <= datetime.utcnow() - self.lag
+        )
+        if cursor.watermark is not None:
+            # The plain range bound lets the planner seek ix_exams_updated_at
+            query = query.filter(Exam.updated_at >= cursor.watermark, or_(
+                Exam.updated_at > cursor.watermark,
+                and_(Exam.updated_at == cursor.watermark, Exam.id > (cursor.last_key or ''))
+            ))
+        exams = query.order_by(Exam.updated_at, Exam.id).limit(self.batch_size).all()
+        if not exams:
+            db.session.commit()
+            return False
+
+        self.stats['exams'] += self.exams_sheet.upsert(exam_rows(exams))
+        # Weeks the changed exams now count towards (a scan moved to another
+        # week leaves the old week's row as it was until that week changes again)
+        weeks = {week_bounds(datetime.combine(e.scan_end or e.exam_date, datetime.min.time()))
+                 for e in exams if e.scan_end or e.exam_date}
+        self.stats['bonus_rows'] += self.sync_bonus_weeks(sorted(weeks))
+
+        cursor.watermark = exams[-1].updated_at
+        cursor.last_key = exams[-1].id
+        db.session.commit()
+        return len(exams) == self.batch_size
+
+    def sync_bonus_weeks(self, weeks):
+        """Rewrite Weekly_Bonuses for the given weeks; doctors no longer listed drop to zero."""
+        if not weeks:
+            return 0
+        self.bonus_sheet.load()
+        calculated_at = datetime.utcnow()
+        rows = []
+        for start, end in weeks:
+            week_start = cell(start.date())
+            current = set()
+            for doctor_id, name, _, exam_count, total_bonus in bonus_totals(start, end):
+                current.add(str(doctor_id))
+                rows.append([start.date(), end.date(), doctor_id, name or "Unknown",
+                             exam_count, total_bonus, calculated_at])
+            for (existing_week, doctor_id), row in self.bonus_sheet.existing.items():
+                if existing_week == week_start and doctor_id not in current and row[4] not in (0, '0'):
+                    rows.append([start.date(), end.date(), doctor_id, row[3], 0, 0, calculated_at])
+        return self.bonus_sheet.upsert(rows)
+
+def backend_from_config(config):
+    """SHEETS_BACKEND: "gspread" (GOOGLE_SHEETS_NAME) or "fake:<path to JSON file>"."""
+    name = config.get("SHEETS_BACKEND", "gspread")
+    if name.startswith("fake"):
+        _, _, path = name.partition(":")
+        return FakeSheetsBackend(path or None)
+    if name == "gspread":
+        return GSpreadBackend(config.get("GOOGLE_SHEETS_NAME", "Medical_Referrals"))
+    raise ValueError(f"Unknown sheets backend: {name}")
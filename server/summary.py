@@ -0,0 +1,77 @@
+from datetime import datetime
+from sqlalchemy import and_, event, func, inspect, or_
+from caching import SharedCache, bump_version
+from models import db, Exam
+from reports import bonus_report_data, revenue_week_data, week_bounds
+
+# --- Admin Dashboard Summary ---
+# The current week's aggregates in one response, cached in a SharedCache.
+# The entry expires after SUMMARY_CACHE_TTL, and is dropped early (its version
+# bumped in the same transaction) when an exam of the current week is
+# completed, paid or locked, so those show up on the next load. Other changes
+# (registrations, edits) show up when the entry expires.
+
+SUMMARY_CACHE = 'admin-summary'
+INVALIDATING_COLUMNS = ('status', 'payment_status', 'is_locked')
+
+summary_cache = SharedCache()
+
+def in_current_week(moment, now=None):
+    if moment is None:
+        return False
+    start, end = week_bounds(now or datetime.now())
+    if not isinstance(moment, datetime):
+        moment = datetime.combine(moment, datetime.min.time())
+    # Exam times are naive; an aware value set by other code can't be compared to them
+    return start <= moment.replace(tzinfo=None) <= end
+
+def invalidate_summary(connection):
+    bump_version(connection, SUMMARY_CACHE)
+
+def _week_moments(obj):
+    """scan_end and exam_date of the exam, before and after this flush."""
+    state = inspect(obj)
+    moments = []
+    for key in ('scan_end', 'exam_date'):
+        hist = state.attrs[key].history
+        moments.extend(hist.added or hist.unchanged or ())
+        moments.extend(hist.deleted or ())
+    return moments
+
+@event.listens_for(db.Session, 'after_flush')
+def invalidate_summary_on_exam_change(session, flush_context):
+    now = datetime.now()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, Exam):
+            continue
+        state = inspect(obj)
+        if obj in session.dirty and not any(state.attrs[key].history.has_changes() for key in INVALIDATING_COLUMNS):
+            continue
+        if obj not in session.dirty and obj.status != 'Completed':
+            # New or deleted exams only count once completed
+            continue
+        if any(in_current_week(moment, now) for moment in _week_moments(obj)):
+            invalidate_summary(session.connection())
+            return
+
+def build_summary(now=None):
+    now = now or datetime.now()
+    start, end = week_bounds(now)
+    bonus = bonus_report_data(start, end)
+    in_week = or_(
+        and_(Exam.scan_end >= start, Exam.scan_end <= end),
+        and_(Exam.scan_end == None, Exam.exam_date >= start.date(), Exam.exam_date <= end.date())
+    )
+    statuses = dict(db.session.query(Exam.status, func.count(Exam.id)).filter(in_week).group_by(Exam.status).all())
+    locked = db.session.query(func.count(Exam.id)).filter(in_week, Exam.is_locked == True).scalar()
+    return {
+        "period": bonus["period"],
+        "generated_at": datetime.utcnow().isoformat(),
+        "exams": {"by_status": statuses, "total": sum(statuses.values()), "locked": locked},
+        "revenue": revenue_week_data(now),
+        "bonus": {
+            "total_bonus": sum(row["total_bonus"] for row in bonus["data"]),
+            "exam_count": sum(row["exam_count"] for row in bonus["data"]),
+            "doctors": bonus["data"],
+        },
+    }
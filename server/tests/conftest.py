@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+# Read by app.py at import time
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+
+from app import app as flask_app
+from models import db
+from flask_jwt_extended import create_access_token
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers(app):
+    def headers(role):
+        token = create_access_token(identity=role.lower(), additional_claims={"role": role})
+        return {"Authorization": f"Bearer {token}"}
+    return headers
@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+from models import db, ExamEvent
+from exam_events import event_broker, events_after, latest_event_id, write_exam_events
+
+def write_event(exam_id):
+    with db.engine.begin() as connection:
+        write_exam_events(connection, [{'type': 'updated', 'exam_ids': [exam_id]}])
+
+def test_ids_are_not_reused_after_prune(app):
+    for exam_id in ('a', 'b', 'c'):
+        write_event(exam_id)
+    last_seen = latest_event_id()
+    # An idle hour: every stored event is past the retention window
+    db.session.query(ExamEvent).update({'created_at': datetime.utcnow() - timedelta(hours=2)})
+    db.session.commit()
+    with db.engine.begin() as connection:
+        event_broker._prune(connection)
+    assert db.session.query(ExamEvent).count() == 0
+
+    write_event('d')
+    missed = events_after(last_seen)
+    assert [item['exam_ids'] for item in missed] == [['d']]
+    assert missed[0]['id'] > last_seen
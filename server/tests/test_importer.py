@@ -0,0 +1,25 @@
+import io
+from datetime import datetime, timedelta
+from models import db, AuditLog, Exam, Patient, audit_values
+
+def test_import_update_touches_exams_and_audits_old_values(client, auth_headers):
+    patient = Patient(first_name="A", last_name="B", national_id="N1", phone="111")
+    db.session.add(patient)
+    db.session.flush()
+    stale = datetime.utcnow() - timedelta(days=1)
+    exam = Exam(id="E1", patient_id=patient.id, exam_type="MRI", status="Pending", updated_at=stale)
+    db.session.add(exam)
+    db.session.commit()
+
+    body = io.BytesIO(b"national_id,phone\nN1,222\n")
+    response = client.post("/api/import?format=csv", data=body, headers=auth_headers("Admin"))
+    assert response.status_code == 200
+    assert response.json["patients_updated"] == 1
+
+    db.session.expire_all()
+    assert db.session.get(Patient, patient.id).phone == "222"
+    assert db.session.get(Exam, exam.id).updated_at > stale
+    log = db.session.query(AuditLog).filter_by(target_table="patients", action="UPDATE").one()
+    old, new = audit_values(log.payload, log.old_value, log.new_value)
+    assert old == {"phone": "111"}
+    assert new == {"phone": "222"}
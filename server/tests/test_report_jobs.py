@@ -0,0 +1,39 @@
+import os
+from datetime import datetime, timedelta
+from models import db, ReportJob
+from report_jobs import ReportWorker, submit_job
+
+def worker(app, tmp_path, name):
+    w = ReportWorker(app, str(tmp_path), lease=60)
+    w.name = name
+    return w
+
+def test_live_job_is_not_taken_over(app, tmp_path):
+    job, _ = submit_job('revenue-week', {}, 'admin')
+    first, second = worker(app, tmp_path, 'a'), worker(app, tmp_path, 'b')
+    assert first.claim() == job.id
+    # A long report: started well past the lease, but still heartbeating
+    db.session.query(ReportJob).update({'started_at': datetime.utcnow() - timedelta(hours=2)})
+    db.session.commit()
+    assert second.claim() is None
+
+def test_lapsed_job_is_taken_over_once(app, tmp_path):
+    job, _ = submit_job('revenue-week', {}, 'admin')
+    first, second = worker(app, tmp_path, 'a'), worker(app, tmp_path, 'b')
+    assert first.claim() == job.id
+    db.session.query(ReportJob).update({'heartbeat_at': datetime.utcnow() - timedelta(minutes=5)})
+    db.session.commit()
+
+    assert second.claim() == job.id
+    db.session.expire_all()
+    job = db.session.get(ReportJob, job.id)
+    assert (job.claimed_by, job.attempts) == ('b', 2)
+    # The first worker's late result is refused
+    assert not first.finish(job.id, status='done')
+
+    second.run_job(job.id)
+    db.session.expire_all()
+    job = db.session.get(ReportJob, job.id)
+    assert job.status == 'done'
+    assert job.in_flight_key is None
+    assert os.path.exists(job.result_path)
@@ -0,0 +1,19 @@
+from datetime import datetime
+from models import db, DailyRevenue, Exam, Patient
+
+def test_price_change_after_commit_replaces_contribution(app):
+    patient = Patient(first_name="A", last_name="B", national_id="N1")
+    db.session.add(patient)
+    db.session.flush()
+    exam = Exam(id="E1", patient_id=patient.id, exam_type="MRI", status="Completed",
+                scan_end=datetime.utcnow(), price=100000, payment_status="Paid")
+    db.session.add(exam)
+    db.session.commit()
+
+    # The commit expired the exam: the old price has to be loaded on set
+    exam.price = 150000
+    db.session.commit()
+
+    row = db.session.query(DailyRevenue).filter_by(payment_status="Paid").one()
+    assert row.exam_count == 1
+    assert row.revenue == 150000
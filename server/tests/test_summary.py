@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+from models import db, Exam, Patient
+
+def register_exam(client, auth_headers):
+    patient = Patient(first_name="A", last_name="B", national_id="N1")
+    db.session.add(patient)
+    db.session.commit()
+    response = client.post("/api/exams/register", json={"patient_id": patient.id, "exam_type": "MRI"},
+                           headers=auth_headers("Reception"))
+    assert response.status_code == 201
+    return response.json["id"]
+
+def utc_now_iso():
+    # As the web client sends it: toISOString()
+    return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+def test_complete_with_utc_timestamp(client, auth_headers):
+    exam_id = register_exam(client, auth_headers)
+    response = client.patch("/api/exams/complete", headers=auth_headers("Technician"), json={
+        "exam_id": exam_id,
+        "scan_start": (datetime.utcnow() - timedelta(minutes=30)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "scan_end": utc_now_iso(),
+    })
+    assert response.status_code == 200
+    exam = db.session.get(Exam, exam_id)
+    assert exam.status == 'Completed'
+    assert exam.scan_end.tzinfo is None
+
+def test_batch_complete_with_utc_timestamp(client, auth_headers):
+    exam_id = register_exam(client, auth_headers)
+    response = client.patch("/api/exams/complete/batch", headers=auth_headers("Technician"), json={
+        "items": [{"exam_id": exam_id, "scan_end": utc_now_iso()}],
+    })
+    assert response.status_code == 200
+    assert response.json["failed"] == 0